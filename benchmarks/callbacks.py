@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+"""
+Measures per-callback cost of listener input hooks: time spent in hook thread
+for each mouse and keyboard event, with writer process inserting events to
+a temporary database concurrently. Requires a display, like the listener itself.
+
+    python benchmarks/callbacks.py [COUNT]
+
+------------------------------------------------------------------------------
+This file is part of InputScope - mouse and keyboard input visualizer.
+Released under the MIT License.
+
+@author      Erki Suurjaak
+@created     18.10.2026
+@modified    18.10.2026
+------------------------------------------------------------------------------
+"""
+from __future__ import print_function
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import pynput
+
+from inputscope import conf
+from inputscope import listener
+
+
+def measure(name, func, count):
+    """Invokes func(i) count times, prints and returns average cost in microseconds."""
+    start = time.time()
+    for i in range(count): func(i)
+    result = 1000000 * (time.time() - start) / count
+    print("%-8s %8.2f us per callback" % (name, result))
+    return result
+
+
+def make_key_handler(output):
+    """Returns KeyHandler set up for feeding events directly, without a hook."""
+    handler = listener.KeyHandler.__new__(listener.KeyHandler)
+    handler.KEYNAMES = handler.PYNPUT_NAMES.copy()
+    for key in pynput.keyboard.Key:
+        handler.KEYNAMES.setdefault(key.name, handler.nicename(key.name))
+    handler._output, handler._downs, handler._is_extended = output, {}, None
+    handler._modifiers     = dict((x, False) for x in handler.MODIFIERNAMES.values())
+    handler._realmodifiers = dict((x, False) for x in handler.MODIFIERNAMES)
+    return handler
+
+
+def make_mouse_handler(output):
+    """Returns MouseHandler set up for feeding events directly, without a hook."""
+    handler = listener.MouseHandler.__new__(listener.MouseHandler)
+    handler._output, handler._buttons = output, {"left": 1, "right": 2, "middle": 3, "unknown": 0}
+    return handler
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    tempdir = tempfile.mkdtemp()
+    conf.DbPath = os.path.join(tempdir, "benchmark.db")
+    conf.MaxEventsForQueue = 5 * count
+
+    sender = listener.Sender()
+    mouse = make_mouse_handler(sender.handle)
+    keyboard = make_key_handler(sender.handle)
+    left, keys = pynput.mouse.Button.left, [pynput.keyboard.KeyCode.from_char(c) for c in "asdf"]
+    try:
+        print("Feeding %s events per callback.\n" % "{:,}".format(count))
+        measure("move",   lambda i: mouse.move(i % 1920, i % 1080), count)
+        measure("click",  lambda i: mouse.click(i % 1920, i % 1080, left, True), count)
+        measure("scroll", lambda i: mouse.scroll(i % 1920, i % 1080, 0, 1), count)
+        measure("key",    lambda i: (keyboard.on_event(True,  keys[i % len(keys)]),
+                                     keyboard.on_event(False, keys[i % len(keys)])), count)
+        while sender.events: time.sleep(0.1)
+        print("\nDropped %s events." % sum(sender.dropped))
+    finally:
+        sender.stop()
+        shutil.rmtree(tempdir, ignore_errors=True)
+
+
+if "__main__" == __name__:
+    main()
@@ -0,0 +1,327 @@
+# -*- coding: utf-8 -*-
+"""
+Generates a synthetic InputScope database for benchmarks, deterministic for
+given arguments: workdays of mouse strokes between targets with clicks and
+scrolls, typing words at natural key intervals with shortcut combos, in
+foreground programs switching over the day, plus screen sizes, sessions
+and day counts.
+
+    python benchmarks/generate.py PATH [ROWS] [--days DAYS] [--seed SEED]
+
+ROWS is total number of events like 1M, 10M or 100M, default 1M.
+Days default to enough for about 50,000 events per day.
+
+------------------------------------------------------------------------------
+This file is part of InputScope - mouse and keyboard input visualizer.
+Released under the MIT License.
+
+@author      Erki Suurjaak
+@created     18.10.2026
+@modified    18.10.2026
+------------------------------------------------------------------------------
+"""
+from __future__ import print_function
+import argparse
+import datetime
+import math
+import os
+import random
+import sqlite3
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from inputscope import conf
+
+
+"""First day of generated events."""
+START = datetime.date(2024, 1, 1)
+
+"""Default number of events per day."""
+DAY_EVENTS = 50000
+
+"""Screen layouts as [(first day offset, [(x, y, w, h) per display])]."""
+SCREENS = [(0,   [(0, 0, 1920, 1080), (1920, 0, 1280, 1024)]),
+           (180, [(0, 0, 2560, 1440), (2560, 0, 1920, 1080)])]
+
+"""Programs as [(executable path, weight, typing share)]."""
+PROGRAMS = [
+    ("C:\\Program Files\\Google\\Chrome\\Application\\chrome.exe", 30, 0.2),
+    ("C:\\Program Files\\Microsoft VS Code\\Code.exe",             25, 0.7),
+    ("C:\\Windows\\System32\\cmd.exe",                             8,  0.8),
+    ("C:\\Windows\\explorer.exe",                                  10, 0.05),
+    ("C:\\Program Files\\Mozilla Thunderbird\\thunderbird.exe",    8,  0.5),
+    ("C:\\Program Files\\Slack\\slack.exe",                        10, 0.6),
+    ("C:\\Program Files\\GIMP 2\\bin\\gimp-2.10.exe",              4,  0.05),
+    ("C:\\Program Files (x86)\\Steam\\steam.exe",                  2,  0.0),
+]
+
+"""Words for typing, most common first."""
+WORDS = ("the of and to in is it you that was for on are with as be this have from or "
+         "one had by not but what all were when we there can an your which their said if do "
+         "will each about how up out them then she many some so these would other into has "
+         "more her two like him see time could no make than first been its who now people "
+         "my made over did down only way find use may water long little very after words "
+         "called just where most know get through back much before go good new write our "
+         "used me man too any day same right look think also around another came come work "
+         "three word must because does part even place well such here take why help put "
+         "different away again off went old number great tell men say small every found "
+         "still between name should home big give air line set own under read last never us "
+         "left end along while might next sound below saw something thought both few those "
+         "always show large often together asked house world going want school important "
+         "until form food keep children feet land side without boy once animal life enough "
+         "took four head above kind began almost live page got earth need far hand high year "
+         "mother light country father let night picture being study second soon story since "
+         "white ever paper hard near sentence better best across during today however sure "
+         "knew try told young sun thing whole hear example heard several change answer room "
+         "sea against top turned learn point city play toward five himself usually money seen "
+         "query table index cache value event mouse keyboard commit build test release").split()
+
+"""Shortcut combos as [(modifier realkey, key, weight)]."""
+COMBOS = [("Lcontrol", "C", 30), ("Lcontrol", "V", 30), ("Lcontrol", "S", 15),
+          ("Lcontrol", "Z", 10), ("Lcontrol", "A", 5), ("Lcontrol", "F", 5),
+          ("Alt", "Tab", 15), ("Lcontrol", "Tab", 5), ("Lwin", "D", 2)]
+
+"""Modifier names by realkey, as in listener."""
+MODIFIERS = {"Lcontrol": "Ctrl", "Alt": "Alt", "Lwin": "Win"}
+
+"""Real key names for punctuation typed."""
+PUNCTUATION = {".": "Oem_Period", ",": "Oem_Comma"}
+
+
+class Generator(object):
+    """Generates events for one day at a time."""
+
+    def __init__(self, rng, pace=1.):
+        self.rng      = rng
+        self.pace     = pace # Multiplier for pauses, lower for denser days
+        self.programs = list(range(1, len(PROGRAMS) + 1))
+        self.weights  = [w for _, w, _ in PROGRAMS]
+        self.hotspots = {} # {(program, display): [(x, y)]}, frequent click targets
+        self.displays = SCREENS[0][1]
+        self.x, self.y, self.display = 500, 500, 0
+
+
+    def day(self, stamp, budget):
+        """
+        Yields (table, values) for events of one day starting from stamp,
+        until events budget is used up, values as in table column order after day.
+        """
+        rng = self.rng
+        stamp += rng.gauss(9, 0.7) * 3600
+        while budget > 0:
+            program = self.choose(self.programs, self.weights)
+            typing = rng.random() < PROGRAMS[program - 1][2]
+            blocklen = rng.randint(30, 400) if typing else rng.randint(100, 1500)
+            func = self.typing if typing else self.browsing
+            count = 0
+            for table, stamp, values in func(stamp, program, min(blocklen, budget)):
+                count += 1
+                yield table, (stamp, ) + values
+            budget -= max(count, 1)
+            stamp += self.pause(20) if rng.random() < 0.9 else rng.uniform(300, 2400) * self.pace
+
+
+    def browsing(self, stamp, program, budget):
+        """Yields (table, stamp, values) for mouse strokes, clicks and scrolls."""
+        rng, count = self.rng, 0
+        while count < budget:
+            for item in self.stroke(stamp, program):
+                count += 1
+                stamp = item[1]
+                yield item
+            if rng.random() < 0.5:
+                button = self.choose([1, 2, 3], [85, 12, 3])
+                for _ in range(2 if rng.random() < 0.1 else 1):
+                    stamp += rng.uniform(0.08, 0.2)
+                    count += 1
+                    yield "clicks", stamp, (self.x, self.y, button, self.display, program)
+            if rng.random() < 0.15:
+                dy = -1 if rng.random() < 0.7 else 1
+                for _ in range(rng.randint(3, 20)):
+                    stamp += rng.uniform(0.03, 0.15)
+                    count += 1
+                    yield "scrolls", stamp, (self.x, self.y, 0, dy, self.display, program)
+            stamp += self.pause(0.8)
+
+
+    def typing(self, stamp, program, budget):
+        """Yields (table, stamp, values) for keys and combos typed in words."""
+        rng, count, sentence = self.rng, 0, True
+        while count < budget:
+            if rng.random() < 0.02:
+                modifier, key, _ = self.choose(COMBOS, [w for _, _, w in COMBOS])
+                stamp += self.pause(0.4)
+                yield "keys", stamp, (modifier, modifier, program)
+                stamp += rng.uniform(0.1, 0.3)
+                yield "keys", stamp, (key, key, program)
+                yield "combos", stamp, ("%s-%s" % (MODIFIERS[modifier], key),
+                                        "%s-%s" % (modifier, key), program)
+                count += 3
+                continue # while count
+            word = rng.choice(WORDS).upper()
+            if sentence:
+                stamp += self.pause(0.25)
+                yield "keys", stamp, ("Lshift", "Lshift", program)
+                count += 1
+            for i, char in enumerate(word):
+                stamp += self.pause(0.16, 0.35)
+                yield "keys", stamp, (char, char, program)
+                count += 1
+                if rng.random() < 0.03: # Typo, corrected
+                    for _ in range(rng.randint(1, i + 1)):
+                        stamp += self.pause(0.12, 0.2)
+                        yield "keys", stamp, ("Backspace", "Backspace", program)
+                        count += 1
+            sentence = rng.random() < 0.1
+            if sentence or rng.random() < 0.05:
+                char = "." if sentence else ","
+                stamp += self.pause(0.2, 0.35)
+                yield "keys", stamp, (char, PUNCTUATION[char], program)
+                count += 1
+            key = "Enter" if sentence and rng.random() < 0.3 else "Space"
+            stamp += self.pause(0.2, 0.35)
+            yield "keys", stamp, (key, key, program)
+            count += 1
+            if rng.random() < 0.01: stamp += self.pause(5) # Thinking
+
+
+    def stroke(self, stamp, program):
+        """
+        Yields ("moves", stamp, values) for a mouse stroke to next target,
+        following minimum-jerk velocity profile along a slightly curved path.
+        """
+        rng = self.rng
+        display = self.display if rng.random() < 0.9 else rng.randrange(len(self.displays))
+        dx, dy, dw, dh = self.displays[display]
+        spots = self.hotspots.setdefault((program, display), [
+            (dx + rng.randrange(dw), dy + rng.randrange(dh)) for _ in range(rng.randint(5, 15))
+        ])
+        if rng.random() < 0.7: # Near a frequent target
+            tx, ty = rng.choice(spots)
+            tx, ty = int(rng.gauss(tx, 25)), int(rng.gauss(ty, 15))
+        else: tx, ty = dx + rng.randrange(dw), dy + rng.randrange(dh)
+        tx, ty = max(dx, min(dx + dw - 1, tx)), max(dy, min(dy + dh - 1, ty))
+
+        x0, y0 = self.x, self.y
+        distance = math.hypot(tx - x0, ty - y0)
+        duration = 0.1 + 0.15 * math.log(distance / 20. + 1, 2) # Fitts' law
+        curve = rng.gauss(0, 0.1) * distance
+        steps = max(2, int(duration / 0.05))
+        for i in range(1, steps + 1):
+            t = float(i) / steps
+            s = 10 * t**3 - 15 * t**4 + 6 * t**5
+            bend = curve * math.sin(math.pi * t)
+            nx, ny = (ty - y0) / (distance or 1), -(tx - x0) / (distance or 1)
+            x = int(x0 + (tx - x0) * s + nx * bend + rng.gauss(0, 0.5))
+            y = int(y0 + (ty - y0) * s + ny * bend + rng.gauss(0, 0.5))
+            x, y = max(dx, min(dx + dw - 1, x)), max(dy, min(dy + dh - 1, y))
+            stamp += duration / steps
+            yield "moves", stamp, (x, y, display, program)
+        self.x, self.y, self.display = tx, ty, display
+
+
+    def pause(self, median, sigma=0.8):
+        """Returns random pause in seconds from log-normal distribution."""
+        return self.rng.lognormvariate(math.log(median), sigma) * self.pace
+
+
+    def choose(self, items, weights):
+        """Returns random item by weights."""
+        value, total = self.rng.uniform(0, sum(weights)), 0
+        for item, weight in zip(items, weights):
+            total += weight
+            if value <= total: return item
+        return items[-1]
+
+
+
+def parse_count(text):
+    """Returns number from text like "1M" or "100k"."""
+    text = text.strip().upper()
+    factor = {"K": 10**3, "M": 10**6, "G": 10**9}.get(text[-1:], 1)
+    return int(float(text[:-1] if factor > 1 else text) * factor)
+
+
+def generate(path, rows, days=None, seed=1):
+    """Writes a new database at path, with given total number of events over days."""
+    days = days or int(math.ceil(float(rows) / DAY_EVENTS))
+    if os.path.exists(path): os.remove(path)
+    db = sqlite3.connect(path)
+    db.execute("PRAGMA journal_mode = OFF")
+    db.execute("PRAGMA synchronous = OFF")
+    triggers = [x for x in conf.DbStatements if x.lstrip().upper().startswith("CREATE TRIGGER")]
+    for sql in conf.DbStatements:
+        if sql not in triggers: db.execute(sql)
+
+    columns = {"moves":   "x, y, display, fk_program",
+               "clicks":  "x, y, button, display, fk_program",
+               "scrolls": "x, y, dx, dy, display, fk_program",
+               "keys":    "key, realkey, fk_program",
+               "combos":  "key, realkey, fk_program"}
+    sqls = dict((t, "INSERT INTO %s (day, stamp, %s) VALUES (%s)" %
+                    (t, c, ", ".join("?" * (len(c.split(",")) + 2))))
+                for t, c in columns.items())
+    for program, _, _ in PROGRAMS:
+        db.execute("INSERT INTO programs (path) VALUES (?)", [program])
+
+    rng = random.Random(seed)
+    generator = Generator(rng, pace=min(1, float(DAY_EVENTS) * days / rows))
+    total, started = 0, time.time()
+    for i in range(days):
+        day = START + datetime.timedelta(days=i)
+        for offset, screens in SCREENS:
+            if i != offset: continue # for offset
+            generator.displays = screens
+            generator.hotspots.clear()
+            generator.x, generator.y, generator.display = screens[0][0] + 500, 500, 0
+            for j, (x, y, w, h) in enumerate(screens):
+                db.execute("INSERT INTO screen_sizes (dt, x, y, w, h, display) "
+                           "VALUES (?, ?, ?, ?, ?, ?)", [day.isoformat() + " 08:00:00", x, y, w, h, j])
+        budget = (rows - total) // (days - i)
+        if day.weekday() > 4 and i < days - 1: budget = int(budget * rng.uniform(0.1, 0.5))
+        midnight = time.mktime(day.timetuple())
+        batches = dict((t, []) for t in columns)
+        for table, values in generator.day(midnight, budget):
+            if values[0] - midnight >= 86400: break # for table
+            batches[table].append((day.isoformat(), ) + values)
+        for table, batch in batches.items():
+            db.executemany(sqls[table], batch)
+            total += len(batch)
+
+        if not i % 10 and batches["keys"]: # Session over part of day
+            stamps = sorted(v[1] for vv in batches.values() for v in vv)
+            a, b = sorted(rng.sample(range(len(stamps)), 2))
+            db.execute("INSERT INTO sessions (name, day1, day2, start, end) VALUES (?, ?, ?, ?, ?)",
+                       ["Project %s" % (i // 10 + 1), day.isoformat(), day.isoformat(),
+                        stamps[a], stamps[b]])
+        db.commit()
+        if not (i + 1) % 10 or i + 1 == days:
+            print("\rDay %s of %s, %s events, %.1fs." % (i + 1, days, "{:,}".format(total),
+                  time.time() - started), end="")
+            sys.stdout.flush()
+
+    for table in columns:
+        db.execute("INSERT INTO counts (type, day, count) "
+                   "SELECT ?, day, COUNT(*) FROM %s GROUP BY day" % table, [table])
+    for sql in triggers: db.execute(sql)
+    db.commit()
+    db.close()
+    print("\nWrote %s events to %s." % ("{:,}".format(total), path))
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generates a synthetic InputScope database.")
+    parser.add_argument("path", help="database file to write, overwritten if exists")
+    parser.add_argument("rows", nargs="?", default="1M", help="total events, like 1M, 10M or 100M")
+    parser.add_argument("--days", type=int, help="number of days, default about %s events per day"
+                                                 % "{:,}".format(DAY_EVENTS))
+    parser.add_argument("--seed", type=int, default=1, help="random seed, default 1")
+    args = parser.parse_args()
+    generate(args.path, parse_count(args.rows), args.days, args.seed)
+
+
+if "__main__" == __name__:
+    main()
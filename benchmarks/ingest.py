@@ -0,0 +1,242 @@
+# -*- coding: utf-8 -*-
+"""
+Headless ingestion load test for the listener: feeds synthetic or recorded
+input events into listener event queue at configurable rates, as input hooks would,
+with writer process inserting events to a temporary database. Needs no display.
+
+Reports sustained event rates, events dropped at MaxEventsForQueue,
+events merged or filtered, database write durations and queue depth,
+and database growth per hour, preceded by latency histograms from writer process.
+Events still queued when waiting for queues to empty times out are reported unreceived.
+
+    python benchmarks/ingest.py [--mouse-rate HZ] [--typing-rate KEYS] [--duration SECONDS]
+                                [--write-interval SECONDS] [--queue EVENTS] [--no-join]
+                                [--replay DATABASE [--speed FACTOR]] [--output REPORT.json]
+
+Synthetic mouse moves are polled at fixed rate like 125..8000 Hz,
+with clicks and scroll bursts, and keys are typed in bursts of words.
+Replay takes events from an existing database in their recorded rhythm.
+
+------------------------------------------------------------------------------
+This file is part of InputScope - mouse and keyboard input visualizer.
+Released under the MIT License.
+
+@author      Erki Suurjaak
+@created     18.10.2026
+@modified    18.10.2026
+------------------------------------------------------------------------------
+"""
+from __future__ import print_function
+import argparse
+import collections
+import heapq
+import json
+import math
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from inputscope import conf
+from inputscope import listener
+from inputscope import status
+from inputscope.listener import CLICKS, COMBOS, KEYS, MOVES, SCROLLS, clock
+
+
+"""Seconds between status samples."""
+SAMPLE_INTERVAL = 0.1
+
+"""Longest wait for queues to empty after feeding, in EventsWriteInterval."""
+DRAIN_FACTOR = 3
+
+
+def synthetic(mouse_rate, typing_rate, rng):
+    """
+    Yields (delay in seconds, event values) endlessly, event values as (code, *values),
+    for mouse moves at fixed polling rate along a wandering path, clicks and scroll bursts,
+    and keys typed in bursts of words averaging typing rate.
+    """
+    streams = [] # [(due, order, kind)]
+    if mouse_rate:  streams += [(1. / mouse_rate, 0, "move"), (1, 1, "click"), (5, 2, "scroll")]
+    if typing_rate: streams += [(rng.expovariate(typing_rate), 3, "key")]
+    heapq.heapify(streams)
+    now, phase, word, length, scrolls = 0, 0., 0, 0, 0
+    while streams:
+        due, order, kind = heapq.heappop(streams)
+        delay, now = due - now, due
+        if "move" == kind:
+            phase += 1. / mouse_rate
+            x = int(960 + 800 * math.sin(phase * 0.7) + rng.gauss(0, 1))
+            y = int(540 + 450 * math.sin(phase * 1.1) + rng.gauss(0, 1))
+            yield delay, (MOVES, x, y)
+            due += 1. / mouse_rate
+        elif "click" == kind:
+            yield delay, (CLICKS, rng.randrange(1920), rng.randrange(1080), 1)
+            due += rng.expovariate(1)
+        elif "scroll" == kind:
+            yield delay, (SCROLLS, 960, 540, 0, -1)
+            scrolls = scrolls - 1 if scrolls else rng.randint(5, 20)
+            due += 0.02 if scrolls else rng.expovariate(0.2)
+        else:
+            if not word: word = length = rng.randint(2, 10) # Keys left in word, with space
+            key = chr(ord("A") + rng.randrange(26)) if word > 1 else "Space"
+            yield delay, (KEYS, key, key)
+            if rng.random() < 0.01:
+                yield 0.15, (KEYS, "Lcontrol", "Lcontrol")
+                yield 0.15, (KEYS, "C", "C")
+                yield 0,    (COMBOS, "Ctrl-C", "Lcontrol-C")
+                now += 0.3
+            word -= 1
+            # Keys in bursts of ~12 per second, pauses between words keeping average rate
+            gap = 1. / max(12, typing_rate)
+            due += rng.lognormvariate(math.log(gap), 0.35)
+            if not word and 1. / typing_rate > gap:
+                due += rng.expovariate(1. / (length * (1. / typing_rate - gap)))
+        heapq.heappush(streams, (due, order, kind))
+
+
+def recorded(path, speed=1., maxpause=1.):
+    """
+    Yields (delay in seconds, event values) for events in database ordered by time,
+    event values as (code, *values), delays shortened by speed and capped at maxpause.
+    """
+    connection = sqlite3.connect(path)
+    codes, fields = dict(zip(listener.CATEGORIES, range(5))), listener.FIELDS
+    sql = " UNION ALL ".join("SELECT stamp, '%s', %s FROM %s" %
+                             (t, ", ".join(fields[t] + ("NULL", ) * (4 - len(fields[t]))), t)
+                             for t in listener.CATEGORIES)
+    last = None
+    for row in connection.execute(sql + " ORDER BY stamp"):
+        delay = 0 if last is None else min(maxpause, (row[0] - last) / speed)
+        last = row[0]
+        yield delay, (codes[row[1]], ) + row[2:2 + len(fields[row[1]])]
+    connection.close()
+
+
+def feed(sender, events, duration, counts):
+    """Feeds events to sender.handle() in real time for duration seconds."""
+    start = clock()
+    due, deadline = start, start + duration
+    for delay, event in events:
+        due += delay
+        if due > deadline: break # for delay
+        wait = due - clock()
+        if wait > 0.001: time.sleep(wait) # Smaller waits accumulate into batches
+        sender.handle((event[0], clock()) + event[1:])
+        counts[event[0]] += 1
+
+
+def get_db_size():
+    """Returns size of database contents in bytes, including pages still in write-ahead log."""
+    connection = sqlite3.connect(conf.DbPath)
+    try:
+        pages = connection.execute("PRAGMA page_count").fetchone()[0]
+        free  = connection.execute("PRAGMA freelist_count").fetchone()[0]
+        return (pages - free) * connection.execute("PRAGMA page_size").fetchone()[0]
+    finally: connection.close()
+
+
+def run(args):
+    """Runs load test with parsed command-line arguments, returns report as dict."""
+    tempdir = tempfile.mkdtemp()
+    conf.DbPath = os.path.join(tempdir, "ingest.db")
+    if args.write_interval is not None: conf.EventsWriteInterval = args.write_interval
+    if args.queue is not None: conf.MaxEventsForQueue = args.queue
+    if args.no_join: conf.MouseMoveJoinInterval = conf.MouseScrollJoinInterval = 0
+    for flag in conf.InputFlags.values(): setattr(conf, flag, True)
+    settings = ["EventsWriteInterval", "MaxEventsForQueue", "MouseMoveJoinInterval",
+                "MouseScrollJoinInterval", "EventsCollectInterval"]
+
+    sender = listener.Sender()
+    for name in settings: # Writer process loads configuration file anew
+        sender.command("configure %s %r" % (name, getattr(conf, name)))
+    while not (status.read() or {}).get("pid"): time.sleep(0.1)
+    size0 = get_db_size()
+
+    rng = random.Random(1)
+    events = recorded(args.replay, args.speed) if args.replay else \
+             synthetic(args.mouse_rate, args.typing_rate, rng)
+    offered = collections.Counter() # {category code: count}
+    samples = [] # [status]
+    feeder = threading.Thread(target=feed, args=(sender, events, args.duration, offered))
+    print("Feeding events for %s seconds.." % args.duration)
+    started = time.time()
+    feeder.start()
+    while feeder.is_alive():
+        feeder.join(SAMPLE_INTERVAL)
+        samples.append(status.read() or {})
+    fed = time.time() - started
+    deadline = time.time() + DRAIN_FACTOR * conf.EventsWriteInterval + 1
+    while time.time() < deadline and (sender.events or samples[-1].get("depth")):
+        time.sleep(SAMPLE_INTERVAL)
+        samples.append(status.read() or {})
+    sender.command("stats")
+    sender.stop() # Writes out remaining events
+    drained = time.time() - started
+    final = status.read() or samples[-1]
+    samples = [x for x in samples + [final] if x]
+    size1 = get_db_size()
+
+    total = sum(offered.values())
+    dropped = dict((c, final.get("dropped_" + c, 0)) for c in listener.CATEGORIES)
+    flushes = final.get("flushes") or 1
+    report = collections.OrderedDict([
+        ("settings",        dict((k, getattr(conf, k)) for k in settings)),
+        ("source",          args.replay or "synthetic %s Hz mouse, %s keys/s" %
+                                           (args.mouse_rate, args.typing_rate)),
+        ("duration",        round(fed, 3)),
+        ("drain",           round(drained - fed, 3)),
+        ("offered",         dict((c, offered[i]) for i, c in enumerate(listener.CATEGORIES))),
+        ("offered_rate",    round(total / fed, 1)),
+        ("received",        final.get("received", 0)),
+        ("received_rate",   round(final.get("received", 0) / drained, 1)),
+        ("unreceived",      total - final.get("received", 0)),
+        ("written",         dict((c, final.get("flushed_" + c, 0)) for c in listener.CATEGORIES)),
+        ("written_rate",    round(final.get("flushed", 0) / drained, 1)),
+        ("dropped",         dropped),
+        ("merged",          final.get("received", 0) - sum(dropped.values()) -
+                            final.get("flushed", 0)),
+        ("flushes",         final.get("flushes", 0)),
+        ("flush_mean",      round(final.get("flush_total", 0) / flushes, 4)),
+        ("flush_max",       round(max([x["flush_duration"] for x in samples] or [0]), 4)),
+        ("depth_max",       max([x["depth"] for x in samples] or [0])),
+        ("db_growth",       size1 - size0),
+        ("db_growth_hour",  int((size1 - size0) / fed * 3600)),
+        ("bytes_per_event", round((size1 - size0) / (final.get("flushed") or 1), 1)),
+    ])
+    shutil.rmtree(tempdir, ignore_errors=True)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless listener ingestion load test.")
+    parser.add_argument("--mouse-rate", type=float, default=1000,
+                        help="mouse polling rate in Hz, default 1000, 0 for none")
+    parser.add_argument("--typing-rate", type=float, default=5,
+                        help="average keys per second, default 5, 0 for none")
+    parser.add_argument("--duration", type=float, default=30, help="seconds, default 30")
+    parser.add_argument("--write-interval", type=float, help="EventsWriteInterval override")
+    parser.add_argument("--queue", type=int, help="MaxEventsForQueue override")
+    parser.add_argument("--no-join", action="store_true",
+                        help="disable merging nearby mouse moves and scrolls")
+    parser.add_argument("--replay", metavar="DATABASE", help="replay events from database")
+    parser.add_argument("--speed", type=float, default=1, help="replay speed factor, default 1")
+    parser.add_argument("--output", help="file to write JSON report to")
+    args = parser.parse_args()
+
+    report = run(args)
+    print()
+    for k, v in report.items(): print("%-16s %s" % (k, v))
+    if args.output:
+        with open(args.output, "w") as f: json.dump(report, f, indent=2)
+        print("\nWrote report to %s." % args.output)
+
+
+if "__main__" == __name__:
+    main()
@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+"""
+Runs a sample background schema migration on a copy of given database, like one
+from generate.py, while feeding synthetic events into listener as ingest.py does,
+with writer process inserting events to the same database. Needs no display.
+
+Reports migration duration and rate, and listener ingestion before and during
+migration: database write durations, queue depth and dropped events.
+Verifies that all rows up to migration end were migrated.
+
+    python benchmarks/migrate.py DATABASE [--mouse-rate HZ] [--typing-rate KEYS]
+                                 [--warmup SECONDS] [--chunk-duration SECONDS]
+                                 [--pause SECONDS] [--output REPORT.json]
+
+Sample migration adds column "hour" to moves, fills it in background chunks,
+and indexes it when done, as in the DbMigrations example:
+
+    (version, "moves hour", {
+        "statements": ["ALTER TABLE moves ADD COLUMN hour INTEGER"],
+        "table":      "moves",
+        "chunk":      "UPDATE moves SET hour = .. WHERE id BETWEEN :lo AND :hi",
+        "finish":     ["CREATE INDEX IF NOT EXISTS idx_moves_hour ON moves (hour)"],
+    })
+
+Migration is run in this process, on its own connection like in writer process.
+
+------------------------------------------------------------------------------
+This file is part of InputScope - mouse and keyboard input visualizer.
+Released under the MIT License.
+
+@author      Erki Suurjaak
+@created     18.10.2026
+@modified    18.10.2026
+------------------------------------------------------------------------------
+"""
+from __future__ import print_function
+import argparse
+import collections
+import itertools
+import json
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from inputscope import conf
+from inputscope import listener
+from inputscope import migrations
+from inputscope import status
+
+import ingest
+
+
+"""Sample migration, as (name, options) in DbMigrations."""
+SAMPLE = ("moves hour", {
+    "statements": ["ALTER TABLE moves ADD COLUMN hour INTEGER"],
+    "table":      "moves",
+    "chunk":      "UPDATE moves SET hour = CAST(strftime('%H', stamp, 'unixepoch', 'localtime') "
+                  "AS INTEGER) WHERE id BETWEEN :lo AND :hi",
+    "finish":     ["CREATE INDEX IF NOT EXISTS idx_moves_hour ON moves (hour)"],
+})
+
+
+def summarize(samples, start, end):
+    """Returns ingestion statistics from status samples taken within start..end, as dict."""
+    window = [x for t, x in samples if start <= t <= end]
+    if len(window) < 2: return {}
+    first, last = window[0], window[-1]
+    delta = lambda k: last.get(k, 0) - first.get(k, 0)
+    writes = [x["flush_duration"] for x in window if start <= x["flushed_at"] <= end]
+    return collections.OrderedDict([
+        ("written_rate", round(delta("flushed") / (end - start), 1)),
+        ("dropped",      delta("dropped")),
+        ("flushes",      delta("flushes")),
+        ("flush_mean",   round(delta("flush_total") / (delta("flushes") or 1), 4)),
+        ("flush_max",    round(max(writes or [0]), 4)),
+        ("depth_max",    max(x["depth"] for x in window)),
+    ])
+
+
+def run(args):
+    """Runs migration under load with parsed command-line arguments, returns report as dict."""
+    tempdir = tempfile.mkdtemp()
+    try:
+        conf.DbPath = os.path.join(tempdir, os.path.basename(args.database))
+        shutil.copy(args.database, conf.DbPath)
+        if args.chunk_duration is not None: conf.DbMigrationChunkDuration = args.chunk_duration
+        if args.pause is not None: conf.DbMigrationPause = args.pause
+        for flag in conf.InputFlags.values(): setattr(conf, flag, True)
+        settings = ["EventsWriteInterval", "MaxEventsForQueue", "EventsCollectInterval",
+                    "DbMigrationChunkDuration", "DbMigrationPause"]
+
+        sender = listener.Sender()
+        for name in settings[:3]: # Writer process loads configuration file anew
+            sender.command("configure %s %r" % (name, getattr(conf, name)))
+        while not (status.read() or {}).get("pid"): time.sleep(0.1)
+
+        connection = sqlite3.connect(conf.DbPath)
+        version = max(conf.DbVersion, connection.execute("PRAGMA user_version").fetchone()[0]) + 1
+        rows = connection.execute("SELECT COUNT(*) FROM moves").fetchone()[0]
+        sample = [(version, ) + SAMPLE]
+
+        done = threading.Event()
+        events = ingest.synthetic(args.mouse_rate, args.typing_rate, random.Random(1))
+        events = itertools.takewhile(lambda _: not done.is_set(), events)
+        offered = collections.Counter() # {category code: count}
+        feeder = threading.Thread(target=ingest.feed, args=(sender, events, 1e9, offered))
+        samples = [] # [(timestamp, status)]
+        sample_status = lambda: samples.append((time.time(), status.read() or {}))
+
+        print("Feeding events for %s seconds before migration.." % args.warmup)
+        started = time.time()
+        feeder.start()
+        while time.time() - started < args.warmup:
+            time.sleep(ingest.SAMPLE_INTERVAL)
+            sample_status()
+
+        print("Migrating %s rows in moves.." % "{:,}".format(rows))
+        migrated = time.time()
+        migrations.upgrade(conf.DbPath, sample)
+        upgraded = time.time()
+        runner = migrations.Runner(conf.DbPath, migrations=sample)
+        while runner.is_alive():
+            runner.join(ingest.SAMPLE_INTERVAL)
+            sample_status()
+        finished = time.time()
+        done.set(), feeder.join()
+        sender.stop()
+
+        row = connection.execute("SELECT * FROM migrations WHERE version = ?", [version]).fetchone()
+        cols = [x[0] for x in connection.execute("SELECT * FROM migrations LIMIT 0").description]
+        row = dict(zip(cols, row))
+        sql = "SELECT COUNT(*) FROM moves WHERE hour IS NULL AND id <= ?"
+        unmigrated = connection.execute(sql, [row["position"]]).fetchone()[0]
+        connection.close()
+
+        report = collections.OrderedDict([
+            ("settings",      dict((k, getattr(conf, k)) for k in settings)),
+            ("source",        "synthetic %s Hz mouse, %s keys/s" % (args.mouse_rate, args.typing_rate)),
+            ("database",      os.path.abspath(args.database)),
+            ("rows",          rows),
+            ("startup",       round(upgraded - migrated, 3)),
+            ("duration",      round(finished - upgraded, 3)),
+            ("rate",          round((row["position"] - row["first"]) / (finished - upgraded), 1)),
+            ("completed",     bool(row["finished"])),
+            ("error",         row["error"]),
+            ("unmigrated",    unmigrated),
+            ("offered",       sum(offered.values())),
+            ("before",        summarize(samples, started, migrated)),
+            ("during",        summarize(samples, migrated, finished)),
+        ])
+        return report
+    finally:
+        shutil.rmtree(tempdir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Background migration under listener load.")
+    parser.add_argument("database", help="database to migrate a copy of, left unchanged")
+    parser.add_argument("--mouse-rate", type=float, default=1000,
+                        help="mouse polling rate in Hz, default 1000, 0 for none")
+    parser.add_argument("--typing-rate", type=float, default=5,
+                        help="average keys per second, default 5, 0 for none")
+    parser.add_argument("--warmup", type=float, default=10,
+                        help="seconds of feeding events before migration, default 10")
+    parser.add_argument("--chunk-duration", type=float, help="DbMigrationChunkDuration override")
+    parser.add_argument("--pause", type=float, help="DbMigrationPause override")
+    parser.add_argument("--output", help="file to write JSON report to")
+    args = parser.parse_args()
+
+    report = run(args)
+    print()
+    for k, v in report.items(): print("%-12s %s" % (k, v))
+    if args.output:
+        with open(args.output, "w") as f: json.dump(report, f, indent=2)
+        print("\nWrote report to %s." % args.output)
+
+
+if "__main__" == __name__:
+    main()
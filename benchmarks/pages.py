@@ -0,0 +1,248 @@
+# -*- coding: utf-8 -*-
+"""
+Times web UI pages on a copy of given database, across tables, periods,
+application filters and sessions, writing a JSON report comparable between commits.
+
+    python benchmarks/pages.py DATABASE [--repeat N] [--profile] [--set NAME=VALUE ..]
+                               [--output REPORT.json]
+    python benchmarks/pages.py --compare OLD.json NEW.json
+
+Each page is requested in-process N times, first run reported as cold and
+the fastest of the rest as warm, with in-memory caches and stored summaries
+carried over from earlier runs. Durations of stats_mouse, stats_keyboard and
+stats_sessions are collected from within page requests.
+
+With --profile, every request is profiled as with WebProfileSample 1, and
+collapsing each profile into flame graph stacks is timed and checked to finish
+within COLLAPSE_LIMIT seconds; page durations then include profiler overhead.
+
+Runs with default configuration, not reading configuration file, and with
+background jobs and query budgets disabled so that every page is computed fully.
+Settings can be overridden with --set, like --set StatsInDatabase=false
+for comparing statistics computed in database against computed in Python.
+
+------------------------------------------------------------------------------
+This file is part of InputScope - mouse and keyboard input visualizer.
+Released under the MIT License.
+
+@author      Erki Suurjaak
+@created     18.10.2026
+@modified    18.10.2026
+------------------------------------------------------------------------------
+"""
+from __future__ import print_function
+import argparse
+import collections
+import datetime
+import functools
+import json
+import os
+import platform
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+import wsgiref.util
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from inputscope import conf
+
+
+"""Web UI functions timed within page requests."""
+FUNCTIONS = ["stats_mouse", "stats_keyboard", "stats_sessions"]
+
+"""Configuration settings recorded in report, as affecting page performance."""
+SETTINGS = ["MaxEventsForStats", "StatsInDatabase", "StatsNumpyEnabled", "StatsParallel",
+            "StatsProcesses", "StatsSampling", "StatsSummaries", "WebPackedData"]
+
+"""Maximum seconds for collapsing a page request profile into stacks."""
+COLLAPSE_LIMIT = 10
+
+_timings = collections.defaultdict(list) # {function name: [seconds]} in current request
+
+
+def timed(name, func):
+    """Returns function wrapper adding invocation durations to _timings."""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        start = time.time()
+        try: return func(*args, **kwargs)
+        finally: _timings[name].append(time.time() - start)
+    return wrapper
+
+
+def request(app, path):
+    """Returns (HTTP status, seconds, {function: seconds}) for requesting path from app."""
+    env = {"PATH_INFO": path, "REMOTE_ADDR": "127.0.0.1"}
+    wsgiref.util.setup_testing_defaults(env)
+    status = []
+    _timings.clear()
+    start = time.time()
+    body = app(env, lambda s, headers, exc_info=None: status.append(s))
+    for _ in body: pass
+    getattr(body, "close", lambda: None)()
+    duration = time.time() - start
+    return status[0].split()[0], duration, dict((k, sum(v)) for k, v in _timings.items())
+
+
+def make_cases(db):
+    """Returns pages to time, as [(name, path)], from database contents."""
+    cases = [("index", "/"), ("inputindex mouse", "/mouse"), ("inputindex keyboard", "/keyboard")]
+    app = db.fetchone("moves", "fk_program, COUNT(*) AS count", group="fk_program",
+                      where=[("fk_program", ("IS NOT", None))], order=[("count", "DESC")])
+    for input, tables in conf.InputTables:
+        for table in tables:
+            days = [x["day"] for x in db.fetch("counts", "day || '' AS day", type=table, order="day")]
+            if not days: continue # for table
+            periods = [("all", None), ("month", days[-1][:7]), ("day", days[-1])]
+            for label, period in periods:
+                path = "/%s/%s%s" % (input, table, "/" + period if period else "")
+                cases.append(("%s %s" % (table, label), path))
+                if app: cases.append(("%s %s app" % (table, label),
+                                      path + "/app/id:%s" % app["fk_program"]))
+    session = db.fetchone("sessions", order=[("id", "DESC")])
+    if session:
+        cases += [("session mouse",    "/sessions/%s/mouse/moves" % session["id"]),
+                  ("session keyboard", "/sessions/%s/keyboard/keys" % session["id"])]
+    return cases
+
+
+def collapse(profiles):
+    """Returns (seconds, stack lines) for collapsing latest request profile into stacks."""
+    profile = profiles.get_all()[0]
+    start = time.time()
+    lines = profile.collapse().count("\n")
+    return time.time() - start, lines
+
+
+def run(path, repeat, output=None, profile=False, settings=None):
+    """
+    Times pages on a copy of database at path, returns report as dict.
+
+    @param   settings  configuration overrides, as {name: value}
+    """
+    tempdir = tempfile.mkdtemp()
+    try:
+        conf.DbPath = os.path.join(tempdir, os.path.basename(path))
+        shutil.copy(path, conf.DbPath)
+        conf.init = lambda *args, **kwargs: None # Keep defaults regardless of configuration file
+        conf.WebJobWait, conf.WebQueryBudgets, conf.LiveFeedEnabled = 0, {}, False
+        conf.WebProfileSample = 1 if profile else 0
+        for k, v in (settings or {}).items(): setattr(conf, k, v)
+        from inputscope import db, profiles, webui
+        for name in FUNCTIONS: setattr(webui, name, timed(name, getattr(webui, name)))
+        app = webui.init()
+
+        report = collections.OrderedDict([
+            ("created",  datetime.datetime.now().isoformat()),
+            ("commit",   get_commit()),
+            ("python",   platform.python_version()),
+            ("sqlite",   sqlite3.sqlite_version),
+            ("platform", platform.platform()),
+            ("numpy",    getattr(webui.import_numpy(), "__version__", None)),
+            ("database", collections.OrderedDict([
+                ("path",   os.path.abspath(path)),
+                ("size",   os.path.getsize(path)),
+                ("days",   db.fetchone("counts", "COUNT(DISTINCT day) AS count")["count"]),
+                ("events", dict((x["type"], x["count"]) for x in
+                                db.fetch("counts", "type, SUM(count) AS count", group="type"))),
+            ])),
+            ("settings", dict((k, getattr(conf, k))
+                              for k in SETTINGS + sorted(settings or ()))),
+            ("repeat",   repeat),
+            ("profile",  profile),
+            ("cases",    []),
+        ])
+        for name, page in make_cases(db):
+            runs, functions, collapses = [], collections.defaultdict(list), []
+            for _ in range(repeat):
+                status, duration, timings = request(app, page)
+                runs.append(round(duration, 4))
+                for k, v in timings.items(): functions[k].append(round(v, 4))
+                if profile: collapses.append(collapse(profiles))
+            report["cases"].append(collections.OrderedDict([
+                ("name", name), ("path", page), ("status", int(status)), ("runs", runs),
+                ("cold", runs[0]), ("warm", min(runs[1:]) if repeat > 1 else None),
+                ("functions", functions),
+            ]))
+            note = ""
+            if profile:
+                seconds, lines = max(collapses)
+                report["cases"][-1].update(collapse=round(seconds, 4), stacks=lines)
+                note = "  collapse %.3fs %s stacks%s" % (seconds, lines,
+                       " OVER LIMIT" if seconds > COLLAPSE_LIMIT else "")
+            print("%-24s %-46s %s %8.3fs %s%s" % (name, page, status, runs[0],
+                  "%8.3fs" % min(runs[1:]) if repeat > 1 else "", note))
+        if output:
+            with open(output, "w") as f: json.dump(report, f, indent=2)
+            print("\nWrote report to %s." % output)
+        return report
+    finally:
+        try:
+            from inputscope import db
+            db.close()
+        except Exception: pass
+        shutil.rmtree(tempdir, ignore_errors=True)
+
+
+def compare(path1, path2):
+    """Prints cold and warm durations of two reports side by side, with ratios."""
+    reports = []
+    for path in (path1, path2):
+        with open(path) as f: reports.append(json.load(f))
+    old = dict((x["name"], x) for x in reports[0]["cases"])
+    print("%-24s %9s %9s %7s %9s %9s %7s" % ("case", "cold old", "cold new", "ratio",
+                                              "warm old", "warm new", "ratio"))
+    ratio = lambda a, b: "%6.2fx" % (b / a) if a and b is not None else "%7s" % "-"
+    totals = [0, 0, 0, 0]
+    for case in reports[1]["cases"]:
+        prev = old.get(case["name"])
+        if not prev: continue # for case
+        values = [prev["cold"], case["cold"], prev["warm"], case["warm"]]
+        texts = ["%9.3f" % v if v is not None else "%9s" % "-" for v in values]
+        print("%-24s %s %s %s %s %s %s" % (case["name"], texts[0], texts[1],
+              ratio(values[0], values[1]), texts[2], texts[3], ratio(values[2], values[3])))
+        for i, v in enumerate(values): totals[i] += v or 0
+    print("%-24s %9.3f %9.3f %6.2fx %9.3f %9.3f %6.2fx" % ("total", totals[0], totals[1],
+          totals[1] / (totals[0] or 1), totals[2], totals[3], totals[3] / (totals[2] or 1)))
+
+
+def get_commit():
+    """Returns current git commit of source tree, or None."""
+    try:
+        cwd = os.path.dirname(os.path.abspath(__file__))
+        args = ["git", "rev-parse", "--short", "HEAD"]
+        return subprocess.check_output(args, cwd=cwd, stderr=subprocess.STDOUT).decode().strip()
+    except Exception: return None
+
+
+def parse_setting(text):
+    """Returns (name, value) from "NAME=VALUE", value parsed as JSON if possible."""
+    name, value = text.split("=", 1)
+    try: return name.strip(), json.loads(value)
+    except ValueError: return name.strip(), value
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Times InputScope web UI pages.")
+    parser.add_argument("database", nargs="?", help="database to benchmark, left unchanged")
+    parser.add_argument("--repeat", type=int, default=3, help="requests per page, default 3")
+    parser.add_argument("--profile", action="store_true",
+                        help="profile requests and time collapsing profiles into stacks")
+    parser.add_argument("--set", action="append", default=[], metavar="NAME=VALUE",
+                        help="configuration setting override, like StatsInDatabase=false")
+    parser.add_argument("--output", help="file to write JSON report to")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="compare two reports")
+    args = parser.parse_args()
+    if args.compare: compare(*args.compare)
+    elif args.database:
+        settings = dict(parse_setting(x) for x in args.set)
+        run(args.database, max(1, args.repeat), args.output, args.profile, settings)
+    else: parser.print_usage()
+
+
+if "__main__" == __name__:
+    main()
@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+"""
+Measures cold-start time of InputScope entry points, each run in a fresh
+Python interpreter on a copy of given database, or on a new empty database:
+
+  main      tray program: imports, database initialization
+  webui     web server: imports, application initialization, first page
+  listener  input listener: imports, pynput import, writer process ready
+  schema    schema initialization on an unstamped and on a stamped database
+
+    python benchmarks/startup.py [DATABASE] [--repeat N] [--imports N] [--output REPORT.json]
+
+Reports fastest and median duration of each phase over N runs, and total process
+duration including interpreter startup. With --imports, lists slowest imports
+of each entry point module, from python -X importtime.
+
+Runs with default configuration, not reading configuration file.
+
+------------------------------------------------------------------------------
+This file is part of InputScope - mouse and keyboard input visualizer.
+Released under the MIT License.
+
+@author      Erki Suurjaak
+@created     18.10.2026
+@modified    18.10.2026
+------------------------------------------------------------------------------
+"""
+from __future__ import print_function
+import argparse
+import collections
+import datetime
+import json
+import os
+import platform
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+import wsgiref.util
+
+SRCPATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+sys.path.insert(0, SRCPATH)
+
+
+"""Entry points and their modules, in order of measurement."""
+ENTRIES = collections.OrderedDict([("main", "inputscope.main"), ("webui", "inputscope.webui"),
+                                   ("listener", "inputscope.listener"), ("schema", "inputscope.db")])
+
+
+def probe(name, path):
+    """Runs entry point startup phases on database at path, returns {phase: seconds}."""
+    result, start = collections.OrderedDict(), [time.time()]
+    def phase(label):
+        result[label], start[0] = time.time() - start[0], time.time()
+
+    from inputscope import conf
+    conf.init = lambda *args, **kwargs: None # Keep defaults regardless of configuration file
+    conf.DbPath = path
+    phase("import conf")
+
+    if "main" == name:
+        from inputscope import main
+        phase("import")
+        from inputscope import db
+        db.init(conf.DbPath, conf.DbStatements, conf.DbUpdateStatements, conf.DbVersion)
+        phase("db init")
+    elif "webui" == name:
+        conf.WebJobWait, conf.LiveFeedEnabled = 0, False
+        from inputscope import webui
+        phase("import")
+        app = webui.init()
+        phase("init")
+        env = {"PATH_INFO": "/", "REMOTE_ADDR": "127.0.0.1"}
+        wsgiref.util.setup_testing_defaults(env)
+        for _ in app(env, lambda *args, **kwargs: None): pass
+        phase("first page")
+    elif "listener" == name:
+        from inputscope import listener, status
+        phase("import")
+        try: listener.import_pynput()
+        except Exception: pass # Fails without display
+        else: phase("import pynput")
+        sender = listener.Sender()
+        sender.command("configure EventsWriteInterval 0")
+        while not (status.read() or {}).get("pid"): time.sleep(0.001)
+        phase("writer ready")
+        sender.stop()
+    elif "schema" == name:
+        from inputscope import db
+        phase("import")
+        args = conf.DbStatements, conf.DbUpdateStatements, conf.DbVersion
+        connection = sqlite3.connect(path, isolation_level=None)
+        connection.execute("PRAGMA user_version = 0")
+        phase("open")
+        db.init_schema(connection, *args)
+        phase("unstamped")
+        db.init_schema(connection, *args)
+        phase("stamped")
+        connection.close()
+    return result
+
+
+def measure(name, path, repeat):
+    """Runs entry point probe in fresh interpreters, returns {phase: [seconds]}."""
+    result = collections.defaultdict(list)
+    for _ in range(repeat):
+        args = [sys.executable, os.path.abspath(__file__), "--probe", name, path]
+        start = time.time()
+        output = subprocess.check_output(args, cwd=tempfile.gettempdir())
+        duration = time.time() - start
+        for k, v in json.loads(output.decode().strip().splitlines()[-1]).items():
+            result[k].append(v)
+        result["process total"].append(duration)
+    return result
+
+
+def get_imports(module, top):
+    """Returns slowest imports of module in a fresh interpreter, as [(name, cumulative ms)]."""
+    args = [sys.executable, "-X", "importtime", "-c", "import %s" % module]
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(bool, [SRCPATH,
+                                                                     os.getenv("PYTHONPATH")])))
+    output = subprocess.Popen(args, env=env, stderr=subprocess.PIPE).communicate()[1].decode()
+    rows = []
+    for line in output.splitlines():
+        parts = line.split("|")
+        if len(parts) != 3 or not parts[1].strip().isdigit(): continue # for line
+        rows.append((parts[2].rstrip(), int(parts[1]) / 1000.))
+    return sorted(rows, key=lambda x: -x[1])[:top]
+
+
+def run(path, repeat, imports=0, output=None):
+    """Measures all entry points on a copy of database at path, returns report as dict."""
+    tempdir = tempfile.mkdtemp()
+    try:
+        dbpath = os.path.join(tempdir, os.path.basename(path) if path else "startup.db")
+        if path: shutil.copy(path, dbpath)
+        report = collections.OrderedDict([
+            ("created",  datetime.datetime.now().isoformat()),
+            ("python",   platform.python_version()),
+            ("platform", platform.platform()),
+            ("database", os.path.abspath(path) if path else None),
+            ("repeat",   repeat),
+            ("entries",  collections.OrderedDict()),
+        ])
+        for name, module in ENTRIES.items():
+            print("%s:" % name)
+            timings, entry = measure(name, dbpath, repeat), collections.OrderedDict()
+            for phase, values in timings.items():
+                values = sorted(values)
+                entry[phase] = collections.OrderedDict([
+                    ("min", round(values[0], 4)), ("median", round(values[len(values) // 2], 4)),
+                ])
+                print("  %-16s %8.3fs %8.3fs" % (phase, values[0], values[len(values) // 2]))
+            if imports and sys.version_info >= (3, 7):
+                entry["imports"] = get_imports(module, imports)
+                for imported, millis in entry["imports"]: print("    %8.1fms  %s" % (millis, imported))
+            report["entries"][name] = entry
+        if output:
+            with open(output, "w") as f: json.dump(report, f, indent=2)
+            print("\nWrote report to %s." % output)
+        return report
+    finally:
+        shutil.rmtree(tempdir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measures InputScope cold-start times.")
+    parser.add_argument("database", nargs="?", help="database to start with, left unchanged")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per entry point, default 5")
+    parser.add_argument("--imports", type=int, default=0, metavar="N",
+                        help="list N slowest imports of each entry point")
+    parser.add_argument("--output", help="file to write JSON report to")
+    parser.add_argument("--probe", nargs=2, help=argparse.SUPPRESS) # Internal: NAME DATABASE
+    args = parser.parse_args()
+    if args.probe: print(json.dumps(probe(*args.probe)))
+    else: run(args.database, max(1, args.repeat), args.imports, args.output)
+
+
+if "__main__" == __name__:
+    main()
@@ -1,5 +1,5 @@
 """Package entry point."""
-from . import listener, main, webui
+from . import main
 
 if "__main__" == __name__:
     main.main()
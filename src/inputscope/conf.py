@@ -24,7 +24,7 @@ Released under the MIT License.
 
 @author      Erki Suurjaak
 @created     26.03.2015
-@modified    17.04.2024
+@modified    18.10.2026
 ------------------------------------------------------------------------------
 """
 import ast
@@ -123,6 +123,19 @@ MouseScrollJoinInterval = 0.5
 """Interval between writing events to database, in seconds."""
 EventsWriteInterval = 5
 
+"""
+Interval between collecting events from input hooks, in seconds.
+Foreground program is resolved once per interval, for events collected.
+"""
+EventsCollectInterval = 0.2
+
+"""
+Traces latency of every Nth event in listener, from input hook to database write:
+1 traces all events, higher values trace fewer with lower overhead, 0 disables.
+Histograms are printed out with listener "stats" command.
+"""
+EventsTraceSample = 1
+
 """Interval between checking and saving screen size, in seconds."""
 ScreenSizeInterval = 10
 
@@ -130,7 +143,50 @@ ScreenSizeInterval = 10
 MaxEventsForStats = 1000 * 1000
 
 """Maximum number of events to replay on statistics page."""
-MaxEventsForReplay = 100 * 1000
+MaxEventsForReplay = 1000 * 1000
+
+"""Number of events in one chunk of replay data loaded by statistics page."""
+ReplayChunkSize = 10 * 1000
+
+"""Whether statistics are computed with NumPy, if available."""
+StatsNumpyEnabled = True
+
+"""
+Whether statistics are computed in database over all events in range,
+instead of events limited by MaxEventsForStats. Requires SQLite 3.25+.
+"""
+StatsInDatabase = True
+
+"""
+Whether statistics and heatmap over several days are merged from per-day partials
+over all events in range, computed in parallel processes.
+"""
+StatsParallel = True
+
+"""Number of processes for computing statistics, 0 for number of CPUs, 1 for no subprocesses."""
+StatsProcesses = 0
+
+"""Number of per-day partial statistics kept in memory for reuse."""
+StatsCacheDays = 1000
+
+"""
+Whether statistics of past days are stored in database as summaries,
+computed in the background by listener and reused on statistics page.
+"""
+StatsSummaries = True
+
+"""Interval between storing batches of missing day summaries in listener, in seconds."""
+StatsSummaryInterval = 60
+
+"""Maximum number of day summaries to store in one batch."""
+StatsSummaryBatch = 10
+
+"""
+Whether mouse statistics and heatmap over more than MaxEventsForStats events
+are estimated from a sample spread evenly over each day in range,
+looked up by row ID, reading a fixed number of rows regardless of range size.
+"""
+StatsSampling = False
 
 """Maximum number of events to queue for database insertion, excess is discarded."""
 MaxEventsForQueue = 1000
@@ -317,6 +373,86 @@ WebAutoReload = False
 """Whether web server is quiet or echoes access log."""
 WebQuiet = False
 
+"""
+Whether web UI process is started on first connection to web port or opening web UI from tray,
+instead of at program start. Not applied with WebAutoReload.
+"""
+WebOnDemand = True
+
+"""
+Seconds without requests after which web UI process started on demand exits, 0 to never exit.
+Requests to /metrics and open event streams are not counted. A /metrics request still starts
+web UI process if not running, so regular scraping keeps restarting it: disable WebOnDemand
+when scraping metrics.
+"""
+WebIdleTimeout = 600
+
+"""Whether heatmap and replay data is sent to statistics page in compact binary encoding."""
+WebPackedData = True
+
+"""Whether listener sends inserted events to web UI, for updating statistics pages of today live."""
+LiveFeedEnabled = True
+
+"""Local UDP port for live feed from listener to web UI."""
+LiveFeedPort = 8098
+
+"""Number of most recent live feed events kept in web UI for clients connecting later."""
+LiveFeedBuffer = 10000
+
+"""
+Seconds to wait for statistics computation before showing a progress page instead,
+computation continuing as background job; 0 disables background jobs.
+"""
+WebJobWait = 2
+
+"""Seconds after which a background job without any waiting clients is cancelled."""
+WebJobAbandonTimeout = 10
+
+"""Seconds for which a finished job result is reused even if events have been added since."""
+WebJobResultTimeout = 60
+
+"""Maximum number of finished job results kept for reuse."""
+WebJobResults = 20
+
+"""
+Time budgets in seconds for database queries in web page handlers, by handler name,
+and for each attempt of computing statistics page contents, as "stats".
+Statistics over budget are estimated from a sample or fewer days where possible.
+"""
+WebQueryBudgets = {"inputreplay": 30, "stats": 60}
+
+"""
+Whether web UI records database query durations by statement shape,
+viewable at /debug/queries from local clients.
+"""
+DbProfiling = False
+
+"""
+Seconds above which a profiled query is logged as slow, with its query plan
+captured for /debug/queries; 0 or None disables.
+"""
+DbSlowQueryThreshold = 0.5
+
+"""
+Fraction of web requests to profile with cProfile, from 0 to 1;
+local clients can also profile any request by adding "profile" to its query string.
+Profiles are viewable at /debug/profiles from local clients.
+"""
+WebProfileSample = 0
+
+"""Maximum number of request profiles kept."""
+WebProfiles = 20
+
+"""
+Whether listener and web UI trace memory allocations from start, for memory reports
+from listener "memory" command and web UI /debug/memory; else tracing starts at first report.
+Tracing slows allocations and adds memory overhead.
+"""
+MemoryTracing = False
+
+"""Number of allocation sites listed in memory reports."""
+MemoryReportTop = 20
+
 """Whether running as a pyinstaller executable."""
 Frozen = getattr(sys, "frozen", False)
 if Frozen:
@@ -368,6 +504,8 @@ DbStatements = (
     "CREATE TABLE IF NOT EXISTS app_events (id INTEGER NOT NULL PRIMARY KEY, dt TIMESTAMP DEFAULT (DATETIME('now', 'localtime')), type TEXT)",
     "CREATE TABLE IF NOT EXISTS screen_sizes (id INTEGER NOT NULL PRIMARY KEY, dt TIMESTAMP DEFAULT (DATETIME('now', 'localtime')), x INTEGER, y INTEGER, w INTEGER, h INTEGER, display INTEGER)",
     "CREATE TABLE IF NOT EXISTS counts (id INTEGER NOT NULL PRIMARY KEY, type TEXT, day DATETIME, count INTEGER, UNIQUE(type, day))",
+    "CREATE TABLE IF NOT EXISTS day_summaries (id INTEGER NOT NULL PRIMARY KEY, type TEXT, day DATETIME, count INTEGER, settings TEXT, data BLOB, UNIQUE(type, day))",
+    "CREATE TABLE IF NOT EXISTS sketches (id INTEGER NOT NULL PRIMARY KEY, type TEXT, day DATETIME, count INTEGER, keys BLOB, programs BLOB, intervals BLOB, UNIQUE(type, day))",
     "CREATE TABLE IF NOT EXISTS sessions (id INTEGER NOT NULL PRIMARY KEY, name TEXT, day1 DATETIME, day2 DATETIME, start REAL, end REAL)",
     "CREATE TABLE IF NOT EXISTS programs (id INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL, path TEXT NOT NULL)",
 ) + tuple(TriggerTemplate .format(t) for _, tt in InputTables for t in tt
@@ -375,6 +513,8 @@ DbStatements = (
 
 """
 Statements to update database to new schema, as {(table, column to check if exists): [ALTER SQLs]}.
+Skipped at startup for databases already stamped with DbVersion: statements added here
+are not executed on such databases unless DbVersion is bumped. Use DbMigrations instead.
 """
 DbUpdateStatements = [
     # v1.3+
@@ -399,6 +539,34 @@ DbUpdateStatements = [
     [("scrolls", "fk_program"), ["ALTER TABLE scrolls ADD COLUMN fk_program INTEGER"]],
 ]
 
+"""
+Baseline database schema version, stamped into database after executing DbStatements
+and DbUpdateStatements, skipping both at startup for databases already at this version.
+Later schema changes go into DbMigrations.
+"""
+DbVersion = 1
+
+"""
+Schema migrations applied after baseline, in ascending versions over DbVersion,
+as [(version, name, {
+    "statements": [SQL executed at startup, quick like ALTER TABLE ADD COLUMN],
+    "table":      table to process in background chunks, by id range,
+    "chunk":      SQL or [SQLs] executed per chunk, with :lo and :hi as id range,
+                  over all rows up to table end including rows inserted meanwhile,
+    "finish":     [SQLs] executed in background after last chunk, like CREATE INDEX,
+})], all keys optional.
+
+Database is stamped with migration version once its startup statements are executed.
+Background work is run by listener, resuming from last completed chunk after restart.
+"""
+DbMigrations = []
+
+"""Target duration of one background migration chunk transaction, in seconds."""
+DbMigrationChunkDuration = 0.2
+
+"""Pause between background migration chunks, letting listener write events, in seconds."""
+DbMigrationPause = 0.2
+
 """List of attribute names that are always saved to ConfigFile."""
 FileDirectives = ["CustomKeys", "CustomKeyPositions", "DefaultScreenSize", "EventsWriteInterval",
     "HeatmapDisplayOptions", "MaxEventsForStats", "MaxEventsForReplay", "KeyboardEnabled",
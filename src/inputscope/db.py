@@ -20,14 +20,101 @@ Released under the MIT License.
 
 @author      Erki Suurjaak
 @created     05.03.2014
-@modified    13.04.2024
+@modified    18.10.2026
 ------------------------------------------------------------------------------
 """
+import collections
+import contextlib
 import datetime
+import logging
+import math
 import os
 import re
 import sqlite3
 import sys
+import threading
+import time
+
+
+"""Number of SQLite virtual machine instructions between query limit checks."""
+LIMIT_CHECK_INTERVAL = 100000
+
+"""Maximum number of statement shapes kept in query profile."""
+PROFILE_SHAPES = 1000
+
+_limits = threading.local() # Query limits of current thread, as .stack [(deadline, check)]
+_queries = collections.Counter() # Executed queries, as {statement type like "SELECT": count}
+_profile = None # Query profile if enabled, as {"slow": seconds, "shapes": {shape: {..}}}
+_profile_lock = threading.Lock()
+_connections = {} # Open connections, as {path: sqlite3.Connection}
+_own = threading.local() # Connections of current thread if using own, as .connections {path: ..}
+_detached = [] # Connections inherited over fork, kept from closing, as [sqlite3.Connection]
+
+logger = logging.getLogger(__name__)
+
+
+class Interrupted(sqlite3.OperationalError):
+    """Raised when a query is interrupted for exceeding its limits."""
+
+
+
+class ProfiledCursor(object):
+    """Wraps sqlite3.Cursor when profiling, adding fetch duration and rows to query profile."""
+
+    def __init__(self, cursor, sql, args, elapsed):
+        self.cursor, self.sql, self.args, self.elapsed = cursor, sql, args, elapsed
+        self.shape, self.logged = normalize(sql), False
+        rows = cursor.rowcount if cursor.rowcount > 0 else 0 # Affected rows for DML
+        self.record(elapsed, rows, execution=True)
+
+    def __getattr__(self, name): return getattr(self.cursor, name)
+
+    def __iter__(self):
+        while True:
+            rows = self.fetchmany(100)
+            if not rows: break # while True
+            for row in rows: yield row
+
+    def fetchone(self):
+        start = time.time()
+        row = self.cursor.fetchone()
+        self.record(time.time() - start, int(row is not None))
+        return row
+
+    def fetchmany(self, size=None):
+        start = time.time()
+        rows = self.cursor.fetchmany(self.cursor.arraysize if size is None else size)
+        self.record(time.time() - start, len(rows))
+        return rows
+
+    def fetchall(self):
+        start = time.time()
+        rows = self.cursor.fetchall()
+        self.record(time.time() - start, len(rows))
+        return rows
+
+    def record(self, elapsed, rows, execution=False):
+        """Adds duration and rows to profile, logging query and capturing plan if slow."""
+        profile = _profile
+        if profile is None: return
+        if not execution: self.elapsed += elapsed
+        with _profile_lock:
+            stats = profile["shapes"].get(self.shape)
+            if stats is None and len(profile["shapes"]) >= PROFILE_SHAPES: return
+            if stats is None:
+                stats = profile["shapes"][self.shape] = dict(shape=self.shape, count=0,
+                        time=0., max=0., rows=0, plan=None, plan_time=0.)
+            stats["count"] += execution
+            stats["time"] += elapsed
+            stats["rows"] += rows
+            stats["max"] = max(stats["max"], self.elapsed)
+            slow = profile["slow"] is not None and self.elapsed > profile["slow"]
+            explain = slow and self.elapsed > stats["plan_time"]
+            if explain: stats["plan_time"] = self.elapsed
+        if slow and not self.logged:
+            self.logged = True
+            logger.warning("Slow query (%.3fs): %s", self.elapsed, self.sql)
+        if explain: stats["plan"] = explain_query(self.cursor.connection, self.sql, self.args)
 
 
 def fetch(table, cols="*", where=(), group="", order=(), limit=(), **kwargs):
@@ -41,6 +128,11 @@ def fetchone(table, cols="*", where=(), group="", order=(), limit=(), **kwargs):
     return select(table, cols, where, group, order, limit, **kwargs).fetchone()
 
 
+def fetchrows(table, cols="*", where=(), group="", order=(), limit=(), **kwargs):
+    """Convenience wrapper for database SELECT and fetch all, as plain tuples."""
+    return selectrows(table, cols, where, group, order, limit, **kwargs).fetchall()
+
+
 def insert(table, values=(), **kwargs):
     """Convenience wrapper for database INSERT."""
     values = list(values.items() if isinstance(values, dict) else values)
@@ -49,6 +141,14 @@ def insert(table, values=(), **kwargs):
     return execute(sql, args).lastrowid
 
 
+def replace(table, values=(), **kwargs):
+    """Convenience wrapper for database INSERT OR REPLACE, replacing rows on unique conflict."""
+    values = list(values.items() if isinstance(values, dict) else values)
+    values += kwargs.items()
+    sql, args = makeSQL("INSERT", table, values=values)
+    return execute(sql.replace("INSERT", "INSERT OR REPLACE", 1), args).lastrowid
+
+
 def select(table, cols="*", where=(), group="", order=(), limit=(), **kwargs):
     """Convenience wrapper for database SELECT."""
     where = list(where.items() if isinstance(where, dict) else where)
@@ -57,6 +157,17 @@ def select(table, cols="*", where=(), group="", order=(), limit=(), **kwargs):
     return execute(sql, args)
 
 
+def selectrows(table, cols="*", where=(), group="", order=(), limit=(), **kwargs):
+    """Convenience wrapper for database SELECT, returning cursor of plain tuples."""
+    where = list(where.items() if isinstance(where, dict) else where)
+    where += kwargs.items()
+    sql, args = makeSQL("SELECT", table, cols, where, group, order, limit)
+    cursor = get_cursor()
+    cursor.row_factory = None
+    _queries["SELECT"] += 1
+    return run(cursor, sql, args)
+
+
 def update(table, values, where=(), **kwargs):
     """Convenience wrapper for database UPDATE."""
     where = list(where.items() if isinstance(where, dict) else where)
@@ -75,17 +186,31 @@ def delete(table, where=(), **kwargs):
 
 def execute(sql, args=None):
     """Executes the SQL and returns sqlite3.Cursor."""
-    return get_cursor().execute(sql, args or {})
+    _queries[sql.split(None, 1)[0].upper() if sql.strip() else ""] += 1
+    return run(get_cursor(), sql, args or {})
+
+
+def run(cursor, sql, args):
+    """Executes the SQL on cursor, returns cursor wrapped in ProfiledCursor if profiling."""
+    if _profile is None: return cursor.execute(sql, args)
+    start = time.time()
+    cursor.execute(sql, args)
+    return ProfiledCursor(cursor, sql, args, time.time() - start)
 
 
 def get_cursor():
     """Returns a cursor to the default database."""
-    config = get_config()
-    return make_cursor(config["path"], config["statements"])
+    config, cache = get_config(), getattr(_own, "connections", None)
+    return make_cursor(config["path"], config["statements"], config.get("updates"),
+                       config.get("version"), _connections if cache is None else cache)
 
 
-def make_cursor(path, init_statements=(), _connectioncache={}):
-    """Returns a cursor to the database, making new connection if not cached."""
+def make_cursor(path, init_statements=(), update_statements=(), version=None,
+                _connectioncache=_connections):
+    """
+    Returns a cursor to the database, making new connection if not cached,
+    and initializing schema on new connection.
+    """
     connection = _connectioncache.get(path)
     if not connection:
         try: not os.path.exists(path) and os.makedirs(os.path.dirname(path))
@@ -94,8 +219,13 @@ def make_cursor(path, init_statements=(), _connectioncache={}):
         except Exception: pass
         connection = sqlite3.connect(path, isolation_level=None,
             check_same_thread=False, detect_types=sqlite3.PARSE_DECLTYPES)
-        for x in init_statements or (): connection.execute(x)
+        if init_statements or update_statements:
+            init_schema(connection, init_statements, update_statements, version)
         connection.row_factory = lambda cur, row: dict(sqlite3.Row(cur, row))
+        try: connection.execute("SELECT SQRT(1)")
+        except sqlite3.OperationalError: # SQLite before 3.35 or built without math functions
+            connection.create_function("SQRT", 1, lambda v: None if v is None else math.sqrt(v))
+        connection.set_progress_handler(is_over_limit, LIMIT_CHECK_INTERVAL)
         _connectioncache[path] = connection
     return connection.cursor()
 
@@ -166,24 +296,151 @@ def makeSQL(action, table, cols="*", where=(), group="", order=(), limit=(), val
 def get_config(config={}): return config
 
 
-def get_size(path=None):
-    """Returns database file size, of first initialized if path not given."""
-    result = None
+def explain_query(connection, sql, args):
+    """Returns SQLite query plan for statement as indented lines, or None if not explainable."""
+    if sql.split(None, 1)[0].upper() not in ("SELECT", "WITH", "UPDATE", "DELETE", "INSERT"):
+        return None
+    try: rows = connection.execute("EXPLAIN QUERY PLAN " + sql, args).fetchall()
+    except Exception: return None
+    depths, result = {}, [] # {node id: depth}
+    for row in rows:
+        row = list(row.values()) if isinstance(row, dict) else row
+        depth = depths[row[0]] = depths.get(row[1], -1) + 1 if len(row) > 3 else 0
+        result.append("  " * depth + "%s" % row[-1])
+    return result
+
+
+def get_connections():
+    """Returns open database connections, as {path: sqlite3.Connection}."""
+    return dict(_connections)
+
+
+def get_profile():
+    """
+    Returns query profile as [{shape, count, time, max, rows, plan}],
+    by statement shape, in descending order of total time; empty if not profiling.
+    """
+    with _profile_lock:
+        shapes = [dict(x) for x in (_profile or {}).get("shapes", {}).values()]
+    return sorted(shapes, key=lambda x: -x["time"])
+
+
+def get_query_counts():
+    """Returns numbers of queries executed in this process, as {statement type like "SELECT": count}."""
+    return dict(_queries)
+
+
+def get_size(path=None, split=False):
+    """
+    Returns database file size, of first initialized if path not given,
+    including journal and WAL files.
+
+    @param   split  return sizes separately, as {"database", "journal", "wal"}
+    """
+    result, sizes = None, {}
     filepath = path or get_config().get("path")
     if filepath:
-        result = os.path.getsize(filepath)
-        for extra in ("journal", "wal") if result else ():
+        result = sizes["database"] = os.path.getsize(filepath)
+        for extra in ("journal", "wal"):
             path = "%s-%s" % (filepath, extra)
-            result += os.path.getsize(path) if os.path.isfile(path) else 0
-    return result
+            sizes[extra] = os.path.getsize(path) if result and os.path.isfile(path) else 0
+            result += sizes[extra]
+    return sizes if split else result
+
+
+def is_over_limit():
+    """Returns whether query limits of current thread have been exceeded."""
+    for deadline, check in getattr(_limits, "stack", ()):
+        if deadline and time.time() > deadline or check and check(): return True
+    return False
+
+
+@contextlib.contextmanager
+def limit(seconds=None, check=None):
+    """
+    Returns context manager limiting database queries in current thread:
+    queries running past given seconds from now, or when check() returns true,
+    are interrupted with Interrupted. Limits can be nested.
+
+    @param   seconds  time budget for all queries in context, if any
+    @param   check    function returning whether to interrupt queries, if any
+    """
+    if not hasattr(_limits, "stack"): _limits.stack = []
+    _limits.stack.append((time.time() + seconds if seconds else None, check))
+    try: yield
+    except sqlite3.OperationalError as e:
+        if isinstance(e, Interrupted) or "interrupted" not in str(e) or not is_over_limit(): raise
+        raise Interrupted("Query interrupted: %s." % ("time budget of %ss exceeded" % seconds
+                          if seconds and time.time() > _limits.stack[-1][0] else "cancelled"))
+    finally: _limits.stack.pop()
+
+
+def clear_limits():
+    """Drops query limits of current thread, like ones inherited by a forked process."""
+    _limits.stack = []
 
 
-def init(path, init_statements=None):
+def check_limit():
+    """Raises Interrupted if query limits of current thread have been exceeded."""
+    if is_over_limit(): raise Interrupted("Query limits exceeded.")
+
+
+def normalize(sql):
+    """Returns statement shape: SQL with literals and parameters as "?", and lists collapsed."""
+    sql = re.sub(r"'(?:[^']|'')*'", "?", sql)
+    sql = re.sub(r":\w+|\?|\b\d+(?:\.\d+)?\b", "?", sql)
+    sql = re.sub(r"\?(?:\s*,\s*\?)+", "?, ..", sql)
+    return re.sub(r"\s+", " ", sql).strip()
+
+
+def set_profiling(enabled, slow=None):
+    """
+    Enables or disables recording duration and row counts of queries by statement shape,
+    clearing current profile.
+
+    @param   slow  duration in seconds above which queries are logged, and query plan
+                   is captured for slowest query of each shape; None to disable
+    """
+    global _profile
+    with _profile_lock: _profile = {"slow": slow, "shapes": {}} if enabled else None
+
+
+def init(path, init_statements=None, update_statements=None, version=None):
+    """
+    Sets default database and opens connection, initializing schema if not at version.
+
+    @param   init_statements    SQL statements to execute, like CREATE TABLE IF NOT EXISTS
+    @param   update_statements  [((table, column), [SQL to execute if table lacks column])]
+    @param   version            schema version, skipping statements if database is stamped
+                                with this version or later, else stamping after execution
+    """
     if sys.version_info >= (3, 12): # Default adapters deprecated from v3.12, removed from v3.14
         register_adapter(lambda v: v.isoformat(), [datetime.datetime, datetime.date])
     config = get_config()
-    config.update(path=path, statements=init_statements)
-    make_cursor(config["path"], config["statements"])
+    config.update(path=path, statements=init_statements, updates=update_statements,
+                  version=version)
+    make_cursor(config["path"], config["statements"], config["updates"], config["version"])
+
+
+def init_schema(connection, init_statements=(), update_statements=(), version=None):
+    """
+    Executes schema statements in a single transaction, unless database is already
+    stamped with given version or later; stamps database with version if given.
+    """
+    get_version = lambda: connection.execute("PRAGMA user_version").fetchone()[0]
+    if version and get_version() >= version: return
+    connection.execute("BEGIN IMMEDIATE") # Blocks concurrent initialization from other processes
+    try:
+        if not version or get_version() < version:
+            for sql in init_statements or (): connection.execute(sql)
+            for (table, col), sqls in update_statements or ():
+                if not any(col == x[1] for x in connection.execute("PRAGMA table_info(%s)" % table)):
+                    for sql in sqls: connection.execute(sql)
+            if version: connection.execute("PRAGMA user_version = %d" % version)
+        connection.execute("COMMIT")
+    except Exception:
+        connection.execute("ROLLBACK")
+        raise
 
 
 def register_adapter(transformer, typeclasses):
@@ -201,3 +458,26 @@ def register_converter(transformer, typenames):
 def close():
     try: get_cursor().connection.close()
     except Exception: pass
+
+
+@contextlib.contextmanager
+def own_connection():
+    """
+    Returns context manager making queries in current thread go through its own
+    database connection instead of the one shared by threads, closed on exit.
+    """
+    _own.connections = {}
+    try: yield
+    finally:
+        connections, _own.connections = _own.connections, None
+        for connection in connections.values(): connection.close()
+
+
+def detach():
+    """
+    Drops open connections from cache without closing them, for a process forked
+    with connections open to make its own. Inherited connections are kept referenced,
+    as closing them in child process could release locks of parent process.
+    """
+    _detached.extend(_connections.values())
+    _connections.clear()
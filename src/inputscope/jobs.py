@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+"""
+Background jobs for long computations in web handlers, keyed by request parameters.
+Identical in-flight requests share one job, clients follow progress until finished,
+results are kept for reuse, and jobs abandoned by all clients are cancelled.
+
+------------------------------------------------------------------------------
+This file is part of InputScope - mouse and keyboard input visualizer.
+Released under the MIT License.
+
+@author      Erki Suurjaak
+@created     18.10.2026
+@modified    18.10.2026
+------------------------------------------------------------------------------
+"""
+import collections
+import itertools
+import logging
+import threading
+import time
+
+from . import conf
+from . import db
+from . import metrics
+
+
+_jobs = collections.OrderedDict() # {key: Job}, in order of last use
+_ids = itertools.count(1)
+_local = threading.local()        # Job running in current thread, if any
+_lock = threading.Lock()
+
+logger = logging.getLogger(__name__)
+
+
+class Cancelled(Exception):
+    """Raised from progress report in a job that has been cancelled."""
+
+
+
+class Job(threading.Thread):
+    """
+    Runs a function in a background thread, tracking progress and clients.
+    Job is cancelled on next progress report or database query check
+    once it has had no clients for longer than WebJobAbandonTimeout.
+    """
+
+    def __init__(self, key, version, target):
+        """
+        @param   key      job key, like request path
+        @param   version  value for detecting whether result is outdated, like event count
+        @param   target   function to invoke, returning job result
+        """
+        threading.Thread.__init__(self)
+        self.daemon    = True
+        self.id        = str(next(_ids))
+        self.key       = key
+        self.version   = version
+        self.target    = target
+        self.progress  = 0.  # Progress in 0..1
+        self.message   = ""  # Current stage of work
+        self.result    = None
+        self.error     = None
+        self.cancelled = False
+        self.finished  = None # Timestamp of finishing
+        self.clients   = 0    # Number of clients currently waiting
+        self.seen      = time.time() # Timestamp of last client activity
+        self.changed   = threading.Condition()
+
+    def run(self):
+        """Invokes target function, storing result or error."""
+        _local.job = self
+        try:
+            with db.limit(check=self.is_abandoned): # Interrupt queries once abandoned
+                self.result = self.target()
+        except Exception as e:
+            if not isinstance(e, Cancelled) and not self.cancelled:
+                logger.exception("Error running job for %s.", self.key)
+                self.error = e
+        with self.changed:
+            self.finished = time.time()
+            self.changed.notify_all()
+        if self.cancelled or self.error is not None: discard(self)
+
+    def report(self, progress, message=None):
+        """Updates job progress, raises Cancelled if job has been cancelled or abandoned."""
+        if self.is_abandoned(): raise Cancelled()
+        with self.changed:
+            self.progress = progress
+            if message is not None: self.message = message
+            self.changed.notify_all()
+
+    def is_abandoned(self):
+        """Returns whether job has been cancelled, cancelling it if abandoned by all clients."""
+        if not self.cancelled and not self.clients \
+        and time.time() - self.seen > conf.WebJobAbandonTimeout:
+            logger.info("Cancelling job for %s, abandoned by all clients.", self.key)
+            self.cancelled = True
+        return self.cancelled
+
+    def wait(self, timeout):
+        """Waits as a client for job to finish, returns whether job is finished."""
+        self.attach()
+        try:
+            deadline = time.time() + timeout
+            with self.changed:
+                while self.finished is None and time.time() < deadline:
+                    self.changed.wait(deadline - time.time())
+        finally: self.detach()
+        return self.finished is not None
+
+    def events(self, heartbeat=10):
+        """
+        Yields job state as a client whenever changed, until job is finished,
+        as {progress, message, done, ?error}; yields None if unchanged within heartbeat seconds.
+        """
+        self.attach()
+        try:
+            last = None
+            while last is None or not last["done"]:
+                with self.changed:
+                    if last and (self.progress, self.message) == (last["progress"], last["message"]) \
+                    and self.finished is None: self.changed.wait(heartbeat)
+                    state = {"progress": self.progress, "message": self.message,
+                             "done": self.finished is not None}
+                if state["done"] and self.error is not None:
+                    state["error"] = u"%s" % self.error
+                if state["done"] and self.cancelled: state["error"] = "Cancelled."
+                yield None if state == last else state
+                last = state
+        finally: self.detach()
+
+    def attach(self):
+        """Registers a waiting client."""
+        with self.changed: self.clients, self.seen = self.clients + 1, time.time()
+
+    def detach(self):
+        """Unregisters a waiting client."""
+        with self.changed: self.clients, self.seen = self.clients - 1, time.time()
+
+
+
+def start(key, version, target):
+    """
+    Returns job for key: in-flight job, or finished job with result still valid,
+    or a newly started job if none. Finished result is valid if job version matches
+    or job finished within WebJobResultTimeout.
+    """
+    with _lock:
+        job = _jobs.pop(key, None)
+        if job and (job.cancelled or job.finished is not None and job.version != version
+                    and time.time() - job.finished > conf.WebJobResultTimeout): job = None
+        metrics.count_cache("jobs", hits=int(bool(job)), misses=int(not job))
+        if job: job.seen = time.time()
+        else:
+            job = Job(key, version, target)
+            job.start()
+        _jobs[key] = job # Move to end as most recently used
+        finished = [k for k, v in _jobs.items() if v.finished is not None]
+        for k in finished[:max(0, len(finished) - conf.WebJobResults)]: _jobs.pop(k)
+    return job
+
+
+def get_all():
+    """Returns all running and finished jobs."""
+    with _lock: return list(_jobs.values())
+
+
+def get(id):
+    """Returns job by ID, or None."""
+    with _lock: return next((x for x in _jobs.values() if x.id == id), None)
+
+
+def discard(job):
+    """Drops job from registry."""
+    with _lock:
+        if _jobs.get(job.key) is job: _jobs.pop(job.key)
+
+
+def report(progress, message=None):
+    """
+    Updates progress of job running in current thread, if any.
+    Raises Cancelled if job has been cancelled.
+
+    @param   progress  progress in 0..1
+    @param   message   current stage of work, if changed
+    """
+    job = getattr(_local, "job", None)
+    if job: job.report(progress, message)
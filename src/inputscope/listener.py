@@ -2,6 +2,11 @@
 """
 Mouse and keyboard listener, logs events to database.
 
+Input hooks run in listener process, forwarding events in batches over a pipe
+to a writer process that owns the database and carries out database commands,
+so that database work never stalls input hooks. Writer process is restarted
+if it exits.
+
 --quiet      prints out nothing
 
 
@@ -12,6 +17,9 @@ stop           CATEGORY
 clear          CATEGORY ?DATE1 ?DATE2
 configure      FLAG VALUE
 screen_size    [DISPLAY0 x, y, w, h], ..
+stats          prints event latency statistics
+memory         prints memory report of listener and writer processes,
+               with growth of allocations since previous report
 vacuum
 exit
 
@@ -28,18 +36,18 @@ Released under the MIT License.
 
 @author      Erki Suurjaak
 @created     06.04.2015
-@modified    10.04.2024
+@modified    18.10.2026
 ------------------------------------------------------------------------------
 """
 from __future__ import print_function
-from collections import defaultdict
+from collections import defaultdict, deque, OrderedDict
 import ast
 import ctypes
 import datetime
+import marshal
 import math
+import multiprocessing
 import os
-try: import Queue as queue        # Py2
-except ImportError: import queue  # Py3
 import re
 import subprocess
 import sys
@@ -47,26 +55,52 @@ import threading
 import time
 import traceback
 
-import psutil
-import pynput
+psutil = None # Imported on first use, as slow to load
+pynput = None # Imported on first use, as slow to load and failing without display
 
 from . import conf
 from . import db
-from . util import LineQueue, stamp_to_date, zhex
+from . import live
+from . import memory
+from . import migrations
+from . import sketch
+from . import stats
+from . import status
+from . util import Histogram, LineQueue, stamp_to_date, zhex
 
 DEBUG = False
 
+## Event categories by code, for raw events from input hooks as (code, clock(), *values)
+CATEGORIES = ("moves", "clicks", "scrolls", "keys", "combos")
+MOVES, CLICKS, SCROLLS, KEYS, COMBOS = range(len(CATEGORIES))
+
+## Value fields of raw events, by category
+FIELDS = {"moves":  ("x", "y"),             "clicks": ("x", "y", "button"),
+          "scrolls": ("x", "y", "dx", "dy"), "keys":   ("key", "realkey"),
+          "combos":  ("key", "realkey")}
+
+## Bucket bounds for latency histograms, in milliseconds
+LATENCY_BOUNDS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 30000, 60000)
+
+## Bucket bounds for write size histogram, in events
+SIZE_BOUNDS = (1, 10, 50, 100, 200, 500, 1000, 2000, 5000, 10000)
+
+clock = getattr(time, "monotonic", time.time) # Py3 / Py2
+
 
 class Listener(threading.Thread):
-    """Runs mouse and keyboard listeners, and handles incoming commands."""
+    """
+    Runs mouse and keyboard listeners, and handles incoming commands.
+    Events and commands are forwarded to writer process.
+    """
 
-    def __init__(self, inqueue, outqueue=None):
+    def __init__(self, inqueue, echo=False):
         threading.Thread.__init__(self)
         self.inqueue = inqueue
         self.running = False
         self.mouse_handler = None
         self.key_handler   = None
-        self.data_handler = DataHandler(getattr(outqueue, "put", lambda x: x))
+        self.sender = Sender(echo)
 
     def run(self):
         self.running = True
@@ -82,36 +116,184 @@ class Listener(threading.Thread):
         if command.startswith("start ") or command.startswith("stop "):
             action, category = command.split()
             if category not in conf.InputFlags: return
-
-            # Event input (mouse|keyboard), None if category itself is input
-            input = next((k for k, vv in conf.InputEvents.items() if category in vv), None)
-            attr = conf.InputFlags[category]
-            on = ("start" == action)
-            if input and not getattr(conf, conf.InputFlags[input]): # Event input itself off
-                on = True # Force on regardless of event flag current state
-                # Set other input events off, as only a single one was explicitly enabled
-                for c, flag in ((c, conf.InputFlags[c]) for c in conf.InputEvents[input]):
-                    setattr(conf, flag, False)
-            setattr(conf, attr, on)
-
-            # Toggle input on when turning event category on
-            if input and on: setattr(conf, conf.InputFlags[input], True)
-            elif not any(getattr(conf, conf.InputFlags.get(c), False)
-                         for c in conf.InputEvents[input or category]): # Not any event on
-                if not input and on: # Turning input on
-                    # Toggle all input events on since all were off
-                    for c in conf.InputEvents[category]:
-                        setattr(conf, conf.InputFlags[c], True)
-                elif input and not on: # Turning single event off
-                    # Toggle entire input off since all input events are now off
-                    setattr(conf, conf.InputFlags[input], False)
+            set_input_flags(category, "start" == action)
 
             if bool(conf.MouseEnabled) != bool(self.mouse_handler):
                 if self.mouse_handler: self.mouse_handler = self.mouse_handler.stop()
-                else: self.mouse_handler = MouseHandler(self.data_handler.handle)
+                else: self.mouse_handler = MouseHandler(self.sender.handle)
             if bool(conf.KeyboardEnabled) != bool(self.key_handler):
                 if self.key_handler: self.key_handler = self.key_handler.stop()
-                else: self.key_handler = KeyHandler(self.data_handler.handle)
+                else: self.key_handler = KeyHandler(self.sender.handle)
+        elif command.startswith("configure "):
+            name, valstr = command.split()[1:]
+            setattr(conf, name, ast.literal_eval(valstr))
+        elif "memory" == command:
+            print(memory.report("Listener process", [("events", self.sender.events)]))
+        elif "exit" == command:
+            return self.stop()
+        self.sender.command(command)
+
+    def stop(self):
+        self.running = False
+        self.mouse_handler and self.mouse_handler.stop()
+        self.key_handler and self.key_handler.stop()
+        self.sender.stop()
+        self.inqueue.put(None) # Wake up thread waiting on queue
+        sys.exit()
+
+
+
+class Sender(threading.Thread):
+    """
+    Forwards raw events from input hooks, and commands, to writer process
+    over a pipe in batches, starting writer process anew if it has exited.
+    Each batch carries the foreground process at sending, as program of its events.
+    """
+
+    def __init__(self, echo=False):
+        threading.Thread.__init__(self)
+        self.daemon  = True
+        self.echo    = echo  # Whether writer process prints out event counts
+        self.events  = deque() # Raw events from input hooks, as (code, clock(), *values)
+        self.room    = conf.MaxEventsForQueue # Free space in queue
+        self.dropped = [0] * len(CATEGORIES) # Events discarded by hooks as queue was full,
+                                             # per category code, approximate
+        self.reported   = list(self.dropped) # Drop counts last sent to writer process
+        self.process    = None # Writer process
+        self.connection = None # Pipe end to writer process
+        self.commands = OrderedDict() # Configuration commands to repeat to restarted writer
+        self.lock = threading.Lock()
+        self.running = False
+        self.start()
+
+    def run(self):
+        self.running = True
+        while self.running:
+            time.sleep(conf.EventsCollectInterval)
+            self.flush()
+
+    def flush(self):
+        """Sends queued events to writer process, if any or if drop count changed."""
+        events = [self.events.popleft() for _ in range(len(self.events))] # Single consumer
+        self.room = conf.MaxEventsForQueue
+        if events or self.dropped != self.reported:
+            self.reported, start = list(self.dropped), clock()
+            pid = Programs.get_active() if events else None
+            self.send(("events", time.time() - clock(), self.reported, events, time.time(),
+                       pid, clock() - start))
+
+    def handle(self, event):
+        """
+        Queues raw event from input hook, as (category code, clock(), *values).
+        Called in input hook threads: does no locking and no lookups, as any delay here
+        stalls system input. Drop count can miss concurrent increments from two hooks.
+        """
+        if len(self.events) < self.room: self.events.append(event)
+        else: self.dropped[event[0]] += 1
+
+    def command(self, command):
+        """Sends command to writer process, retaining configuration for restarted writer."""
+        if command.startswith("configure "):
+            self.commands[command.split()[1]] = command
+        elif command.startswith("screen_size "):
+            self.commands["screen_size"] = command
+        self.send(("command", command))
+
+    def send(self, frame):
+        """Sends frame to writer process, (re)starting writer process if not running."""
+        with self.lock:
+            for attempt in range(2):
+                try:
+                    if not self.process or not self.process.is_alive(): self.launch()
+                    self.connection.send_bytes(marshal.dumps(frame))
+                    break # for attempt
+                except Exception:
+                    if attempt:
+                        print("Error sending %r to writer process." % frame[0])
+                        traceback.print_exc()
+                    self.terminate()
+
+    def launch(self):
+        """Starts writer process, sending current input flags and retained configuration."""
+        if self.process: print("Restarting writer process.")
+        self.connection, remote = multiprocessing.Pipe()
+        args = (remote, os.getpid(), conf.DbPath, self.echo)
+        self.process = multiprocessing.Process(target=write, args=args)
+        self.process.daemon = True
+        self.process.start()
+        remote.close()
+        commands = ["configure %s %r" % (x, getattr(conf, x)) for x in conf.InputFlags.values()]
+        for command in commands + list(self.commands.values()):
+            self.connection.send_bytes(marshal.dumps(("command", command)))
+
+    def terminate(self):
+        """Closes pipe and terminates writer process."""
+        try: self.connection and self.connection.close()
+        except Exception: pass
+        if self.process and self.process.is_alive():
+            self.process.terminate(), self.process.join(1)
+        self.connection = self.process = None
+
+    def stop(self):
+        """Sends pending events and stops writer process, waiting for its final write."""
+        self.running = False
+        self.join(2 * conf.EventsCollectInterval)
+        if not self.process: return
+        if not self.is_alive(): self.flush() # Sender thread could be stuck on a full pipe
+        self.send(("command", "exit"))
+        self.process.join(conf.EventsWriteInterval + 10)
+        self.terminate()
+
+
+
+class Writer(object):
+    """
+    Runs in writer process: inserts events received from listener to database,
+    and handles database commands.
+    """
+
+    def __init__(self, connection, parent, echo=False):
+        """
+        @param   connection  pipe end to listener process
+        @param   parent      listener process ID, writer stops if listener is gone
+        @param   echo        whether to print out event counts
+        """
+        self.connection = connection
+        self.parent = parent
+        self.running = False
+        output = (lambda x: print("\r%s" % x, end=" ")) if echo else (lambda x: x)
+        self.data_handler = DataHandler(output)
+        self.summary_handler = SummaryHandler() if conf.StatsSummaries else None
+        # Background database work takes turns, migration chunks hold off while storing summaries
+        busy = lambda: bool(self.summary_handler and self.summary_handler.busy)
+        self.migration_runner = migrations.Runner(conf.DbPath, busy) if conf.DbMigrations else None
+
+    def run(self):
+        self.running = True
+        while self.running:
+            # Stop reading while queue is full, letting pipe and listener queue fill up instead
+            if len(self.data_handler.events) >= self.data_handler.room:
+                time.sleep(conf.EventsCollectInterval)
+                continue # while self.running
+            try:
+                if not self.connection.poll(1):
+                    if not import_psutil().pid_exists(self.parent): break # while self.running
+                    continue # while self.running
+                frame = marshal.loads(self.connection.recv_bytes())
+            except (EOFError, IOError, OSError): break # while self.running
+            if "events" == frame[0]:
+                self.data_handler.receive(*frame[1:])
+                continue # while self.running
+            try: self.handle_command(frame[1])
+            except Exception:
+                print("Error handling command %r" % frame[1])
+                traceback.print_exc()
+        self.stop()
+
+    def handle_command(self, command):
+        if command.startswith("start ") or command.startswith("stop "):
+            action, category = command.split()
+            if category in conf.InputFlags: set_input_flags(category, "start" == action)
         elif command.startswith("clear "):
             parts = command.split()[1:]
             category, dates = parts[0], parts[1:]
@@ -123,6 +305,9 @@ class Listener(threading.Thread):
             for table in tables:
                 count_deleted += db.delete(table, where=where)
                 db.delete("counts", where=where, type=table)
+                db.delete("sketches", where=where, type=table)
+                db.delete("day_summaries", where=where, type=table)
+            self.data_handler.sketches.clear()
             if count_deleted:
                 where = [("day1", (">=", dates[0])), ("day2", ("<=", dates[1]))] if dates else []
                 for session in db.fetch("sessions", where=where):
@@ -148,10 +333,12 @@ class Listener(threading.Thread):
             if "start" == action and args:
                 stamp, day = next((x, stamp_to_date(x)) for x in [time.time()])
                 db.update("sessions", {"day2": day, "end": stamp}, end=None)
-                db.insert("sessions", name=" ".join(args), start=stamp, day1=day)
+                sid = db.insert("sessions", name=" ".join(args), start=stamp, day1=day)
+                self.data_handler.status and self.data_handler.status.update(session=sid)
             elif "stop" == action:
                 stamp, day = next((x, stamp_to_date(x)) for x in [time.time()])
                 db.update("sessions", {"day2": day, "end": time.time()}, end=None)
+                self.data_handler.status and self.data_handler.status.update(session=0)
             elif "rename" == action and len(args) > 1:
                 name2, sid = " ".join(args[:-1]), args[-1]
                 db.update("sessions", {"name": name2}, id=sid)
@@ -170,35 +357,60 @@ class Listener(threading.Thread):
                 for table, day in ((t, d) for t in tables for d in days):
                     count = db.delete(table, [("day", day)] + where)
                     db.update("counts", {"count": ("EXPR", "count - %s" % count)}, day=day, type=table)
+                    db.delete("sketches", day=day, type=table)
+                    db.delete("day_summaries", day=day, type=table)
+                self.data_handler.sketches.clear()
             elif "delete" == action and args:
                 db.delete("sessions", id=args[0])
+        elif "stats" == command:
+            print(self.data_handler.format_traces())
+        elif "memory" == command:
+            print(memory.report("Writer process", [
+                ("Programs.PIDS", Programs.PIDS), ("Programs.PATTERNS", Programs.PATTERNS),
+                ("Programs.PATH_IDS", Programs.PATH_IDS), ("db connections", db.get_connections()),
+                ("events", self.data_handler.events), ("sketches", self.data_handler.sketches.days),
+            ]))
         elif "vacuum" == command:
             db.execute("VACUUM")
         elif "exit" == command:
-            self.stop()
+            self.running = False
 
     def stop(self):
         self.running = False
-        self.mouse_handler and self.mouse_handler.stop()
-        self.key_handler and self.key_handler.stop()
-        self.data_handler.stop()
-        self.inqueue.put(None) # Wake up thread waiting on queue
+        self.summary_handler and self.summary_handler.stop()
+        self.migration_runner and (self.migration_runner.stop(), self.migration_runner.join())
+        self.data_handler.stop(), self.data_handler.join()
         db.close()
-        sys.exit()
 
 
 
 class DataHandler(threading.Thread):
-    """Output thread, inserts events to database and to output function."""
+    """
+    Output thread in writer process, inserts events to database and to output function.
+
+    Input hooks only append raw events to a buffer; resolving day and program path,
+    filtering and merging is done in this thread.
+    """
 
     def __init__(self, output):
         threading.Thread.__init__(self)
         self.counts = defaultdict(int) # {type: count}
         self.output = output
-        self.inqueue = queue.Queue()
+        self.events  = deque() # Raw events from listener, as (code, stamp, pid, *values)
+        self.room    = conf.MaxEventsForQueue # Free space in queue, updated by this thread
+        self.dropped = [0] * len(CATEGORIES) # Events discarded by listener, per category code
+        self.wakeup  = threading.Event()
+        self.traces  = OrderedDict() # Latency and write histograms, as {name: Histogram}
         self.rois = {} # Mouse regions of interest, as {screen index: [(x, y, w, h), ]}
         self.rods = {} # Mouse regions of disinterest, as {screen index: [(x, y, w, h), ]}
         self.screen_sizes = []
+        self.sketches = sketch.Tracker() # Per-day sketches of inserted events
+        self.live = live.Publisher() # Feed of inserted events to web UI
+        self.status = None # Status counters shared with tray and web UI
+        try: self.status = status.Writer()
+        except Exception:
+            print("Error creating status file.")
+            traceback.print_exc()
         self.running = False
         self.start()
 
@@ -206,6 +418,9 @@ class DataHandler(threading.Thread):
         self.running = True
         dbqueue = [] # Data queued for later after first insert failed
         db.insert("app_events", type="start")
+        if self.status:
+            session = db.fetchone("sessions", end=None, order=[("start", True)])
+            self.status.update(session=session["id"] if session else 0)
         try: self.set_screen_sizes([[0, 0] + list(conf.DefaultScreenSize)])
         except Exception:
             print("Error configuring screen sizes.")
@@ -295,13 +510,23 @@ class DataHandler(threading.Thread):
 
         stamps0, stamps1 = defaultdict(float), defaultdict(float) # {category: stamp}
         scaledmove = [] # [display, x scaled to heatmap, y scaled to heatmap]
-        while self.running:
-            data, items = self.inqueue.get(), []
-            while data:
-                items.append(data)
-                try: data = self.inqueue.get(block=False)
-                except queue.Empty: data = None
-            if not items or not self.running: continue # while self.running
+        items, flushed = [], 0 # Collected events, last write time
+        dropped = [0] * len(CATEGORIES) # Last drop counts
+        while True:
+            self.wakeup.wait(conf.EventsCollectInterval)
+            final = not self.running # Write out remaining events on stop
+
+            collected, dropped0, dropped = self.collect(), dropped, list(self.dropped)
+            items.extend(collected)
+            self.room = conf.MaxEventsForQueue - len(items)
+            drops = {"dropped_" + c: b - a for c, a, b in zip(CATEGORIES, dropped0, dropped) if b != a}
+            if self.status and (collected or drops):
+                self.status.update(dict(drops, received=len(collected) + sum(drops.values()),
+                                        queued=len(collected), dropped=sum(drops.values())),
+                                   depth=len(items) + len(self.events))
+            if final and not items: break # while True
+            if not final and (not items or time.time() - flushed < conf.EventsWriteInterval):
+                continue # while True
 
             move0, move1, scroll0 = {}, {}, {} # For merging events in this iteration
             for data in items:
@@ -321,12 +546,54 @@ class DataHandler(threading.Thread):
                 data["fk_program"] = Programs.get_id(pid)
                 self.counts[category] += 1
                 dbqueue.append((category, data))
+            items[:] = []
+            self.room = conf.MaxEventsForQueue
 
+            inserted, flushstart = [], time.time() # [(category, data)]
             try:
-                while dbqueue: db.insert(*dbqueue.pop(0))
+                while dbqueue:
+                    category, data = dbqueue.pop(0)
+                    try: data["id"] = db.insert(category, data)
+                    except Exception as e:
+                        if "locked" in str(e): dbqueue.insert(0, (category, data)) # Retry later
+                        raise
+                    self.sketches.add(category, data)
+                    inserted.append((category, data))
+                self.sketches.save()
             except Exception as e: print(e)
+            flushend = time.time()
+            if conf.EventsTraceSample:
+                self.trace("write", 1000 * (flushend - flushstart))
+                self.trace("write size", len(inserted), SIZE_BOUNDS)
+                for category, data in inserted[::conf.EventsTraceSample]:
+                    self.trace("total " + category, 1000 * (flushend - data["stamp"]))
+            if self.status:
+                counts = defaultdict(int, flushed=len(inserted), flushes=1)
+                for category, _ in inserted: counts["flushed_" + category] += 1
+                counts["flush_total"] = flushend - flushstart
+                self.status.update(counts, depth=len(self.events),
+                                   flush_duration=flushend - flushstart, flushed_at=flushend)
             self.output(dict(self.counts))
-            if conf.EventsWriteInterval > 0: time.sleep(conf.EventsWriteInterval)
+            self.live.publish(dict(self.counts), inserted)
+            flushed = time.time()
+            if final: break # while True
+        self.live.close()
+        self.status and self.status.close()
+
+    def collect(self):
+        """
+        Drains raw events received from listener, returns events of enabled categories
+        as [{type, stamp, day, pid, ..}], with program active at listener sending events.
+        """
+        result = []
+        for _ in range(len(self.events)): # Only this thread consumes
+            event = self.events.popleft()
+            category = CATEGORIES[event[0]]
+            if not getattr(conf, conf.InputFlags[category], False): continue # for _
+            data = dict(zip(FIELDS[category], event[3:]), type=category, stamp=event[1],
+                        day=stamp_to_date(event[1]), pid=event[2])
+            result.append(data)
+        return result
 
     def set_screen_sizes(self, sizes):
         """Updates screens list for mouse events."""
@@ -345,16 +612,83 @@ class DataHandler(threading.Thread):
                     y, h = (rescale(a, sh, i) if is_ratio(a) else a for i, a in enumerate([y, h]))
                     target.setdefault(index, []).append((x, y, w, h))
 
+    def receive(self, offset, dropped, events, sent, pid=None, elapsed=0):
+        """
+        Queues raw events received from listener.
+
+        @param   offset   difference of listener clock() from UNIX timestamp
+        @param   dropped  total numbers of events discarded by listener, per category code
+        @param   events   [(category code, clock(), *values)]
+        @param   sent     UNIX timestamp of listener sending events
+        @param   pid      foreground process ID at listener sending events
+        @param   elapsed  duration of listener resolving foreground process, in seconds
+        """
+        received = time.time()
+        self.events.extend((x[0], x[1] + offset, pid) + tuple(x[2:]) for x in events)
+        self.dropped = dropped
+        if events and conf.EventsTraceSample:
+            self.trace("pipe", 1000 * (received - sent))
+            self.trace("program", 1000 * elapsed)
+            for x in events[::conf.EventsTraceSample]:
+                self.trace("queued", 1000 * (sent - x[1] - offset))
+                self.trace("received", 1000 * (received - x[1] - offset))
+
+    def trace(self, name, value, bounds=LATENCY_BOUNDS):
+        """Adds value to named histogram."""
+        if name not in self.traces: self.traces[name] = Histogram(bounds)
+        self.traces[name].add(value)
+
+    def format_traces(self):
+        """
+        Returns histograms as text, with latencies from input hook to listener sending
+        ("queued") and to writer receiving ("received"), duration of resolving active program,
+        latency from input hook to database write per category ("total .."),
+        and duration and size of database writes.
+        """
+        if not self.traces: return "No events traced."
+        width = max(map(len, self.traces))
+        return "\n".join("%s  %s" % (k.ljust(width), v.format("" if "size" in k else "ms"))
+                         for k, v in self.traces.items())
+
     def stop(self):
+        """Stops thread after writing out remaining events."""
         self.running = False
-        self.inqueue.put(None) # Wake up thread waiting on queue
-        db.close()
+        self.wakeup.set()
 
-    def handle(self, **kwargs):
-        category = kwargs.get("type")
-        if not getattr(conf, conf.InputFlags.get(category), False): return
-        kwargs.update(day=datetime.date.today(), stamp=time.time(), pid=Programs.get_active())
-        if self.inqueue.qsize() < conf.MaxEventsForQueue: self.inqueue.put(kwargs)
+
+
+class SummaryHandler(threading.Thread):
+    """
+    Background thread, stores statistics summaries of past days in batches,
+    on its own database connection, as reads on the connection shared with event inserts
+    would hold a snapshot failing their commits meanwhile.
+    """
+
+    def __init__(self):
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.running = False
+        self.busy = False # Whether storing summaries
+        self.wakeup = threading.Event()
+        self.start()
+
+    def run(self):
+        self.running = True
+        with db.own_connection():
+            while self.running:
+                count, self.busy = 0, True
+                try: count = stats.summarize(conf.StatsSummaryBatch)
+                except Exception:
+                    print("Error storing statistics summaries.")
+                    traceback.print_exc()
+                self.busy = False
+                # Continue promptly with backfill if batch was full, else wait for day rollover
+                self.wakeup.wait(1 if count >= conf.StatsSummaryBatch else conf.StatsSummaryInterval)
+                self.wakeup.clear()
+
+    def stop(self):
+        self.running = False
+        self.wakeup.set()
 
 
 
@@ -362,6 +696,7 @@ class MouseHandler(object):
     """Listens to mouse events and forwards to output."""
 
     def __init__(self, output):
+        import_pynput()
         self._output = output
         self._buttons = {"left": 1, "right": 2, "middle": 3, "unknown": 0}
         for b in pynput.mouse.Button:
@@ -374,14 +709,13 @@ class MouseHandler(object):
 
     def click(self, x, y, button, pressed, *a, **kw):
         if pressed:
-            buttonindex = self._buttons.get(button.name, 0)
-            self._output(type="clicks", x=x, y=y, button=buttonindex)
+            self._output((CLICKS, clock(), x, y, self._buttons.get(button.name, 0)))
 
     def move(self, x, y, *a, **kw):
-        self._output(type="moves", x=x, y=y)
+        self._output((MOVES, clock(), x, y))
 
     def scroll(self, x, y, dx, dy, *a, **kw):
-        self._output(type="scrolls", x=x, y=y, dx=dx, dy=dy)
+        self._output((SCROLLS, clock(), x, y, dx, dy))
 
     def stop(self): self._listener.stop()
         
@@ -464,6 +798,7 @@ class KeyHandler(object):
 
 
     def __init__(self, output):
+        import_pynput()
         self.KEYNAMES = self.PYNPUT_NAMES.copy() # pynput.Key.xyz.name: label
         for key in pynput.keyboard.Key:
             if key.name not in self.KEYNAMES:
@@ -503,7 +838,7 @@ class KeyHandler(object):
         if not conf.KeyboardEnabled or not pressed: return
 
         if DEBUG: print("Adding key %r (real %r)" % (mykey, realkey))
-        self._output(type="keys", key=mykey, realkey=realkey)
+        self._output((KEYS, clock(), mykey, realkey))
 
         if mykey not in self.MODIFIERNAMES and conf.KeyboardCombosEnabled:
             modifier = "-".join(k for k in ["Ctrl", "Alt", "AltGr", "Shift", "Win"]
@@ -513,7 +848,7 @@ class KeyHandler(object):
                 realmodifier = "-".join(k for k, v in self._realmodifiers.items() if v)
                 realkey = "%s-%s" % (realmodifier, realkey)
                 if DEBUG: print("Adding combo %r (real %r)" % (mykey, realkey))
-                self._output(type="combos", key=mykey, realkey=realkey)
+                self._output((COMBOS, clock(), mykey, realkey))
 
 
     def extract(self, key):
@@ -590,8 +925,12 @@ class Programs(object):
     PATH_IDS = {}
 
     @classmethod
-    def init(cls):
-        """Initializes process functionality if supported by OS."""
+    def init(cls, load=True):
+        """
+        Initializes process functionality if supported by OS.
+
+        @param   load  whether to load programs cache from database
+        """
         cls.ENABLED = conf.ProgramsEnabled
         if not cls.ENABLED: return
         if "win32" == sys.platform:
@@ -600,7 +939,7 @@ class Programs(object):
         else:
             try: cls.ENABLED = bool(subprocess.check_output(["xprop", "-version"]))
             except Exception: cls.ENABLED = False
-        if cls.ENABLED:
+        if cls.ENABLED and load:
             cls.PATH_IDS.update((x["path"].lower(), x["id"]) for x in db.select("programs"))
 
     @classmethod
@@ -639,7 +978,7 @@ class Programs(object):
         try:
             proc, deadline = cls.PIDS.get(pid, (None, None))
             if not proc or time.time() >= deadline or not proc.is_running():
-                proc = psutil.Process(pid)
+                proc = import_psutil().Process(pid)
                 cls.PIDS[pid] = proc, time.time() + 30
             return proc.exe()
         except Exception: return None
@@ -678,20 +1017,77 @@ class Programs(object):
         return False if conf.ProgramWhitelist in matches else bool(conf.ProgramWhitelist)
 
 
-def start(inqueue, outqueue=None):
-    """Starts the listener with incoming and outgoing queues."""
-    conf.init(), db.init(conf.DbPath, conf.DbStatements)
+def import_psutil():
+    """Imports psutil module if not imported yet, returns module."""
+    global psutil
+    if not psutil: import psutil
+    return psutil
+
+
+def import_pynput():
+    """Imports pynput module if not imported yet, returns module."""
+    global pynput
+    if not pynput: import pynput
+    return pynput
+
+
+def set_input_flags(category, on):
+    """Sets input category logging on or off in configuration, toggling related flags."""
+    # Event input (mouse|keyboard), None if category itself is input
+    input = next((k for k, vv in conf.InputEvents.items() if category in vv), None)
+    attr = conf.InputFlags[category]
+    if input and not getattr(conf, conf.InputFlags[input]): # Event input itself off
+        on = True # Force on regardless of event flag current state
+        # Set other input events off, as only a single one was explicitly enabled
+        for c, flag in ((c, conf.InputFlags[c]) for c in conf.InputEvents[input]):
+            setattr(conf, flag, False)
+    setattr(conf, attr, on)
+
+    # Toggle input on when turning event category on
+    if input and on: setattr(conf, conf.InputFlags[input], True)
+    elif not any(getattr(conf, conf.InputFlags.get(c), False)
+                 for c in conf.InputEvents[input or category]): # Not any event on
+        if not input and on: # Turning input on
+            # Toggle all input events on since all were off
+            for c in conf.InputEvents[category]:
+                setattr(conf, conf.InputFlags[c], True)
+        elif input and not on: # Turning single event off
+            # Toggle entire input off since all input events are now off
+            setattr(conf, conf.InputFlags[input], False)
+
+
+def write(connection, parent, dbpath, echo=False):
+    """
+    Entry point for writer process, inserts events and carries out commands from listener.
+
+    @param   connection  pipe end to listener process
+    @param   parent      listener process ID
+    @param   dbpath      path to database
+    @param   echo        whether to print out event counts
+    """
+    conf.init()
+    conf.DbPath = dbpath
+    if conf.MemoryTracing: memory.start()
+    db.init(conf.DbPath, conf.DbStatements, conf.DbUpdateStatements, conf.DbVersion)
+    migrations.upgrade(conf.DbPath)
     Programs.init()
 
-    # Carry out db update for tables lacking expected new columns
-    for (table, col), sqls in conf.DbUpdateStatements:
-        if not any(col == x["name"] for x in db.execute("PRAGMA table_info(%s)" % table)):
-            for sql in sqls: db.execute(sql)
-
     try: db.execute("PRAGMA journal_mode = WAL")
     except Exception: pass
 
-    listener = Listener(inqueue, outqueue)
+    writer = Writer(connection, parent, echo)
+    try: writer.run()
+    except KeyboardInterrupt: writer.stop()
+
+
+def start(inqueue, echo=False):
+    """Starts the listener with incoming queue, echoing event counts if specified."""
+    conf.init()
+    try: import_pynput()
+    except Exception as e: sys.exit("Cannot listen to input: %s" % e)
+    if conf.MemoryTracing: memory.start()
+    Programs.init(load=False)
+    listener = Listener(inqueue, echo)
     try: listener.run()
     except KeyboardInterrupt: listener.stop()
 
@@ -700,11 +1096,9 @@ def main():
     """Entry point for stand-alone execution."""
     conf.init()
     inqueue = LineQueue(sys.stdin).queue
-    outqueue = type("", (), {"put": lambda self, x: print("\r%s" % x, end=" ")})()
-    if "--quiet" in sys.argv: outqueue = None
     if conf.MouseEnabled:    inqueue.put("start mouse")
     if conf.KeyboardEnabled: inqueue.put("start keyboard")
-    start(inqueue, outqueue)
+    start(inqueue, "--quiet" not in sys.argv)
 
 
 if "__main__" == __name__:
@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+"""
+Live feed of inserted events from listener to web UI, as JSON datagrams
+over local UDP, dropped if web UI is not receiving.
+
+------------------------------------------------------------------------------
+This file is part of InputScope - mouse and keyboard input visualizer.
+Released under the MIT License.
+
+@author      Erki Suurjaak
+@created     18.10.2026
+@modified    18.10.2026
+------------------------------------------------------------------------------
+"""
+import collections
+import json
+import logging
+import socket
+import threading
+
+from . import conf
+
+
+"""Event fields sent in feed, by input."""
+FIELDS = {"mouse": ["id", "stamp", "fk_program", "display", "x", "y"],
+          "keyboard": ["id", "stamp", "fk_program", "key", "realkey"]}
+
+"""Address of live feed, loopback only regardless of WebHost, as feed is not authenticated."""
+HOST = "127.0.0.1"
+
+"""Maximum number of events in one datagram, keeping datagrams well under 64KB."""
+CHUNK = 200
+
+_subscriber = None # Subscriber instance in web UI
+_lock = threading.Lock()
+
+logger = logging.getLogger(__name__)
+
+
+class Publisher(object):
+    """Sends running counts and inserted events from listener to web UI."""
+
+    def __init__(self):
+        self.socket = None
+
+    def publish(self, counts, events):
+        """
+        Sends counts and events, split into several datagrams if many events.
+
+        @param   counts  running counts of events inserted by listener, as {table: count}
+        @param   events  events inserted since last publish, as [(table, {id, stamp, ..})]
+        """
+        if not conf.LiveFeedEnabled: return
+        inputs = {t: k for k, tt in conf.InputEvents.items() for t in tt}
+        events = [dict({k: x.get(k) for k in FIELDS[inputs[t]]}, table=t) for t, x in events]
+        try:
+            if not self.socket: self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            for i in range(0, max(1, len(events)), CHUNK):
+                data = json.dumps({"counts": counts, "events": events[i:i + CHUNK]})
+                self.socket.sendto(data.encode("utf-8"), (HOST, conf.LiveFeedPort))
+        except Exception: pass # Web UI not running
+
+    def close(self):
+        """Closes socket."""
+        try: self.socket and self.socket.close()
+        except Exception: pass
+        self.socket = None
+
+
+
+class Subscriber(threading.Thread):
+    """Receives feed in web UI, keeping latest counts and recent events for clients to follow."""
+
+    def __init__(self):
+        threading.Thread.__init__(self)
+        self.daemon   = True
+        self.counts   = {}  # Running counts from listener, as {table: count}
+        self.events   = collections.deque(maxlen=conf.LiveFeedBuffer) # [(sequence, event)]
+        self.sequence = 0   # Number of events received
+        self.changed  = threading.Condition()
+        self.socket   = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.bind((HOST, conf.LiveFeedPort))
+
+    def run(self):
+        while True:
+            try:
+                data, _ = self.socket.recvfrom(65535)
+                message = json.loads(data.decode("utf-8"))
+            except Exception:
+                logger.exception("Error receiving live feed.")
+                continue # while True
+            with self.changed:
+                self.counts = message.get("counts") or {}
+                for event in message.get("events") or []:
+                    self.sequence += 1
+                    self.events.append((self.sequence, event))
+                self.changed.notify_all()
+
+    def follow(self, table, since=None, heartbeat=10):
+        """
+        Yields (counts, [event]) for table as received, or None if nothing within heartbeat seconds.
+
+        @param   since  ID of last event already known to client, to include buffered events after
+        """
+        with self.changed:
+            last = 0 if since is not None else self.sequence
+        while True:
+            with self.changed:
+                if self.sequence == last: self.changed.wait(heartbeat)
+                events = [e for s, e in self.events if s > last and e["table"] == table
+                          and (since is None or e["id"] > since)]
+                last, counts = self.sequence, dict(self.counts)
+            yield (counts, events) if events else None
+
+
+
+def subscribe():
+    """Returns live feed subscriber, started on first call; None if disabled or port unavailable."""
+    global _subscriber
+    with _lock:
+        if _subscriber or not conf.LiveFeedEnabled: return _subscriber
+        try: _subscriber = Subscriber()
+        except Exception:
+            logger.exception("Error binding live feed to port %s.", conf.LiveFeedPort)
+            return None
+        _subscriber.start()
+    return _subscriber
@@ -9,7 +9,7 @@ Released under the MIT License.
 
 @author      Erki Suurjaak
 @created     05.05.2015
-@modified    10.04.2024
+@modified    18.10.2026
 ------------------------------------------------------------------------------
 """
 import calendar
@@ -20,7 +20,9 @@ import locale
 import multiprocessing
 import os
 import re
+import select
 import signal
+import socket
 import subprocess
 import sys
 import threading
@@ -29,15 +31,15 @@ import webbrowser
 win32com = wx = tk = None
 try: import win32com.client # For creating startup shortcut
 except ImportError: pass
-try: import wx, wx.adv, wx.py.shell
+try: import wx, wx.adv
 except ImportError:
     try: import Tkinter as tk   # For getting screen size if wx unavailable
     except ImportError: pass
 
 from . import conf
 from . import db
-from . import listener
-from . import webui
+from . import migrations
+from . import status
 from . util import QueueLine, SingleInstanceChecker, format_session, run_later
 
 
@@ -68,6 +70,7 @@ class Model(threading.Thread):
         self.listenerqueue = None
         self.listener = None
         self.webui = None
+        self.webstub = None # Stub starting web UI on demand
         # Avoid leaving zombie child processes on Ctrl-Break/C etc
         signal.signal(signal.SIGINT,   lambda *a, **kw: self.stop(True))
         if hasattr(signal, "SIGBREAK"):
@@ -126,6 +129,7 @@ class Model(threading.Thread):
             try: self.listenerqueue.put("exit")
             except Exception: pass
         if self.listener: self.listener.terminate()
+        if self.webstub: self.webstub.stop()
         if self.webui: self.webui.terminate()
         if exit: sys.exit()
 
@@ -142,30 +146,69 @@ class Model(threading.Thread):
     def vacuum(self):
         (self.listenerqueue or self.initialqueue).put("vacuum")
 
+    def open_ui(self):
+        """Starts web UI process if started on demand and not running."""
+        if self.webstub: self.webstub.activate()
+
+    def start_webui(self, listener=None, ondemand=False):
+        """
+        Starts web UI process, returns process.
+
+        @param   listener  listening socket to serve on, if any
+        @param   ondemand  whether started on demand, web UI process exiting once idle
+        """
+        if conf.Frozen:
+            from . import webui # Imported on demand, as slow to load
+            self.webui = Process(target=webui.start, args=(listener, ondemand))
+            self.webui.start()
+        else:
+            pkg = os.path.basename(conf.ApplicationPath)
+            root = os.path.dirname(conf.ApplicationPath)
+            args = [sys.executable, "-m", "%s.webui" % pkg, "--quiet"]
+            wprocargs, share = dict(cwd=root), listener and "win32" == sys.platform
+            if ondemand: args += ["--on-demand"]
+            if "win32" == sys.platform and hasattr(subprocess, "DEVNULL") \
+            and "pythonw.exe" == os.path.basename(sys.executable).lower():
+                # Workaround for Py3 bug in W7: pythonw sets sys.stdout and .stderr to None
+                wprocargs.update({k: subprocess.DEVNULL for k in ("stdin", "stdout", "stderr")})
+            if share: # Windows sockets are not inherited, child gets socket data over stdin
+                args += ["--socket", "stdin"]
+                wprocargs.update(stdin=subprocess.PIPE)
+            elif listener:
+                args += ["--socket", str(listener.fileno())]
+                wprocargs.update(close_fds=False) # Child inherits listening socket
+                if hasattr(listener, "set_inheritable"): listener.set_inheritable(True) # Py3.4+
+            self.webui = subprocess.Popen(args, **wprocargs)
+            if share:
+                try: self.webui.stdin.write(listener.share(self.webui.pid))
+                finally: self.webui.stdin.close()
+        return self.webui
+
     def run(self):
         if conf.Frozen:
+            from . import listener # Imported on demand, as slow to load
             self.listenerqueue = multiprocessing.Queue()
             self.listener = Process(target=listener.start, args=(self.listenerqueue,))
-            self.webui = Process(target=webui.start)
-            self.listener.start(), self.webui.start()
+            self.listener.start()
         else:
             pkg = os.path.basename(conf.ApplicationPath)
             root = os.path.dirname(conf.ApplicationPath)
             args = lambda *x: [sys.executable, "-m", "%s.%s" % (pkg, x[0])] + list(x[1:])
             lprocargs = dict(cwd=root, stdin=subprocess.PIPE, universal_newlines=True)
-            wprocargs = dict(cwd=root)
             if "win32" == sys.platform:
                 lprocargs.update(shell=True)
                 if "pythonw.exe" == os.path.basename(sys.executable).lower():
                     # Workaround for Py3 bug in W7: pythonw sets sys.stdout and .stderr to None
                     lprocargs.update(stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-                    if hasattr(subprocess, "DEVNULL"):  # Python 3.3+
-                        wprocargs.update({k: subprocess.DEVNULL
-                                          for k in ("stdin", "stdout", "stderr")})
             self.listener = subprocess.Popen(args("listener", "--quiet"), **lprocargs)
-            self.webui    = subprocess.Popen(args("webui",    "--quiet"), **wprocargs)
             self.listenerqueue = QueueLine(self.listener.stdin)
 
+        if conf.WebOnDemand and not conf.WebAutoReload:
+            try: self.webstub = WebStub(self.start_webui)
+            except Exception as e:
+                print("Error listening on web port %s: %s" % (conf.WebPort, e))
+        if not self.webstub: self.start_webui()
+
         if conf.MouseEnabled:    self.listenerqueue.put("start mouse")
         if conf.KeyboardEnabled: self.listenerqueue.put("start keyboard")
         while not self.initialqueue.empty():
@@ -195,7 +238,7 @@ class MainApp(getattr(wx, "App", object)):
         self.model = Model()
         self.startupservice = StartupService()
 
-        self.frame_console = wx.py.shell.ShellFrame(None)
+        self.frame_console = None # Created on first toggle, as wx.py.shell is slow to load
         self.trayicon = wx.adv.TaskBarIcon()
         self.icons = None
         self.sizetimer = wx.Timer(self)
@@ -203,19 +246,15 @@ class MainApp(getattr(wx, "App", object)):
         if os.path.exists(conf.IconPath):
             icons = self.icons = wx.IconBundle()
             icons.AddIcon(conf.IconPath, wx.BITMAP_TYPE_ICO)
-            self.frame_console.SetIcons(icons)
             icon = (icons.GetIconOfExactSize((16, 16))
                     if "win32" == sys.platform else icons.GetIcon((24, 24)))
             self.trayicon.SetIcon(icon, conf.Title)
 
-        self.frame_console.Title = "%s Console" % conf.Title
-
         self.Bind(wx.EVT_CLOSE,                            self.OnClose)
         self.Bind(wx.EVT_DISPLAY_CHANGED,                  self.OnLogResolution)
         self.Bind(wx.EVT_TIMER,                            self.OnLogResolution)
         self.trayicon.Bind(wx.adv.EVT_TASKBAR_LEFT_DCLICK, self.OnOpenUI)
         self.trayicon.Bind(wx.adv.EVT_TASKBAR_RIGHT_DOWN,  self.OnOpenMenu)
-        self.frame_console.Bind(wx.EVT_CLOSE,              self.OnToggleConsole)
 
         def after():
             if not self: return
@@ -253,6 +292,7 @@ class MainApp(getattr(wx, "App", object)):
         item_mouse    = makeitem(menu, "Enable &mouse logging",    kind=wx.ITEM_CHECK)
         item_keyboard = makeitem(menu, "Enable &keyboard logging", kind=wx.ITEM_CHECK)
         item_console  = makeitem(menu, "Show Python &console",     kind=wx.ITEM_CHECK)
+        item_status   = makeitem(menu, "Listener: %s" % status.format_status(status.read()))
         item_exit     = makeitem(menu, "E&xit %s" % conf.Title)
 
         item_moves    = makeitem(mousemenu,    "Log mouse &movement",   kind=wx.ITEM_CHECK)
@@ -333,6 +373,7 @@ class MainApp(getattr(wx, "App", object)):
         menu.Enable(item_sessions.Id, bool(self.model.sessions))
         menu.AppendSeparator()
         menu.AppendSubMenu(histmenu, "Clear events &history")
+        menu.Append(item_status)
         menu.Append(item_console)
         menu.Append(item_exit)
 
@@ -345,8 +386,9 @@ class MainApp(getattr(wx, "App", object)):
         item_keys    .Check(conf.KeyboardEnabled and conf.KeyboardKeysEnabled)
         item_combos  .Check(conf.KeyboardEnabled and conf.KeyboardCombosEnabled)
         item_sticky  .Check(conf.KeyboardStickyEnabled)
-        item_console .Check(self.frame_console.Shown)
+        item_console .Check(bool(self.frame_console and self.frame_console.Shown))
         item_session_stop.Enable(bool(activename))
+        item_status.Enable(False)
 
         menu.Bind(wx.EVT_MENU, self.OnOpenUI,           item_ui)
         menu.Bind(wx.EVT_MENU, self.OnVacuum,           item_vacuum)
@@ -411,6 +453,7 @@ class MainApp(getattr(wx, "App", object)):
         if sizes: self.model.log_resolution(sizes)
 
     def OnOpenUI(self, event):
+        self.model.open_ui()
         webbrowser.open(conf.WebUrl)
 
     def OnVacuum(self, event):
@@ -483,6 +526,12 @@ class MainApp(getattr(wx, "App", object)):
 
 
     def OnToggleConsole(self, event):
+        if not self.frame_console:
+            import wx.py.shell
+            self.frame_console = wx.py.shell.ShellFrame(None)
+            self.frame_console.Title = "%s Console" % conf.Title
+            if self.icons: self.frame_console.SetIcons(self.icons)
+            self.frame_console.Bind(wx.EVT_CLOSE, self.OnToggleConsole)
         self.frame_console.Show(not self.frame_console.IsShown())
 
     def OnClose(self, event):
@@ -540,15 +589,107 @@ class StartupService(object):
             shortcut.save()
 
 
-def YesNoCancelMessageBox(message, caption, icon=wx.ICON_NONE,
+class WebStub(threading.Thread):
+    """
+    Listens on web UI port while web UI process is not running, and starts web UI process
+    on first connection, handing over the listening socket so that the pending connection
+    gets served. Resumes listening after web UI process exits, as on idle timeout.
+
+    Where socket cannot be handed over, as on Windows under Python 2, stub closes
+    its socket for web UI process to bind anew, pending connection getting reset.
+    """
+
+    ## Seconds after start during which web UI process exiting is taken as failure,
+    ## connections arriving then being closed instead of restarting web UI
+    RESTART_DELAY = 5
+
+    ## Whether listening socket can be handed over to web UI process
+    HANDOVER = "win32" != sys.platform or hasattr(socket.socket, "share")
+
+    def __init__(self, launch):
+        """
+        @param   launch  function(listening socket or None, ondemand=True)
+                         starting web UI process, returning process
+        """
+        threading.Thread.__init__(self)
+        self.daemon   = True
+        self.launch   = launch
+        self.process  = None # Web UI process, as multiprocessing.Process or subprocess.Popen
+        self.launched = 0    # Timestamp of last start
+        self.lock     = threading.Lock()
+        self.socket   = None
+        self.listen()
+        self.running = True
+        self.start()
+
+    def run(self):
+        while self.running:
+            if self.is_serving():
+                time.sleep(1)
+                continue # while self.running
+            if not self.socket:
+                try: self.listen()
+                except Exception: time.sleep(1) # Port not yet released by web UI process
+                continue # while self.running
+            try: readable = select.select([self.socket], [], [], 1)[0]
+            except Exception: break # while self.running, socket closed
+            if not readable or not self.running: continue # while self.running
+            if time.time() - self.launched < self.RESTART_DELAY: self.reject()
+            else: self.activate()
+
+    def activate(self):
+        """Starts web UI process if not running."""
+        with self.lock:
+            if self.is_serving() or not self.running: return
+            self.launched = time.time()
+            if not self.HANDOVER: self.close()
+            self.process = self.launch(self.socket, ondemand=True)
+
+    def reject(self):
+        """Accepts and closes pending connection, as web UI process failed to start."""
+        try: self.socket.accept()[0].close()
+        except Exception: pass
+
+    def is_serving(self):
+        """Returns whether web UI process is running."""
+        if not self.process: return False
+        is_alive = getattr(self.process, "is_alive", None) # multiprocessing.Process
+        return is_alive() if is_alive else self.process.poll() is None
+
+    def listen(self):
+        """Binds and listens on web UI port."""
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        try:
+            if "win32" != sys.platform: # Windows allows binding to ports in use with SO_REUSEADDR
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            sock.bind((conf.WebHost, conf.WebPort))
+            sock.listen(5)
+        except Exception:
+            sock.close()
+            raise
+        self.socket = sock
+
+    def close(self):
+        """Stops listening on web UI port."""
+        try: self.socket and self.socket.close()
+        except Exception: pass
+        self.socket = None
+
+    def stop(self):
+        """Stops listening, web UI process is left running."""
+        self.running = False
+        self.close()
+
+
+def YesNoCancelMessageBox(message, caption, icon=None,
                           yes="&Yes", no="&No", cancel="Cancel"):
     """
     Opens a Yes/No/Cancel messagebox with custom labels, returns dialog result.
 
-    @param   icon     dialog icon to use, one of wx.ICON_XYZ
+    @param   icon     dialog icon to use, one of wx.ICON_XYZ, defaults to wx.ICON_NONE
     @param   default  default selected button, wx.YES or wx.NO
     """
-    style = icon | wx.YES | wx.NO | wx.CANCEL
+    style = (wx.ICON_NONE if icon is None else icon) | wx.YES | wx.NO | wx.CANCEL
     dlg = wx.MessageDialog(None, message, caption, style)
     dlg.SetYesNoCancelLabels(yes, no, cancel)
     dlg.CenterOnScreen()
@@ -560,7 +701,8 @@ def YesNoCancelMessageBox(message, caption, icon=wx.ICON_NONE,
 def main():
     """Program entry point."""
     if conf.Frozen: multiprocessing.freeze_support()
-    conf.init(), db.init(conf.DbPath, conf.DbStatements)
+    conf.init(), db.init(conf.DbPath, conf.DbStatements, conf.DbUpdateStatements, conf.DbVersion)
+    migrations.upgrade(conf.DbPath)
     try: db.execute("PRAGMA journal_mode = WAL")
     except Exception: pass
 
@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+"""
+Memory reports for long-running processes: top allocation sites from tracemalloc
+snapshots and their growth since previous report, process size, sizes of
+long-lived caches, and peak memory of web requests.
+
+Allocations are traced only after tracing is started, at process start if
+MemoryTracing is enabled, or else at first report.
+
+------------------------------------------------------------------------------
+This file is part of InputScope - mouse and keyboard input visualizer.
+Released under the MIT License.
+
+@author      Erki Suurjaak
+@created     18.10.2026
+@modified    18.10.2026
+------------------------------------------------------------------------------
+"""
+import collections
+import os
+import sys
+import threading
+import time
+import types
+
+try: import tracemalloc
+except ImportError: tracemalloc = None # Py2
+
+from . import conf
+from . util import format_bytes, format_stamp
+
+
+_snapshot = None # (timestamp, tracemalloc.Snapshot) of last report, for diffing
+_peaks = {}      # {name: [count, last peak, max peak]}
+_lock = threading.Lock()
+
+
+def start():
+    """Starts tracing memory allocations, if supported and not already tracing."""
+    if tracemalloc and not tracemalloc.is_tracing(): tracemalloc.start()
+
+
+def is_tracing():
+    """Returns whether memory allocations are being traced."""
+    return bool(tracemalloc and tracemalloc.is_tracing())
+
+
+def get_size(obj, depth=10):
+    """
+    Returns approximate size of object in bytes, including contained items
+    and object attributes to given depth; shared objects are counted once.
+    """
+    seen = set()
+    def measure(x, depth):
+        if id(x) in seen: return 0
+        seen.add(id(x))
+        size = sys.getsizeof(x, 0)
+        if depth <= 0 or isinstance(x, (str, bytes, bytearray, type, types.ModuleType)) \
+        or callable(x): return size
+        if isinstance(x, dict): items = [v for kv in x.items() for v in kv]
+        elif isinstance(x, (list, tuple, set, frozenset, collections.deque)): items = list(x)
+        else: items = list(getattr(x, "__dict__", {}).values())
+        return size + sum(measure(v, depth - 1) for v in items)
+    return measure(obj, depth)
+
+
+def get_peaks():
+    """Returns recorded peak memory, as {name: (count, last peak, max peak)}."""
+    with _lock: return dict((k, tuple(v)) for k, v in _peaks.items())
+
+
+def track(name, func, *args, **kwargs):
+    """
+    Invokes func(*args, **kwargs), recording traced memory peak over invocation under name,
+    if tracing. Returns func result.
+
+    Peak is process-wide, including allocations from any concurrent threads.
+    """
+    if not is_tracing(): return func(*args, **kwargs)
+    base = tracemalloc.get_traced_memory()[0]
+    if hasattr(tracemalloc, "reset_peak"): tracemalloc.reset_peak() # Py3.9+
+    try: return func(*args, **kwargs)
+    finally:
+        peak = max(0, tracemalloc.get_traced_memory()[1] - base)
+        with _lock:
+            entry = _peaks.setdefault(name, [0, 0, 0])
+            entry[:] = entry[0] + 1, peak, max(entry[2], peak)
+
+
+def report(title="Process", caches=(), top=None):
+    """
+    Returns memory report as text: process size, cache sizes, top allocation sites,
+    allocation growth since last report, and recorded peaks. Starts tracing if not tracing.
+
+    @param   title   process title for report heading
+    @param   caches  [(name, object)] to report size of
+    @param   top     number of allocation sites to list, defaults to MemoryReportTop
+    """
+    global _snapshot
+    import psutil # Imported on demand, as slow to load
+    top = conf.MemoryReportTop if top is None else top
+    lines = []
+
+    rss = psutil.Process().memory_info().rss
+    text = "%s %s: resident %s" % (title, os.getpid(), format_bytes(rss))
+    if is_tracing():
+        current, peak = tracemalloc.get_traced_memory()
+        text += ", traced %s (peak %s)" % (format_bytes(current), format_bytes(peak))
+    lines.append(text + ".")
+
+    if caches:
+        lines += ["", "Caches:"]
+        for name, obj in caches:
+            count = len(obj) if hasattr(obj, "__len__") else None
+            lines.append("  %-28s %10s entries %12s" % (name, "" if count is None else
+                         "{:,}".format(count), format_bytes(get_size(obj))))
+
+    if not is_tracing():
+        if not tracemalloc: lines += ["", "Memory tracing not supported."]
+        else:
+            start()
+            lines += ["", "Memory tracing started, next report will list allocation sites."]
+    else:
+        snapshot = tracemalloc.take_snapshot().filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+            tracemalloc.Filter(False, "<unknown>"),
+        ])
+        lines += ["", "Top allocation sites:"]
+        for stat in snapshot.statistics("lineno")[:top]:
+            lines.append("  %12s %10s blocks  %s" % (format_bytes(stat.size),
+                         "{:,}".format(stat.count), format_frame(stat.traceback[0])))
+        with _lock: previous, _snapshot = _snapshot, (time.time(), snapshot)
+        if previous:
+            diffs = [x for x in snapshot.compare_to(previous[1], "lineno") if x.size_diff]
+            lines += ["", "Growth since %s:" % format_stamp(previous[0], "%Y-%m-%d %H:%M:%S")]
+            for stat in diffs[:top]:
+                lines.append("  %12s %10s blocks  %s" % (
+                    ("+" if stat.size_diff > 0 else "-") + format_bytes(abs(stat.size_diff)),
+                    "{:+,}".format(stat.count_diff), format_frame(stat.traceback[0])))
+
+    peaks = get_peaks()
+    if peaks:
+        lines += ["", "Peak memory:"]
+        for name, (count, last, peak) in sorted(peaks.items()):
+            lines.append("  %-40s %8s calls, last %12s, max %12s" % (name,
+                         "{:,}".format(count), format_bytes(last), format_bytes(peak)))
+    return "\n".join(lines)
+
+
+def format_frame(frame):
+    """Returns tracemalloc frame as "package/module.py:line"."""
+    parts = frame.filename.replace("\\", "/").split("/")
+    return "%s:%s" % ("/".join(parts[-2:]), frame.lineno)
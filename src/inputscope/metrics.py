@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+"""
+Service metrics in Prometheus text format: listener ingestion from its status file,
+database size, schema migrations and queries, web UI request latency, memory peaks
+and cache usage.
+
+------------------------------------------------------------------------------
+This file is part of InputScope - mouse and keyboard input visualizer.
+Released under the MIT License.
+
+@author      Erki Suurjaak
+@created     18.10.2026
+@modified    18.10.2026
+------------------------------------------------------------------------------
+"""
+import collections
+import threading
+
+from . import conf
+from . import db
+from . import memory
+from . import migrations
+from . import status
+from . util import Histogram
+
+
+"""Bucket bounds for request latency histograms, in seconds."""
+LATENCY_BOUNDS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+"""Metric types and descriptions, as {name: (type, help)}."""
+METRICS = collections.OrderedDict([
+    ("inputscope_listener_up",                   ("gauge",     "Whether listener is running.")),
+    ("inputscope_events_received_total",         ("counter",   "Events received by listener from input hooks.")),
+    ("inputscope_events_ingested_total",         ("counter",   "Events written to database by listener.")),
+    ("inputscope_events_dropped_total",          ("counter",   "Events discarded by listener as queue was full.")),
+    ("inputscope_listener_queue_depth",          ("gauge",     "Events waiting in listener queue.")),
+    ("inputscope_listener_flush_seconds",        ("summary",   "Duration of listener database writes.")),
+    ("inputscope_listener_last_flush_seconds",   ("gauge",     "Duration of last listener database write.")),
+    ("inputscope_database_size_bytes",           ("gauge",     "Size of database files.")),
+    ("inputscope_schema_version",                ("gauge",     "Database schema version.")),
+    ("inputscope_migration_progress",            ("gauge",     "Ratio of background migration work done, by version.")),
+    ("inputscope_queries_total",                 ("counter",   "Database queries executed by web UI, by statement type.")),
+    ("inputscope_request_duration_seconds",      ("histogram", "Web UI request handling time, by route.")),
+    ("inputscope_cache_requests_total",          ("counter",   "Web UI cache lookups, by cache and result.")),
+    ("inputscope_cache_hit_ratio",               ("gauge",     "Ratio of web UI cache lookups that were hits.")),
+    ("inputscope_request_peak_memory_bytes",     ("gauge",     "Largest traced memory peak of web UI requests, by route.")),
+])
+
+_counters   = collections.defaultdict(int) # {(name, ((label, value), ..)): value}
+_histograms = collections.OrderedDict()    # {(name, ((label, value), ..)): Histogram}
+_lock = threading.Lock()
+
+
+def count(name, value=1, **labels):
+    """Increments counter by value."""
+    key = (name, tuple(sorted(labels.items())))
+    with _lock: _counters[key] += value
+
+
+def count_cache(cache, hits=0, misses=0):
+    """Increments cache lookup counters."""
+    count("inputscope_cache_requests_total", hits,   cache=cache, result="hit")
+    count("inputscope_cache_requests_total", misses, cache=cache, result="miss")
+
+
+def observe(name, value, bounds=LATENCY_BOUNDS, **labels):
+    """Adds value to histogram."""
+    key = (name, tuple(sorted(labels.items())))
+    with _lock:
+        if key not in _histograms: _histograms[key] = Histogram(bounds)
+        _histograms[key].add(value)
+
+
+def render():
+    """Returns all metrics as Prometheus text exposition format."""
+    samples = collections.defaultdict(list) # {name: [(suffix, {label: value}, value)]}
+
+    listener = status.read() or {}
+    running = bool(listener.get("pid"))
+    samples["inputscope_listener_up"].append(("", {}, int(running)))
+    if running:
+        samples["inputscope_events_received_total"].append(("", {}, listener["received"]))
+        for table in status.TABLES:
+            for name, field in [("inputscope_events_ingested_total", "flushed_" + table),
+                                ("inputscope_events_dropped_total",  "dropped_" + table)]:
+                samples[name].append(("", {"table": table}, listener[field]))
+        samples["inputscope_listener_queue_depth"].append(("", {}, listener["depth"]))
+        samples["inputscope_listener_flush_seconds"].extend([
+            ("_sum", {}, listener["flush_total"]), ("_count", {}, listener["flushes"])])
+        samples["inputscope_listener_last_flush_seconds"].append(
+            ("", {}, listener["flush_duration"]))
+
+    try: sizes = db.get_size(conf.DbPath, split=True)
+    except Exception: sizes = {}
+    for file, size in sorted(sizes.items()):
+        samples["inputscope_database_size_bytes"].append(("", {"file": file}, size))
+    try:
+        version = db.execute("PRAGMA user_version").fetchone()["user_version"]
+        samples["inputscope_schema_version"].append(("", {}, version))
+        for item in migrations.get_progress():
+            labels = {"version": item["version"], "name": item["name"]}
+            samples["inputscope_migration_progress"].append(("", labels, item["progress"]))
+    except Exception: pass
+    for kind, value in sorted(db.get_query_counts().items()):
+        samples["inputscope_queries_total"].append(("", {"type": kind.lower()}, value))
+
+    with _lock:
+        counters = dict(_counters)
+        histograms = [(k, v.bounds, list(v.counts), v.total, v.count)
+                      for k, v in _histograms.items()]
+    for (name, labels), value in sorted(counters.items()):
+        samples[name].append(("", dict(labels), value))
+    lookups = collections.defaultdict(lambda: collections.defaultdict(int)) # {cache: {result: n}}
+    for (name, labels), value in counters.items():
+        if "inputscope_cache_requests_total" == name:
+            labels = dict(labels)
+            lookups[labels["cache"]][labels["result"]] += value
+    for cache, results in sorted(lookups.items()):
+        ratio = results["hit"] / float(sum(results.values())) if sum(results.values()) else 0
+        samples["inputscope_cache_hit_ratio"].append(("", {"cache": cache}, ratio))
+    for route, (_, _, peak) in sorted(memory.get_peaks().items()):
+        samples["inputscope_request_peak_memory_bytes"].append(("", {"route": route}, peak))
+    for (name, labels), bounds, counts, total, num in histograms:
+        labels, cumulative = dict(labels), 0
+        for bound, value in zip(list(bounds) + ["+Inf"], counts):
+            cumulative += value
+            samples[name].append(("_bucket", dict(labels, le=bound), cumulative))
+        samples[name].extend([("_sum", labels, total), ("_count", labels, num)])
+
+    lines = []
+    for name, (kind, description) in METRICS.items():
+        if not samples[name]: continue # for name
+        lines.extend(["# HELP %s %s" % (name, description), "# TYPE %s %s" % (name, kind)])
+        for suffix, labels, value in samples[name]:
+            text = ",".join('%s="%s"' % (k, escape(v)) for k, v in sorted(labels.items()))
+            lines.append("%s%s%s %s" % (name, suffix, "{%s}" % text if text else "", value))
+    return "\n".join(lines) + "\n"
+
+
+def escape(value):
+    """Returns label value escaped for Prometheus text format."""
+    return ("%s" % value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
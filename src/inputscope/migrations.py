@@ -0,0 +1,220 @@
+# -*- coding: utf-8 -*-
+"""
+Database schema migrations after baseline schema, versioned in PRAGMA user_version.
+
+Startup statements of pending migrations are executed in a single transaction
+that also stamps database version. Work over large tables, like backfilling
+a new column or copying rows into a rewritten table, is registered in table
+"migrations" and carried out in background by listener writer process,
+in id-range chunks committed each together with migration position:
+event inserts proceed between chunks, and an interrupted migration resumes
+from last committed chunk at next start.
+
+------------------------------------------------------------------------------
+This file is part of InputScope - mouse and keyboard input visualizer.
+Released under the MIT License.
+
+@author      Erki Suurjaak
+@created     18.10.2026
+@modified    18.10.2026
+------------------------------------------------------------------------------
+"""
+from __future__ import print_function
+import sqlite3
+import threading
+import time
+import traceback
+
+from . import conf
+from . import db
+
+
+"""Statement creating table of background migration work."""
+TABLE_SQL = "CREATE TABLE IF NOT EXISTS migrations (version INTEGER NOT NULL PRIMARY KEY, " \
+            "name TEXT, started REAL, finished REAL, first INTEGER, position INTEGER, error TEXT)"
+
+"""Bounds of background chunk size, in ids."""
+CHUNK_MIN, CHUNK_MAX = 100, 100000
+
+"""Interval between progress reports of background migration, in seconds."""
+REPORT_INTERVAL = 60
+
+
+class Runner(threading.Thread):
+    """
+    Background thread, carries out registered migration work in chunks sized to
+    DbMigrationChunkDuration, on its own database connection.
+    """
+
+    def __init__(self, path, busy=None, migrations=None):
+        """
+        @param   path        database path
+        @param   busy        function returning whether to hold off with next chunk, if any
+        @param   migrations  migrations as in DbMigrations, defaults to DbMigrations
+        """
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.path = path
+        self.busy = busy or (lambda: False)
+        self.migrations = conf.DbMigrations if migrations is None else migrations
+        self.running = False
+        self.connection = None
+        self.wakeup = threading.Event()
+        self.start()
+
+    def run(self):
+        self.running = True
+        opts = dict((x[0], (x[1], x[2])) for x in self.migrations)
+        self.connection = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+        self.connection.row_factory = lambda cur, row: dict(sqlite3.Row(cur, row))
+        try:
+            for row in get_pending(self.connection):
+                if row["version"] not in opts: continue # for row, unknown to this program version
+                if not self.running or not self.migrate(row, *opts[row["version"]]):
+                    break # for row, later migrations can depend on earlier
+        finally:
+            connection, self.connection = self.connection, None
+            connection.close()
+
+    def migrate(self, row, name, opts):
+        """Runs migration chunks from last position, and finish statements; returns success."""
+        version, position = row["version"], row["position"]
+        table, chunk = opts.get("table"), opts.get("chunk") or []
+        sqls = chunk if isinstance(chunk, (list, tuple)) else [chunk]
+        size, reported = CHUNK_MIN * 10, time.time()
+        get_last = lambda: self.connection.execute("SELECT MAX(id) AS id FROM %s" % table
+                                                   ).fetchone()["id"] or 0 if sqls else 0
+        print("%s migration %s %r." % ("Resuming" if position > row["first"] else "Starting",
+                                       version, name))
+        def step(lo, hi, finish=False):
+            if finish: hi = max(hi, get_last()) # Include rows inserted until final transaction
+            for sql in sqls if hi >= lo else (): self.connection.execute(sql, {"lo": lo, "hi": hi})
+            for sql in opts.get("finish") or () if finish else ():
+                self.connection.execute(sql)
+            self.connection.execute("UPDATE migrations SET position = ?, finished = ?, error = NULL "
+                                    "WHERE version = ?", (hi, time.time() if finish else None, version))
+        try:
+            while self.running and get_last() - position > size:
+                start = time.time()
+                self.transact(step, position + 1, position + size)
+                elapsed, position = time.time() - start, position + size
+                ratio = conf.DbMigrationChunkDuration / max(elapsed, 0.001)
+                size = min(CHUNK_MAX, max(CHUNK_MIN, int(size * min(2, ratio))))
+                if time.time() - reported > REPORT_INTERVAL:
+                    print("Migration %s %r at %s." % (version, name,
+                          format_progress(position, row["first"], get_last())))
+                    reported = time.time()
+                self.wakeup.wait(conf.DbMigrationPause)
+            if not self.running: return False
+            # Remaining rows are run together with finish statements, blocking inserts meanwhile
+            self.transact(step, position + 1, position, finish=True)
+            print("Completed migration %s %r." % (version, name))
+            return True
+        except Exception as e:
+            if not self.running: return False # Interrupted on stop, resumes at next start
+            print("Error in migration %s %r." % (version, name))
+            traceback.print_exc()
+            try: self.connection.execute("UPDATE migrations SET error = ? WHERE version = ?",
+                                         (str(e), version))
+            except Exception: pass
+            return False
+
+    def transact(self, func, *args, **kwargs):
+        """Invokes func(*args, **kwargs) in a transaction, retrying while database is locked."""
+        while True:
+            while self.running and self.busy(): self.wakeup.wait(conf.DbMigrationPause)
+            try:
+                self.connection.execute("BEGIN IMMEDIATE")
+                func(*args, **kwargs)
+                self.connection.execute("COMMIT")
+                return
+            except Exception as e:
+                try: self.connection.execute("ROLLBACK")
+                except Exception: pass
+                if not isinstance(e, sqlite3.OperationalError) or "locked" not in str(e) \
+                or not self.running: raise
+                self.wakeup.wait(conf.DbMigrationPause)
+
+    def stop(self):
+        """Stops runner, interrupting current chunk if any."""
+        self.running = False
+        self.wakeup.set()
+        try: self.connection and self.connection.interrupt()
+        except Exception: pass
+
+
+
+def upgrade(path, migrations=None):
+    """
+    Executes startup statements of pending migrations in a single transaction,
+    registering their background work and stamping database with last version,
+    unless database is already at last version. Returns applied versions.
+
+    @param   path        database path
+    @param   migrations  migrations as in DbMigrations, defaults to DbMigrations
+    """
+    migrations = sorted(conf.DbMigrations if migrations is None else migrations,
+                        key=lambda x: x[0])
+    if not migrations: return []
+    connection = sqlite3.connect(path, isolation_level=None)
+    get_version = lambda: connection.execute("PRAGMA user_version").fetchone()[0]
+    try:
+        if get_version() >= migrations[-1][0]: return []
+        connection.execute("BEGIN IMMEDIATE") # Blocks concurrent upgrade from other processes
+        try:
+            applied, current = [], get_version()
+            for version, name, opts in migrations:
+                if version <= current: continue # for version
+                for sql in opts.get("statements") or (): connection.execute(sql)
+                if opts.get("chunk") or opts.get("finish"):
+                    first = 0
+                    if opts.get("chunk"):
+                        sql = "SELECT MIN(id) FROM %s" % opts["table"]
+                        first = max(0, (connection.execute(sql).fetchone()[0] or 1) - 1)
+                    connection.execute(TABLE_SQL)
+                    connection.execute("INSERT OR REPLACE INTO migrations (version, name, started, "
+                                       "first, position) VALUES (?, ?, ?, ?, ?)",
+                                       (version, name, time.time(), first, first))
+                applied.append(version)
+            if applied: connection.execute("PRAGMA user_version = %d" % applied[-1])
+            connection.execute("COMMIT")
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+        return applied
+    finally: connection.close()
+
+
+def get_pending(connection):
+    """Returns unfinished migration work from database connection, as [{migrations row}]."""
+    sql = "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'migrations'"
+    if not connection.execute(sql).fetchone(): return []
+    sql = "SELECT * FROM migrations WHERE finished IS NULL ORDER BY version"
+    return connection.execute(sql).fetchall()
+
+
+def get_progress():
+    """
+    Returns migration work in database of db-module, as [{migrations row, last, progress}],
+    with last as current last id in table, and progress as 0..1.
+    """
+    if not db.fetchone("sqlite_master", "1", type="table", name="migrations"): return []
+    opts = dict((x[0], x[2]) for x in conf.DbMigrations)
+    rows = db.fetch("migrations", order="version")
+    for row in rows:
+        table, last = opts.get(row["version"], {}).get("table"), row["position"]
+        if table and opts[row["version"]].get("chunk") and not row["finished"]:
+            last = db.execute("SELECT MAX(id) AS id FROM %s" % table).fetchone()["id"] or 0
+        span = max(last, row["position"]) - row["first"]
+        row["last"] = max(last, row["position"])
+        row["progress"] = 1. if row["finished"] else \
+                          (row["position"] - row["first"]) / float(span) if span else 0.
+    return rows
+
+
+def format_progress(position, first, last):
+    """Returns migration position as "12.3% (12,345 of 100,000)", or "pending" if no rows."""
+    span, done = max(0, last - first), max(0, position - first)
+    if not span: return "pending"
+    return "%.1f%% (%s of %s)" % (100. * done / span, "{:,}".format(min(done, span)),
+                                  "{:,}".format(span))
@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+"""
+CPU profiles of individual web requests, recorded with cProfile and kept in memory
+for download as pstats data or as collapsed stacks for flame graph tools.
+
+------------------------------------------------------------------------------
+This file is part of InputScope - mouse and keyboard input visualizer.
+Released under the MIT License.
+
+@author      Erki Suurjaak
+@created     18.10.2026
+@modified    18.10.2026
+------------------------------------------------------------------------------
+"""
+import collections
+import cProfile
+import itertools
+import logging
+import marshal
+import os
+import threading
+import time
+
+from . import conf
+
+
+"""Maximum number of call paths per function in collapsed stacks."""
+MAX_PATHS = 100
+
+_profiles = collections.OrderedDict() # {id: Profile}, in order of recording
+_ids = itertools.count(1)
+_lock = threading.Lock()
+
+logger = logging.getLogger(__name__)
+
+
+class Profile(object):
+    """CPU profile of one request."""
+
+    def __init__(self, stats, **meta):
+        self.id    = next(_ids)
+        self.stats = stats # {(file, line, name): (calls, primitive calls, own, total, callers)}
+        self.meta  = meta  # {route, method, url, args, started, duration, error}
+
+    def dump(self):
+        """Returns profile in pstats file format, loadable by pstats.Stats and snakeviz."""
+        return marshal.dumps(self.stats)
+
+    def collapse(self, maxdepth=100, maxpaths=MAX_PATHS):
+        """
+        Returns profile as collapsed stacks, like "main;render;format 1234\\n",
+        with microseconds of own time per call path.
+
+        cProfile records only caller-callee pairs, so time of functions called from
+        several paths is split between paths in proportion to their share of calls.
+        Call graph is walked once in topological order, recursive calls omitted;
+        paths of a function beyond the most expensive maxpaths are merged into one.
+        """
+        callees = collections.defaultdict(dict) # {caller: {callee: total time from caller}}
+        for func, (_, _, _, _, callers) in self.stats.items():
+            for caller, (_, _, _, total) in callers.items():
+                if caller in self.stats and caller != func: callees[caller][func] = total
+        roots = [f for f, v in self.stats.items() if not any(c in self.stats for c in v[4])]
+
+        order, backs, state = [], set(), {} # Postorder, back edges, {func: on stack or done}
+        for root in roots:
+            if root in state: continue # for root
+            state[root], stack = True, [(root, iter(callees[root]))]
+            while stack:
+                func, children = stack[-1]
+                callee = next(children, None)
+                if callee is None:
+                    state[func] = False
+                    order.append(func), stack.pop()
+                elif state.get(callee): backs.add((func, callee)) # Recursion
+                elif callee not in state:
+                    state[callee] = True
+                    stack.append((callee, iter(callees[callee])))
+
+        result = collections.Counter() # {"a;b;c": microseconds}
+        paths = collections.defaultdict(collections.Counter) # {func: {(path, depth): share}}
+        for root in roots: paths[root][(label(root), 1)] += self.stats[root][3]
+        for func in reversed(order):
+            own, total = self.stats[func][2:4]
+            items = paths.pop(func, {}).most_common()
+            if len(items) > maxpaths:
+                rest = sum(v for _, v in items[maxpaths - 1:])
+                items = items[:maxpaths - 1] + [(("...;" + label(func), 2), rest)]
+            for (path, depth), share in items:
+                if total: result[path] += own * share / total
+                if depth >= maxdepth or not total: continue # for (path, depth)
+                for callee, spent in callees[func].items():
+                    if (func, callee) in backs: continue # for callee
+                    paths[callee][(path + ";" + label(callee), depth + 1)] += spent * share / total
+        return "".join("%s %d\n" % (k, round(v * 1000000)) for k, v in sorted(result.items())
+                       if round(v * 1000000))
+
+
+
+def label(func):
+    """Returns function key as stack frame label, like "render (webui.py:123)"."""
+    filename, line, name = func
+    if "~" == filename and not line: return name.replace(";", ":").replace(" ", "_")
+    return "%s (%s:%s)" % (name, os.path.basename(filename), line)
+
+
+def run(meta, func, *args, **kwargs):
+    """
+    Invokes func(*args, **kwargs) under profiler and stores profile with given metadata,
+    dropping oldest profiles over WebProfiles. Returns func result.
+
+    Runs func without profiling if a profiler is already active.
+    """
+    profiler = cProfile.Profile()
+    try: profiler.enable()
+    except Exception: return func(*args, **kwargs)
+    start, error, meta = time.time(), None, dict(meta)
+    try: return func(*args, **kwargs)
+    except Exception as e:
+        error = repr(e)
+        raise
+    finally:
+        profiler.disable()
+        meta.update(started=start, duration=time.time() - start, error=error)
+        profiler.create_stats()
+        profile = Profile(profiler.stats, **meta)
+        with _lock:
+            _profiles[profile.id] = profile
+            while len(_profiles) > max(conf.WebProfiles, 1): _profiles.popitem(last=False)
+        logger.info("Profiled %s %s in %.3fs.", meta.get("method"), meta.get("url"),
+                    meta["duration"])
+
+
+def get(id):
+    """Returns stored profile by ID, or None."""
+    with _lock: return _profiles.get(id)
+
+
+def get_all():
+    """Returns all stored profiles, newest first."""
+    with _lock: return list(_profiles.values())[::-1]
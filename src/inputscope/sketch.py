@@ -0,0 +1,258 @@
+# -*- coding: utf-8 -*-
+"""
+Mergeable per-day sketches of input events, stored in database alongside counts:
+HyperLogLog for distinct keys and applications, DDSketch for intervals between events.
+
+------------------------------------------------------------------------------
+This file is part of InputScope - mouse and keyboard input visualizer.
+Released under the MIT License.
+
+@author      Erki Suurjaak
+@created     18.10.2026
+@modified    18.10.2026
+------------------------------------------------------------------------------
+"""
+import collections
+import datetime
+import hashlib
+import math
+import sqlite3
+import struct
+import threading
+
+from . import conf
+from . import db
+from . import metrics
+from . util import pack_varints, unpack_varints
+
+
+"""Sketches kept per table, as {table: [name, ]}."""
+TABLES = {"keys":    ["keys", "programs", "intervals"],
+          "combos":  ["keys", "programs", "intervals"],
+          "clicks":  ["programs", "intervals"],
+          "scrolls": ["programs", "intervals"]}
+
+_cache = collections.OrderedDict() # {(table, day, count): {name: sketch}}
+_lock = threading.Lock()
+
+
+class HyperLogLog(object):
+    """
+    Distinct count estimator, exact for small sets kept as hashes,
+    with relative standard error 1.04 / sqrt(2 ** PRECISION) after converting to registers.
+    """
+
+    PRECISION    = 11  # Registers as power of 2
+    SPARSE_LIMIT = 256 # Maximum number of hashes to keep before converting to registers
+
+    def __init__(self, data=None):
+        self.hashes, self.registers = set(), None
+        if data: self.loads(data)
+
+    def add(self, value):
+        """Adds value to sketch."""
+        text = value if isinstance(value, bytes) else (u"%s" % value).encode("utf-8")
+        h = struct.unpack("<Q", hashlib.md5(text).digest()[:8])[0]
+        if self.registers is None:
+            self.hashes.add(h)
+            if len(self.hashes) > self.SPARSE_LIMIT: self.densify()
+        else: self.register(h)
+
+    def merge(self, other):
+        """Merges other sketch into this one."""
+        if self.registers is None and other.registers is None:
+            self.hashes |= other.hashes
+            if len(self.hashes) > self.SPARSE_LIMIT: self.densify()
+            return
+        if self.registers is None: self.densify()
+        if other.registers is None:
+            for h in other.hashes: self.register(h)
+        else: self.registers = list(map(max, self.registers, other.registers))
+
+    def count(self):
+        """Returns number of distinct values, estimated if sketch no longer keeps hashes."""
+        if self.registers is None: return len(self.hashes)
+        m = len(self.registers)
+        estimate = 0.7213 / (1 + 1.079 / m) * m * m / sum(2. ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * m and zeros: estimate = m * math.log(float(m) / zeros)
+        return int(round(estimate))
+
+    def is_exact(self):
+        """Returns whether count is exact."""
+        return self.registers is None
+
+    def densify(self):
+        """Converts hashes to registers."""
+        self.registers = [0] * 2 ** self.PRECISION
+        for h in self.hashes: self.register(h)
+        self.hashes = set()
+
+    def register(self, h):
+        """Updates registers with 64-bit hash."""
+        index, rest = h >> (64 - self.PRECISION), h & ((1 << (64 - self.PRECISION)) - 1)
+        self.registers[index] = max(self.registers[index], 64 - self.PRECISION - rest.bit_length() + 1)
+
+    def dumps(self):
+        """Returns sketch as bytes."""
+        if self.registers is None: return pack_varints([0] + sorted(self.hashes))
+        return pack_varints([1] + self.registers)
+
+    def loads(self, data):
+        """Populates sketch from bytes produced by dumps()."""
+        values, _ = unpack_varints(data)
+        if values[0]: self.hashes, self.registers = set(), values[1:]
+        else: self.hashes, self.registers = set(values[1:]), None
+
+
+class DDSketch(object):
+    """Quantile estimator for non-negative values, with relative accuracy of ACCURACY."""
+
+    ACCURACY  = 0.01
+    GAMMA     = (1 + ACCURACY) / (1 - ACCURACY) # Bin boundary ratio
+    MIN_VALUE = 1e-6                            # Values under are counted as zero
+
+    def __init__(self, data=None):
+        self.bins, self.zeros, self.total = {}, 0, 0 # {index: count}, values under MIN_VALUE
+        if data: self.loads(data)
+
+    def add(self, value):
+        """Adds value to sketch."""
+        if value < self.MIN_VALUE: self.zeros += 1
+        else:
+            index = int(math.ceil(math.log(value) / math.log(self.GAMMA)))
+            self.bins[index] = self.bins.get(index, 0) + 1
+        self.total += 1
+
+    def merge(self, other):
+        """Merges other sketch into this one."""
+        for index, count in other.bins.items():
+            self.bins[index] = self.bins.get(index, 0) + count
+        self.zeros, self.total = self.zeros + other.zeros, self.total + other.total
+
+    def quantile(self, q):
+        """Returns value at quantile q in 0..1, or None if sketch is empty."""
+        if not self.total: return None
+        rank, seen = q * (self.total - 1), self.zeros
+        if rank < seen: return 0.
+        for index in sorted(self.bins):
+            seen += self.bins[index]
+            if seen > rank: break # for index
+        return 2 * self.GAMMA ** index / (self.GAMMA + 1)
+
+    def dumps(self):
+        """Returns sketch as bytes."""
+        indexes = sorted(self.bins)
+        return pack_varints([self.zeros, len(indexes)]) + pack_varints(indexes, delta=True) + \
+               pack_varints(self.bins[i] for i in indexes)
+
+    def loads(self, data):
+        """Populates sketch from bytes produced by dumps()."""
+        (self.zeros, count), offset = unpack_varints(data, 2)
+        indexes, offset = unpack_varints(data, count, offset, delta=True)
+        counts, _ = unpack_varints(data, count, offset)
+        self.bins = dict(zip(indexes, counts))
+        self.total = self.zeros + sum(counts)
+
+
+class Tracker(object):
+    """Maintains sketches of current day for inserted events, saving changes to database."""
+
+    def __init__(self):
+        self.days = {} # {table: [day, count, last stamp, {name: sketch}]}
+        self.dirty = set()
+
+    def add(self, table, data):
+        """Adds inserted event to sketches of its table."""
+        if table not in TABLES: return
+        entry = self.days.get(table)
+        if not entry or entry[0] != data["day"]:
+            if table in self.dirty: self.save()
+            # Event is already in database, sketches built from all events on day include it
+            count, last, sketches = build(table, data["day"])
+            self.days[table] = [data["day"], count, last, sketches]
+            self.dirty.add(table)
+            return
+        sketches = entry[3]
+        if "keys" in sketches: sketches["keys"].add(data["key"])
+        if data["fk_program"] is not None: sketches["programs"].add(data["fk_program"])
+        if "intervals" in sketches and entry[2] is not None:
+            sketches["intervals"].add(max(0, data["stamp"] - entry[2]))
+        entry[1], entry[2] = entry[1] + 1, data["stamp"]
+        self.dirty.add(table)
+
+    def save(self):
+        """Writes changed sketches to database."""
+        for table in list(self.dirty):
+            day, count, _, sketches = self.days[table]
+            store(table, day, count, sketches)
+            self.dirty.discard(table)
+
+    def clear(self):
+        """Drops sketches from memory, to be rebuilt from database on next event."""
+        self.days.clear(), self.dirty.clear()
+
+
+def build(table, day):
+    """Returns (count, last stamp, {name: sketch}) for table events on day, from database."""
+    sketches = make(table)
+    cols = ["stamp", "fk_program"] + (["key"] if "keys" in sketches else [])
+    count, last = 0, None
+    for row in db.fetchrows(table, cols, day=day, order="stamp"):
+        if "keys" in sketches: sketches["keys"].add(row[2])
+        if row[1] is not None: sketches["programs"].add(row[1])
+        if last is not None and "intervals" in sketches: sketches["intervals"].add(row[0] - last)
+        count, last = count + 1, row[0]
+    return count, last, sketches
+
+
+def collect(table, days):
+    """
+    Returns sketches of table events merged over days, as {name: sketch},
+    or None if table is not sketched. Sketches missing or outdated in database
+    are rebuilt from events, and stored if day is past.
+
+    @param   days  [{day, count}] as in counts-table
+    """
+    if table not in TABLES: return None
+    rows, today = None, datetime.date.today().isoformat()
+    result = make(table)
+    for d in days:
+        day, key = str(d["day"]), (table, str(d["day"]), d["count"])
+        with _lock: sketches = _cache.pop(key, None)
+        metrics.count_cache("sketches", hits=int(sketches is not None), misses=int(sketches is None))
+        if sketches is None:
+            if rows is None: # Populate on first need
+                cols = "day || '' AS day, count, %s" % ", ".join(TABLES[table])
+                rows = {x["day"]: x for x in db.fetch("sketches", cols, type=table)}
+            row = rows.get(day)
+            if row and row["count"] == d["count"]:
+                sketches = {k: CLASSES[k](row[k]) for k in TABLES[table]}
+            else:
+                count, _, sketches = build(table, day)
+                if day < today: store(table, day, count, sketches)
+        with _lock:
+            _cache[key] = sketches # Move to end as most recently used
+            while len(_cache) > conf.StatsCacheDays: _cache.popitem(last=False)
+        for name, sketch in sketches.items(): result[name].merge(sketch)
+    return result
+
+
+def get_cache():
+    """Returns cached sketches, as {(table, day, count): {name: sketch}}."""
+    with _lock: return dict(_cache)
+
+
+def make(table):
+    """Returns new empty sketches for table, as {name: sketch}."""
+    return {name: CLASSES[name]() for name in TABLES[table]}
+
+
+def store(table, day, count, sketches):
+    """Writes sketches of table events on day to database."""
+    values = dict((k, sqlite3.Binary(v.dumps())) for k, v in sketches.items())
+    db.replace("sketches", type=table, day=day, count=count, **values)
+
+
+"""Sketch classes by name."""
+CLASSES = {"keys": HyperLogLog, "programs": HyperLogLog, "intervals": DDSketch}
@@ -3,7 +3,7 @@
  *
  * @author      Erki Suurjaak
  * @created     26.07.2023
- * @modified    15.04.2024
+ * @modified    18.10.2026
  */
 
 
@@ -141,7 +141,12 @@ var initFullscreenControls = function(selectors) {
  * Requires the "h337" heatmap library.
  *
  * @param   positions  list of heatmap positions, as [{x, y, value, label}]
- * @param   events     list of keyboard events, as [{dt, data: [{x, y, count, key}]}]
+ * @param   source     replay events source, as {url, total, limit, split, packed, ?live},
+ *                     where url responds with keyboard events as [{dt, keys: {key: count}}],
+ *                     total is expected count of events, limit is maximum number of events to load,
+ *                     split is whether keys need splitting into individual keys like "Ctrl-A",
+ *                     packed is whether url responds in compact binary encoding,
+ *                     and live is URL for following new events as in followLive()
  * @param   config     config dictionary for heatmap library component
  * @param   selectors  map of {heatmap,replay_start,replay_stop,interval,step,progress,status,
  *                             statustext,toggle_heatmap,toggle_keyboard,keyboard: query selector},
@@ -151,7 +156,7 @@ var initFullscreenControls = function(selectors) {
  *                       statustext: "#statustext", toggle_heatmap: "#show_heatmap",
  *                       toggle_keyboard: "#show_keyboard", keyboard: "#keyboard"}
  */
-var initKeyboardHeatmap = function(positions, events, config, selectors) {
+var initKeyboardHeatmap = function(positions, source, config, selectors) {
 
   var RADIUS    = 20;
   var LOGSCALE  = true;
@@ -180,6 +185,20 @@ var initKeyboardHeatmap = function(positions, events, config, selectors) {
   var myHeatmap = h337.create(merge(config, {container: elm_heatmap}));
   if (positions.length) myHeatmap.setData({data: positions, max: positions[0].value});
 
+  var keypositions = positions.reduce(function(o, v) { o[v.label] = v; return o; }, {});
+  var loader = makeReplayLoader(source.url, source.limit, function(evt, events) {
+    var last = events[events.length - 1];
+    var item = {dt: evt.dt, data: [], n: last ? last.n : 0}; // n: cumulative count of keys
+    Object.keys(evt.keys).forEach(function(kk) {
+      (source.split ? kk.split("-") : [kk]).forEach(function(k) {
+        if (k in keypositions) item.data.push({x: keypositions[k].x, y: keypositions[k].y,
+                                               count: evt.keys[kk], key: k});
+      });
+      item.n += evt.keys[kk];
+    });
+    events.push(item);
+  }, source.packed ? decodeReplay : null);
+
   elm_show_kb && elm_show_kb.addEventListener("click", function() {
     elm_keyboard.classList[this.checked ? "remove" : "add"]("hidden");
   });
@@ -213,9 +232,27 @@ var initKeyboardHeatmap = function(positions, events, config, selectors) {
     myHeatmap.setData({data: positions, max: positions.length ? positions[0].value : 0});
   });
 
-  var replay = function(index) { // Start populating heatmap incrementally
+  source.live && followLive(source.live, function(data) { // Add new events to heatmap
+    var items = [];
+    Object.keys(data.keys || {}).forEach(function(kk) {
+      (source.split ? kk.split("-") : [kk]).forEach(function(k) {
+        if (k in keypositions) items.push({x: keypositions[k].x, y: keypositions[k].y,
+                                           value: data.keys[kk], label: k});
+      });
+    });
+    positions.push.apply(positions, items);
+    if (!elm_statusdiv.classList.contains("progress")) myHeatmap.addData(items);
+  });
+
+  var replay = function(index) { // Start populating heatmap incrementally, loading events as needed
+    if (!elm_statusdiv.classList.contains("progress")) return;
+    loader.get(index, function() { replayLoaded(index); });
+  };
+
+  var replayLoaded = function(index) { // Populate heatmap from loaded events
     if (!elm_statusdiv.classList.contains("progress")) return;
 
+    var events = loader.events;
     if (index <= events.length - 1) {
       var step = parseInt(elm_step.value);
       if (step > 1) {
@@ -230,9 +267,10 @@ var initKeyboardHeatmap = function(positions, events, config, selectors) {
         myHeatmap.setData({data: datas, max: Math.max.apply(null, Object.values(maxes))});
       } else myHeatmap.addData(events[index].data);
 
-      var percent = (100 * index / events.length).toFixed() + "%";
-      if (index == events.length - 1) percent = "100%";
-      else if ("100%" == percent && index < events.length - 1) percent = "99%";
+      var last = loader.done && index == events.length - 1;
+      var percent = (100 * events[index].n / Math.max(source.total, events[index].n)).toFixed() + "%";
+      if (last) percent = "100%";
+      else if ("100%" == percent) percent = "99%";
       elm_status.innerHTML = events[index]["dt"] + " " + percent;
       elm_progress.style.width = percent;
 
@@ -256,8 +294,13 @@ var initKeyboardHeatmap = function(positions, events, config, selectors) {
  *
  * Requires the "h337" heatmap library.
  *
- * @param   positions  heatmap positions, as {display index: [{x, y, value, label}], }
- * @param   events     list of mouse events, as [{x, y, display, dt}]
+ * @param   positions  heatmap positions, as {display index: [{x, y, value, label}], },
+ *                     or {display index: positions in compact encoding as base64 string}
+ * @param   source     replay events source, as {url, total, limit, packed, ?live},
+ *                     where url responds with mouse events as [{x, y, display, dt}],
+ *                     total is expected count of events, limit is maximum number of events to load,
+ *                     packed is whether url responds in compact binary encoding,
+ *                     and live is URL for following new events as in followLive()
  * @param   config     config dictionary for heatmap library component
  * @param   selectors  map of {heatmap,replay_start,replay_stop,interval,step,progress,status,
  *                             statustext: query selector},
@@ -266,7 +309,7 @@ var initKeyboardHeatmap = function(positions, events, config, selectors) {
  *                       step: "#replay_step", progress: "#progressbar", status: "#status",
  *                       statustext: "#statustext"}
  */
-var initMouseHeatmaps = function(positions, events, config, selectors) {
+var initMouseHeatmaps = function(positions, source, config, selectors) {
 
   var RADIUS    = 20;
   var SELECTORS = {heatmap: ".heatmap-container .heatmap", replay_start: "#replay_start",
@@ -285,11 +328,15 @@ var initMouseHeatmaps = function(positions, events, config, selectors) {
 
   var replayevents = {};
   var resumeFunc = null;
+  var loader = makeReplayLoader(source.url, source.limit, function(evt, events) {
+    if (myHeatmaps[evt.display]) events.push(evt); // Skip displays not shown
+  }, source.packed ? decodeReplay : null);
   var myHeatmaps = Array.prototype.map.call(document.querySelectorAll(SELECTORS.heatmap), function(elm, display) {
     return h337.create(merge(config, {container: elm}));
   });
 
   Object.keys(positions).forEach(function(display) {
+    if ("string" == typeof positions[display]) positions[display] = decodePositions(positions[display]);
     myHeatmaps[display].setData({data: positions[display]});
   });
 
@@ -324,9 +371,23 @@ var initMouseHeatmaps = function(positions, events, config, selectors) {
     });
   });
 
-  var replay = function(index) { // Start populating heatmaps incrementally
+  source.live && followLive(source.live, function(data) { // Add new events to heatmaps
+    Object.keys(data.cells || {}).forEach(function(display) {
+      if (!myHeatmaps[display]) return;
+      positions[display] = (positions[display] || []).concat(data.cells[display]);
+      if (!elm_statusdiv.classList.contains("progress")) myHeatmaps[display].addData(data.cells[display]);
+    });
+  });
+
+  var replay = function(index) { // Start populating heatmaps incrementally, loading events as needed
     if (!elm_statusdiv.classList.contains("progress")) return;
+    loader.get(index, function() { replayLoaded(index); });
+  };
 
+  var replayLoaded = function(index) { // Populate heatmaps from loaded events
+    if (!elm_statusdiv.classList.contains("progress")) return;
+
+    var events = loader.events;
     if (index <= events.length - 1) {
       var step = parseInt(elm_step.value);
       if (step > 1) {
@@ -346,9 +407,10 @@ var initMouseHeatmaps = function(positions, events, config, selectors) {
         (replayevents[events[index].display] = replayevents[events[index].display] || []).push(events[index]);
       };
 
-      var percent = (100 * index / events.length).toFixed() + "%";
-      if (index == events.length - 1) percent = "100%";
-      else if ("100%" == percent && index < events.length - 1) percent = "99%";
+      var last = loader.done && index == events.length - 1;
+      var percent = (100 * (index + 1) / Math.max(source.total, index + 1)).toFixed() + "%";
+      if (last) percent = "100%";
+      else if ("100%" == percent) percent = "99%";
       elm_status.innerHTML = events[index]["dt"] + " " + percent;
       elm_progress.style.width = percent;
 
@@ -367,6 +429,211 @@ var initMouseHeatmaps = function(positions, events, config, selectors) {
 };
 
 
+/**
+ * Returns loader for replay events fetched from server in chunks,
+ * starting to prefetch next chunk when replay reaches halfway through previous chunk.
+ *
+ * @param   url      URL responding with newline-delimited JSON, first line as {cursor}
+ *                   for loading next chunk if any, followed by events
+ * @param   limit    maximum number of events to load
+ * @param   convert  function(event, events list) adding loaded event to events list,
+ *                   defaults to appending event as is
+ * @param   decode   function(ArrayBuffer) returning [header, events] if url responds
+ *                   in binary instead of newline-delimited JSON
+ * @return           object with {events: [], done: whether all loaded,
+ *                                get: function(index, callback) invoking callback
+ *                                     when event at index is loaded or loading has finished}
+ */
+var makeReplayLoader = function(url, limit, convert, decode) {
+  var self = {events: [], done: false};
+  var cursor = null, loading = false, prefetch = 0, count = 0, callbacks = [];
+  convert = convert || function(evt, events) { events.push(evt); };
+
+  var load = function() {
+    if (loading || self.done) return;
+    loading = true;
+    var xhr = new XMLHttpRequest();
+    var args = cursor ? (url.indexOf("?") < 0 ? "?" : "&") + "cursor=" + encodeURIComponent(cursor) : "";
+    xhr.open("GET", url + args);
+    if (decode) xhr.responseType = "arraybuffer";
+    xhr.onloadend = function() {
+      var header = {}, items = [];
+      if (200 == xhr.status && decode) {
+        var result = decode(xhr.response);
+        header = result[0], items = result[1];
+      } else if (200 == xhr.status) {
+        var lines = xhr.responseText.split("\n").filter(Boolean);
+        header = lines.length ? JSON.parse(lines[0]) : {};
+        items = lines.slice(1).map(function(x) { return JSON.parse(x); });
+      };
+      var length0 = self.events.length;
+      for (var i = 0; i < items.length && count < limit; i++, count++) {
+        convert(items[i], self.events);
+      };
+      cursor = header.cursor;
+      self.done = !cursor || count >= limit;
+      prefetch = length0 + Math.floor((self.events.length - length0) / 2);
+      loading = false;
+      callbacks.splice(0).forEach(function(f) { f(); });
+    };
+    xhr.send();
+  };
+
+  self.get = function(index, callback) {
+    if (index >= prefetch) load();
+    if (index < self.events.length || self.done) callback();
+    else callbacks.push(callback);
+  };
+
+  return self;
+};
+
+
+/**
+ * Returns mouse heatmap positions decoded from compact encoding.
+ *
+ * @param   text  base64 string of varints: count of positions,
+ *                followed by columns of x and y delta-encoded, and count
+ * @return        [{x, y, value}]
+ */
+var decodePositions = function(text) {
+  var bytes = Uint8Array.from(atob(text), function(c) { return c.charCodeAt(0); });
+  var state = {offset: 0};
+  var count = decodeVarints(bytes, 1, state)[0];
+  var xs = decodeVarints(bytes, count, state, true),
+      ys = decodeVarints(bytes, count, state, true),
+      vs = decodeVarints(bytes, count, state);
+  return xs.map(function(x, i) { return {x: x, y: ys[i], value: vs[i]}; });
+};
+
+
+/**
+ * Returns replay events decoded from compact binary encoding.
+ *
+ * @param   buffer  ArrayBuffer with header JSON line followed by columns of varints,
+ *                  as display, x, y, time for mouse events,
+ *                  or time, number of keys, key indexes, key counts for keyboard events,
+ *                  time as local milliseconds since epoch, delta-encoded like x and y
+ * @return          [header, [{x, y, display, dt}] or [{dt, keys: {key: count}}]]
+ */
+var decodeReplay = function(buffer) {
+  var bytes = new Uint8Array(buffer);
+  var state = {offset: bytes.indexOf(10) + 1}; // Header ends with newline
+  var header = JSON.parse(new TextDecoder("utf-8").decode(bytes.subarray(0, state.offset - 1)));
+  var count = header.events, events = [];
+  var formatTime = function(ms) { return new Date(ms).toISOString().replace("T", " ").slice(0, -1); };
+  if (header.keys) {
+    var times = decodeVarints(bytes, count, state, true),
+        sizes = decodeVarints(bytes, count, state),
+        total = sizes.reduce(function(a, b) { return a + b; }, 0),
+        keys  = decodeVarints(bytes, total, state),
+        vals  = decodeVarints(bytes, total, state);
+    for (var i = 0, j = 0; i < count; i++) {
+      var evt = {dt: formatTime(times[i]), keys: {}};
+      for (var k = 0; k < sizes[i]; k++, j++) evt.keys[header.keys[keys[j]]] = vals[j];
+      events.push(evt);
+    };
+  } else {
+    var displays = decodeVarints(bytes, count, state),
+        xs       = decodeVarints(bytes, count, state, true),
+        ys       = decodeVarints(bytes, count, state, true),
+        times    = decodeVarints(bytes, count, state, true);
+    for (var i = 0; i < count; i++) {
+      events.push({x: xs[i], y: ys[i], display: displays[i], dt: formatTime(times[i])});
+    };
+  };
+  return [header, events];
+};
+
+
+/**
+ * Returns integers decoded from LEB128 varints, zigzag-encoded for negative values.
+ *
+ * @param   bytes  Uint8Array
+ * @param   count  number of values to decode
+ * @param   state  {offset: position in bytes to start from}, updated in place
+ * @param   delta  whether values are encoded as differences from previous value
+ */
+var decodeVarints = function(bytes, count, state, delta) {
+  var result = new Array(count), offset = state.offset, prev = 0;
+  for (var i = 0; i < count; i++) {
+    var v = 0, mult = 1, b;
+    do { // Avoid bitwise operators, as these truncate to 32 bits
+      b = bytes[offset++];
+      v += (b & 0x7F) * mult;
+      mult *= 128;
+    } while (b >= 0x80);
+    v = (v % 2) ? -(v + 1) / 2 : v / 2;
+    result[i] = delta ? (prev += v) : v;
+  };
+  state.offset = offset;
+  return result;
+};
+
+
+/**
+ * Follows progress of a background job, reloading page when job is finished.
+ *
+ * @param   url        URL of job progress event stream
+ * @param   selectors  map of {progress,statustext: query selector}, defaults to
+ *                     {progress: "#progressbar", statustext: "#statustext"}
+ */
+var initJobProgress = function(url, selectors) {
+
+  var SELECTORS = {progress: "#progressbar", statustext: "#statustext"};
+  Object.keys(selectors || {}).forEach(function(k) { SELECTORS[k] = selectors[k] || SELECTORS[k]; });
+
+  var elm_progress   = document.querySelector(SELECTORS.progress),
+      elm_statustext = document.querySelector(SELECTORS.statustext);
+
+  if (!window.EventSource) return window.setTimeout(function() { location.reload(); }, 2000);
+
+  var source = new EventSource(url);
+  source.addEventListener("message", function(evt) {
+    var state = JSON.parse(evt.data);
+    elm_progress.style.width = Math.round(100 * state.progress) + "%";
+    elm_statustext.innerText = state.error || state.message || "";
+    if (state.done) {
+      source.close();
+      if (!state.error) location.reload();
+    }
+  });
+  source.addEventListener("error", function() { // Server gone or job no longer available
+    if (source.readyState == EventSource.CLOSED) location.reload();
+  });
+};
+
+
+/**
+ * Follows new events from live feed, updating event count on page.
+ *
+ * @param   url        URL of live event stream, responding with {count, last, ?cells, ?keys}
+ * @param   callback   function(data) invoked with each received message
+ * @param   selectors  map of {count: query selector}, defaults to {count: "#count"}
+ * @return             EventSource instance, or undefined if not supported
+ */
+var followLive = function(url, callback, selectors) {
+
+  var SELECTORS = {count: "#count"};
+  Object.keys(selectors || {}).forEach(function(k) { SELECTORS[k] = selectors[k] || SELECTORS[k]; });
+
+  var elm_count = document.querySelector(SELECTORS.count);
+  if (!window.EventSource) return;
+
+  var source = new EventSource(url);
+  source.addEventListener("message", function(evt) {
+    var data = JSON.parse(evt.data);
+    if (elm_count) {
+      var count = parseInt(elm_count.innerText.replace(/\D/g, "")) + data.count;
+      elm_count.innerText = count.toLocaleString("en");
+      elm_count.title = "Last event at " + data.last;
+    };
+    callback(data);
+  });
+  source.addEventListener("close", function() { source.close(); }); // Web UI shutting down
+  return source;
+};
+
 /**
  * Initializes elements to toggle element parent style on click.
  *
@@ -0,0 +1,438 @@
+# -*- coding: utf-8 -*-
+"""
+Statistics computed from per-day partial aggregates, mergeable over any range
+of days and computable in parallel processes, stored as summaries for past days.
+
+------------------------------------------------------------------------------
+This file is part of InputScope - mouse and keyboard input visualizer.
+Released under the MIT License.
+
+@author      Erki Suurjaak
+@created     18.10.2026
+@modified    18.10.2026
+------------------------------------------------------------------------------
+"""
+import bisect
+import collections
+import datetime
+import json
+import logging
+import math
+import multiprocessing
+import sqlite3
+import threading
+
+from . import conf
+from . import db
+from . import jobs
+from . import metrics
+from . util import pack_varints, unpack_varints
+
+
+"""Settings copied to worker processes, as configuration may not come from default file."""
+WORKER_SETTINGS = ["DbPath", "DbStatements", "DbUpdateStatements", "DbVersion",
+                   "DefaultScreenSize", "KeyboardSessionMaxDelta", "MouseHeatmapSize"]
+
+"""Version of stored summary format, summaries with other versions are recomputed."""
+SUMMARY_VERSION = 1
+
+"""Settings affecting summary contents, summaries with other settings are recomputed."""
+SUMMARY_SETTINGS = ["DefaultScreenSize", "KeyboardSessionMaxDelta", "MouseHeatmapSize"]
+
+_pool = None   # multiprocessing.Pool instance for computing partials
+_cache = collections.OrderedDict() # {(table, day, where, day count): partial}
+_lock = threading.Lock()
+
+logger = logging.getLogger(__name__)
+
+
+def collect_days(table, where, days, appmap):
+    """
+    Returns aggregates of events over given days, in the same form as
+    webui.collect_mouse() or webui.collect_keyboard(), merged from per-day partials.
+    Partials are cached, and computed in parallel if several are missing.
+    Partials over all events of past days are taken from and saved to stored summaries.
+
+    @param   where   query filter for events, excluding day
+    @param   days    [{day, count}] in chronological order,
+                     count used for detecting changes in cached partials
+    @param   appmap  {id: path} of registered applications
+    """
+    where = [(k, v) for k, v in where if k != "day"] # Per-day queries reusable across ranges
+    keys = [(table, str(d["day"]), repr(where), d["count"]) for d in days]
+    with _lock: partials = {k: _cache[k] for k in keys if k in _cache}
+    missing = [k for k in keys if k not in partials]
+    metrics.count_cache("partials", hits=len(partials), misses=len(missing))
+    if missing and conf.StatsSummaries and not where:
+        partials.update(load_summaries(table, missing))
+        loaded, missing = len(missing), [k for k in keys if k not in partials]
+        metrics.count_cache("summaries", hits=loaded - len(missing), misses=len(missing))
+    args, results = [(table, where + [("day", k[1])]) for k in missing], []
+    pool = get_pool() if len(missing) > 1 and conf.StatsParallel else None
+    # Computed in batches, for reporting progress and stopping early if job is cancelled
+    batch = (conf.StatsProcesses or multiprocessing.cpu_count()) if pool else 1
+    for i in range(0, len(args), batch):
+        db.check_limit()
+        jobs.report(float(i) / len(args), "Computing statistics for %s" % missing[i][1])
+        chunk = None
+        try: chunk = pool.map(make_partial, args[i:i + batch], chunksize=1) if pool else None
+        except Exception:
+            logger.exception("Error computing statistics in parallel.")
+            pool = None
+        if chunk is None: chunk = [make_partial(x) for x in args[i:i + batch]]
+        results.extend(chunk)
+    partials.update(zip(missing, results))
+    if conf.StatsSummaries and not where:
+        today = datetime.date.today().isoformat()
+        for key in (k for k in missing if k[1] < today): # Past days no longer change
+            store_summary(table, key[1], key[3], partials[key])
+    with _lock:
+        for k in keys: # Move to end as most recently used
+            _cache.pop(k, None)
+            _cache[k] = partials[k]
+        while len(_cache) > conf.StatsCacheDays: _cache.popitem(last=False)
+    merge = merge_mouse if table in conf.InputEvents["mouse"] else merge_keyboard
+    return merge(table, [partials[k] for k in keys], appmap)
+
+
+def summarize(limit=None):
+    """
+    Stores summaries for past days missing or outdated in database, latest days first.
+    Returns number of summaries stored.
+
+    @param   limit  maximum number of summaries to store
+    """
+    result, today, settings = 0, datetime.date.today().isoformat(), get_summary_settings()
+    cols = "type, day || '' AS day, count"
+    stored = {(x["type"], x["day"]): x["count"] for x in
+              db.fetch("day_summaries", cols, settings=settings)}
+    tables = [t for _, tt in conf.InputTables for t in tt]
+    for row in db.fetch("counts", cols, where=[("day", ("<", today))], order="day DESC"):
+        if row["type"] not in tables or stored.get((row["type"], row["day"])) == row["count"]:
+            continue # for row
+        partial = make_partial((row["type"], [("day", row["day"])]))
+        store_summary(row["type"], row["day"], row["count"], partial)
+        result += 1
+        if limit and result >= limit: break # for row
+    return result
+
+
+def load_summaries(table, keys):
+    """
+    Returns stored summaries matching day and count, as {key: partial}.
+
+    @param   keys  [(table, day, where, day count)] as in partials cache
+    """
+    result, settings, CHUNK = {}, get_summary_settings(), 500 # Stay under SQL parameter limit
+    for i in range(0, len(keys), CHUNK):
+        daykeys = {k[1]: k for k in keys[i:i + CHUNK]}
+        where = [("type", table), ("day", ("IN", list(daykeys))), ("settings", settings)]
+        for row in db.fetch("day_summaries", "day || '' AS day, count, data", where=where):
+            key = daykeys[row["day"]]
+            if row["count"] == key[3]: result[key] = unpack_partial(table, row["data"])
+    return result
+
+
+def store_summary(table, day, count, partial):
+    """Writes partial aggregates of table events on day to database."""
+    data = sqlite3.Binary(pack_partial(table, partial))
+    db.replace("day_summaries", type=table, day=day, count=count,
+               settings=get_summary_settings(), data=data)
+
+
+def get_partials():
+    """Returns cached partial aggregates, as {(table, day, where, day count): partial}."""
+    with _lock: return dict(_cache)
+
+
+def get_summary_settings():
+    """Returns summary format version and settings affecting summary contents, as JSON."""
+    settings = dict((k, getattr(conf, k)) for k in SUMMARY_SETTINGS)
+    return json.dumps(dict(settings, version=SUMMARY_VERSION), sort_keys=True)
+
+
+def pack_partial(table, partial):
+    """
+    Returns partial aggregates as bytes of header JSON line,
+    followed by varints of heatmap cells for mouse events, as [count, xs, ys, counts] per display.
+    """
+    micros = lambda x: (x.days * 86400 + x.seconds) * 10**6 + x.microseconds
+    FMT, p = "%Y-%m-%d %H:%M:%S.%f", dict(partial)
+    if table in conf.InputEvents["mouse"]:
+        event = lambda e: {k: e[k] for k in ("stamp", "display", "x", "y", "fk_program")} if e else None
+        p.update(first=event(p["first"]), last=event(p["last"]), totaldelta=micros(p["totaldelta"]),
+                 apps=[[k, dict(v["counts"]), micros(v["delta"]), v["distance"]]
+                       for k, v in p["apps"].items()],
+                 heatmap_sizes=sorted([k, w, h] for k, (w, h) in p["heatmap_sizes"].items()))
+        cells, data = p.pop("cells"), b""
+        for display, _, _ in p["heatmap_sizes"]:
+            xys = sorted(cells[display])
+            data += pack_varints([len(xys)]) + pack_varints((int(x) for x, _ in xys), delta=True) + \
+                    pack_varints(int(y) for _, y in xys) + pack_varints(cells[display][xy] for xy in xys)
+    else:
+        p.update(first=p["first"] and p["first"].strftime(FMT), last=p["last"] and p["last"].strftime(FMT),
+                 deltatotal=micros(p["deltatotal"]), sessions=[[n, micros(d)] for n, d in p["sessions"]],
+                 uniques=list(p["uniques"]), apps=[[k, list(v.items())] for k, v in p["apps"].items()])
+        data = b""
+    return json.dumps(p).encode("utf-8") + b"\n" + data
+
+
+def unpack_partial(table, data):
+    """Returns partial aggregates from bytes produced by pack_partial()."""
+    header, data = bytes(data).split(b"\n", 1)
+    p, delta = json.loads(header.decode("utf-8")), lambda x: datetime.timedelta(microseconds=x)
+    if table in conf.InputEvents["mouse"]:
+        for k in ("first", "last"):
+            if p[k]: p[k]["dt"] = datetime.datetime.fromtimestamp(p[k]["stamp"])
+        p.update(totaldelta=delta(p["totaldelta"]), counts=collections.Counter(p["counts"]),
+                 apps=collections.OrderedDict((k, {"counts": collections.Counter(c), "delta": delta(d),
+                                                   "distance": x}) for k, c, d, x in p["apps"]),
+                 heatmap_sizes={k: (w, h) for k, w, h in p["heatmap_sizes"]}, cells={})
+        offset = 0
+        for display in sorted(p["heatmap_sizes"]):
+            (count, ), offset = unpack_varints(data, 1, offset)
+            xs, offset = unpack_varints(data, count, offset, delta=True)
+            ys, offset = unpack_varints(data, count, offset)
+            counts, offset = unpack_varints(data, count, offset)
+            p["cells"][display] = dict(zip(zip(xs, ys), counts))
+    else:
+        FMT = "%Y-%m-%d %H:%M:%S.%f"
+        p.update(first=p["first"] and datetime.datetime.strptime(p["first"], FMT),
+                 last=p["last"] and datetime.datetime.strptime(p["last"], FMT),
+                 deltatotal=delta(p["deltatotal"]), sessions=[[n, delta(d)] for n, d in p["sessions"]],
+                 uniques=set(p["uniques"]), apps=collections.OrderedDict(
+                     (k, collections.Counter(collections.OrderedDict(v))) for k, v in p["apps"]))
+    return p
+
+
+def make_partial(args):
+    """Returns partial aggregates of events for one day, from (table, where with day)."""
+    table, where = args
+    make = make_mouse_partial if table in conf.InputEvents["mouse"] else make_keyboard_partial
+    return make(table, where)
+
+
+def make_mouse_partial(table, where):
+    """
+    Returns partial aggregates of mouse events, as {count, first, last, totaldelta, distance,
+    counts, apps: {id: {counts, delta, distance}}, heatmap_sizes, cells: {display: {(x, y): count}}},
+    with first and last as events with datetime.
+    """
+    first, last, totaldelta, distance = None, None, datetime.timedelta(), 0.0
+    count, counts, apps, cells = 0, collections.Counter(), collections.OrderedDict(), {}
+    heatmap_sizes = {} # {display: (w, h)} scaled to screen size of first event
+    scale = make_mouse_scaler(heatmap_sizes)
+    for e in db.select(table, where=where, order="stamp"):
+        e["dt"] = datetime.datetime.fromtimestamp(e["stamp"])
+        if not first: first = e
+        count, app_id = count + 1, e["fk_program"]
+        app = apps.get(app_id) or apps.setdefault(app_id, {"counts": collections.Counter(),
+                                                           "delta": datetime.timedelta(),
+                                                           "distance": 0.0})
+        if last and last["display"] == e["display"]:
+            delta = e["dt"] - last["dt"]
+            step = math.sqrt(sum(abs(e[k] - last[k])**2 for k in "xy"))
+            totaldelta, distance = totaldelta + delta, distance + step
+            if last["fk_program"] == app_id:
+                app["delta"] += delta
+                app["distance"] += step
+        last = e
+
+        xy = scale(e["display"], e["stamp"], e["x"], e["y"])
+        displaycells = cells.setdefault(e["display"], {})
+        displaycells[xy] = displaycells.get(xy, 0) + 1
+        if "moves" == table:
+            app["counts"][table] += 1
+        elif "clicks" == table:
+            counts.update(str(e["button"]))
+            app["counts"][str(e["button"])] += 1
+        elif "scrolls" == table:
+            for k in ("dx", "dy"):
+                key, value = "%s%s" % ("-" if e[k] < 0 else "", k), abs(e[k])
+                counts[key] += value
+                app["counts"][key] += value
+    return dict(count=count, first=first, last=last, totaldelta=totaldelta, distance=distance,
+                counts=counts, apps=apps, heatmap_sizes=heatmap_sizes, cells=cells)
+
+
+def make_keyboard_partial(table, where):
+    """
+    Returns partial aggregates of keyboard events, as {count, first, last, deltas, deltatotal,
+    sessions: [[intervals, duration]], head, tail, uniques, apps: {id: Counter(key: count)}},
+    with first and last as datetimes, and head and tail as whether first and last session
+    are open at start and end of day.
+    """
+    KEYNAME = "realkey" if "keys" == table else "key"
+    UNBROKEN_DELTA = datetime.timedelta(seconds=conf.KeyboardSessionMaxDelta)
+    first, last, count, deltas, deltatotal = None, None, 0, 0, datetime.timedelta()
+    sessions, session, head = [], None, False
+    uniques, apps = set(), collections.OrderedDict()
+    for e in db.select(table, "stamp, key, realkey, fk_program", where=where, order="stamp"):
+        dt = datetime.datetime.fromtimestamp(e["stamp"])
+        if not first: first = dt
+        count += 1
+        apps.setdefault(e["fk_program"], collections.Counter())[e[KEYNAME]] += 1
+        if last:
+            delta = dt - last
+            deltas, deltatotal = deltas + 1, deltatotal + delta
+            if delta > UNBROKEN_DELTA:
+                session = None
+            else:
+                if not session:
+                    session = [0, datetime.timedelta()]
+                    sessions.append(session)
+                    head = head or 1 == deltas
+                session[0] += 1
+                session[1] += delta
+        uniques.add(e["key"])
+        last = dt
+    return dict(count=count, first=first, last=last, deltas=deltas, deltatotal=deltatotal,
+                sessions=sessions, head=head, tail=session is not None, uniques=uniques, apps=apps)
+
+
+def merge_mouse(table, partials, appmap):
+    """Returns aggregates of mouse events merged from chronological per-day partials."""
+    first, last, totaldelta, distance = None, None, datetime.timedelta(), 0.0
+    counts, app_stats = collections.Counter(), collections.OrderedDict()
+    app_deltas = collections.defaultdict(datetime.timedelta) # {id: time in app}
+    app_distances = collections.defaultdict(float) # {id: pixels}
+    heatmap_sizes, cells = {}, {} # {display: (w, h)}, {display: {(x, y): count}}
+    for p in filter(lambda p: p["count"], partials):
+        e = p["first"]
+        if last and last["display"] == e["display"]: # Stitch last and first event of adjacent days
+            delta = e["dt"] - last["dt"]
+            step = math.sqrt(sum(abs(e[k] - last[k])**2 for k in "xy"))
+            totaldelta, distance = totaldelta + delta, distance + step
+            if appmap and last["fk_program"] == e["fk_program"]:
+                app_deltas[e["fk_program"]] += delta
+                app_distances[e["fk_program"]] += step
+        first, last = first or p["first"], p["last"]
+        totaldelta, distance = totaldelta + p["totaldelta"], distance + p["distance"]
+        counts.update(p["counts"])
+        for app_id, app in p["apps"].items():
+            if not app_id or app_id in appmap:
+                app_stats.setdefault(app_id, collections.Counter())
+                if appmap: app_stats[app_id].update(app["counts"])
+            if appmap:
+                app_deltas[app_id] += app["delta"]
+                app_distances[app_id] += app["distance"]
+        for display, size in p["heatmap_sizes"].items():
+            hs = heatmap_sizes.setdefault(display, size)
+            displaycells = cells.setdefault(display, {})
+            for (x, y), n in p["cells"][display].items():
+                if hs != size: # Screen aspect changed from first day, rescale to first heatmap
+                    y = min(int(y * hs[1] / size[1]), hs[1])
+                displaycells[(x, y)] = displaycells.get((x, y), 0) + n
+
+    positions = {i: [dict(x=x, y=y, count=v) for (x, y), v in cells[i].items()]
+                 for i in sorted(cells)}
+    return dict(interval=(last["dt"] - first["dt"]) if first else None, totaldelta=totaldelta,
+                distance=distance, counts=counts, app_stats=app_stats,
+                app_deltas=app_deltas, app_distances=app_distances,
+                heatmap_sizes=heatmap_sizes, positions=positions)
+
+
+def merge_keyboard(table, partials, appmap):
+    """Returns aggregates of keyboard events merged from chronological per-day partials."""
+    UNBROKEN_DELTA = datetime.timedelta(seconds=conf.KeyboardSessionMaxDelta)
+    first, last, deltas, deltatotal = None, None, 0, datetime.timedelta()
+    sessions, tail, uniques = [], False, set()
+    app_stats = collections.OrderedDict() # {id: Counter(key: count)}
+    for p in filter(lambda p: p["count"], partials):
+        daysessions, joined = [list(x) for x in p["sessions"]], False
+        if last: # Stitch typing sessions over last and first event of adjacent days
+            delta = p["first"] - last
+            deltas, deltatotal = deltas + 1, deltatotal + delta
+            joined = delta <= UNBROKEN_DELTA
+            if joined:
+                left = sessions.pop() if tail else [0, datetime.timedelta()]
+                right = daysessions.pop(0) if p["head"] else [0, datetime.timedelta()]
+                sessions.append([left[0] + 1 + right[0], left[1] + delta + right[1]])
+        tail = p["tail"] if p["deltas"] else joined
+        first, last = first or p["first"], p["last"]
+        deltas, deltatotal = deltas + p["deltas"], deltatotal + p["deltatotal"]
+        sessions.extend(daysessions)
+        uniques |= p["uniques"]
+        for app_id, counter in p["apps"].items():
+            if not app_id or app_id in appmap:
+                app_stats.setdefault(app_id, collections.Counter()).update(counter)
+
+    longest = max(sessions + [[1, datetime.timedelta()]], key=lambda x: x[1])
+    return dict(interval=(last - first) if first else None, deltas=deltas, deltatotal=deltatotal,
+                sessions=len(sessions), session_keys=sum(x[0] + 1 for x in sessions),
+                session_duration=sum((x[1] for x in sessions), datetime.timedelta()),
+                longest_duration=longest[1], longest_keys=longest[0] + 1,
+                most_keys=max(x[0] + 1 for x in sessions) if sessions else 0,
+                uniques=len(uniques), app_stats=app_stats)
+
+
+def make_mouse_scaler(heatmap_sizes):
+    """
+    Returns function(display, stamp, x, y) returning (x, y) scaled to heatmap,
+    by screen size at event time.
+
+    @param   heatmap_sizes  heatmap sizes as {display: (w, h)}, populated for displays
+                            not yet present with heatmap scaled to screen height at event
+    """
+    HS = conf.MouseHeatmapSize
+    SIZES, STAMPS = get_screen_sizes()
+    cursizes = {} # {display: (start stamp, end stamp, {0,1,2,3,w,h})}
+
+    def scale(display, stamp, x, y):
+        start, end, sz = cursizes.get(display) or (None, None, None)
+        if sz is None or not start <= stamp < end:
+            # Find latest size from before event, fallback to first size recorded
+            sizes, stamps = SIZES[display], STAMPS[display]
+            index = max(0, bisect.bisect_right(stamps, stamp) - 1)
+            start = stamps[index] if index else -float("inf")
+            end = stamps[index + 1] if index + 1 < len(stamps) else float("inf")
+            cursizes[display] = start, end, sizes[index]
+            sz = sizes[index]
+        if display not in heatmap_sizes: # Make heatmap scaled to screen height
+            heatmap_sizes[display] = (HS[0], HS[0] * sz["h"] / sz["w"])
+        hs = heatmap_sizes[display]
+        # Constrain within heatmap, events at edges can have off-screen coordinates
+        return tuple(max(0, min(int(float(v - sz[k]) * hs[k] / sz[k + 2]), hs[k]))
+                     for k, v in enumerate([x, y]))
+    return scale
+
+
+def get_screen_sizes():
+    """
+    Returns desktop sizes by time, as ({display: [{0,1,2,3,w,h}, ]}, {display: [start stamp, ]}),
+    defaulting to configured size for displays with no recorded sizes.
+    """
+    SZ = {0: 0, 1: 0, 2: conf.DefaultScreenSize[0], 3: conf.DefaultScreenSize[1],
+          "w": conf.DefaultScreenSize[0], "h": conf.DefaultScreenSize[1]}
+    SIZES = collections.defaultdict(lambda: [SZ])
+    STAMPS = collections.defaultdict(lambda: [0])
+    vals = lambda d, kk="xywh": [d[k] for k in kk]
+    cols = "*, CAST(STRFTIME('%s', dt, 'utc') AS REAL) AS stamp" # dt is in local time
+    for row in db.fetch("screen_sizes", cols, order="dt"):
+        row.update({0: row["x"], 1: row["y"], 2: row["w"], 3: row["h"]})
+        if row["display"] not in SIZES or vals(SIZES[row["display"]][-1]) != vals(row):
+            if row["display"] not in SIZES: SIZES[row["display"]], STAMPS[row["display"]] = [], []
+            SIZES[row["display"]].append(row)
+            STAMPS[row["display"]].append(row["stamp"])
+    return SIZES, STAMPS
+
+
+def get_pool():
+    """Returns process pool for computing partials, created on first call; None if disabled."""
+    global _pool
+    if _pool is None and conf.StatsProcesses != 1:
+        settings = {k: getattr(conf, k) for k in WORKER_SETTINGS}
+        try:
+            _pool = multiprocessing.Pool(conf.StatsProcesses or None, init_worker, (settings, ))
+        except Exception:
+            logger.exception("Error creating process pool for statistics.")
+            conf.StatsProcesses = 1 # Compute in current process from now on
+    return _pool
+
+
+def init_worker(settings):
+    """Initializes configuration and database in pool worker process."""
+    for k, v in settings.items(): setattr(conf, k, v)
+    db.clear_limits() # Forked from a thread with query limits
+    db.detach() # Forked with parent connections open, unusable in child
+    db.init(conf.DbPath, conf.DbStatements, conf.DbUpdateStatements, conf.DbVersion)
@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+"""
+Listener status counters in a fixed-layout memory-mapped file next to database,
+readable by tray and web UI without locks or database access.
+
+Writer increments a sequence number before and after each update, odd while writing;
+readers retry until sequence is even and unchanged over reading.
+
+------------------------------------------------------------------------------
+This file is part of InputScope - mouse and keyboard input visualizer.
+Released under the MIT License.
+
+@author      Erki Suurjaak
+@created     18.10.2026
+@modified    18.10.2026
+------------------------------------------------------------------------------
+"""
+import mmap
+import os
+import struct
+import threading
+import time
+
+from . import conf
+
+
+"""Event tables with separate counters."""
+TABLES = ("moves", "clicks", "scrolls", "keys", "combos")
+
+"""Status fields in layout order, as [(name, struct format)]."""
+FIELDS = [
+    ("pid",            "Q"), # Listener database writer process ID, 0 if stopped
+    ("started",        "d"), # Listener start timestamp
+    ("updated",        "d"), # Last update timestamp
+    ("received",       "Q"), # Events received from input hooks
+    ("dropped",        "Q"), # Events discarded as queue was full
+    ("queued",         "Q"), # Events queued for writing
+    ("flushed",        "Q"), # Events written to database
+    ("depth",          "Q"), # Current queue size
+    ("flush_duration", "d"), # Duration of last database write, in seconds
+    ("flushed_at",     "d"), # Timestamp of last database write
+    ("session",        "Q"), # Active session ID, 0 if none
+    ("flushes",        "Q"), # Number of database writes
+    ("flush_total",    "d"), # Total duration of database writes, in seconds
+] + [("flushed_%s" % t, "Q") for t in TABLES] \
+  + [("dropped_%s" % t, "Q") for t in TABLES] # Per-table counts of written and dropped events
+
+HEADER  = struct.Struct("<4sII") # Magic, layout version, sequence
+BODY    = struct.Struct("<" + "".join(f for _, f in FIELDS))
+MAGIC   = b"ISST"
+VERSION = 2
+SIZE    = HEADER.size + BODY.size
+
+_reader = None # Reader instance for read()
+
+
+class Writer(object):
+    """Publishes listener status, with updates from any thread."""
+
+    def __init__(self, path=None):
+        self.path = path or get_path()
+        self.values = dict((k, 0) for k, _ in FIELDS)
+        self.values.update(pid=os.getpid(), started=time.time())
+        self.sequence = 0
+        self.lock = threading.Lock()
+        # Existing file is reused in place, as readers may have it mapped
+        if not os.path.isfile(self.path): open(self.path, "wb").close()
+        self.file = open(self.path, "r+b")
+        if os.fstat(self.file.fileno()).st_size < SIZE: self.file.truncate(SIZE)
+        self.map = mmap.mmap(self.file.fileno(), SIZE)
+        self.update()
+
+    def update(self, counts=None, **values):
+        """
+        Increments counters and sets values, writes status.
+
+        @param   counts  {name: increment}
+        """
+        with self.lock:
+            for k, v in (counts or {}).items(): self.values[k] += v
+            self.values.update(values, updated=time.time())
+            self.sequence += 1 # Odd: write in progress
+            HEADER.pack_into(self.map, 0, MAGIC, VERSION, self.sequence % 2**32)
+            BODY.pack_into(self.map, HEADER.size, *[self.values[k] for k, _ in FIELDS])
+            self.sequence += 1
+            HEADER.pack_into(self.map, 0, MAGIC, VERSION, self.sequence % 2**32)
+
+    def close(self):
+        """Marks listener stopped and closes file."""
+        try:
+            self.update(pid=0)
+            self.map.close(), self.file.close()
+        except Exception: pass
+
+
+
+class Reader(object):
+    """Reads listener status without locking."""
+
+    def __init__(self, path=None):
+        self.path = path or get_path()
+        self.file = self.map = None
+
+    def read(self, retries=100):
+        """Returns status as {name: value}, or None if not available."""
+        if not self.map:
+            if not os.path.isfile(self.path) or os.path.getsize(self.path) < SIZE: return None
+            self.file = open(self.path, "rb")
+            self.map = mmap.mmap(self.file.fileno(), SIZE, access=mmap.ACCESS_READ)
+        for _ in range(retries):
+            magic, version, sequence = HEADER.unpack_from(self.map, 0)
+            if MAGIC != magic or VERSION != version: return None
+            if sequence % 2: continue # for _
+            values = BODY.unpack_from(self.map, HEADER.size)
+            if HEADER.unpack_from(self.map, 0)[2] == sequence:
+                return dict(zip((k for k, _ in FIELDS), values))
+        return None
+
+    def close(self):
+        """Closes file."""
+        try: self.map and self.map.close(), self.file and self.file.close()
+        except Exception: pass
+        self.file = self.map = None
+
+
+
+def get_path():
+    """Returns path of status file, next to database, named by layout version."""
+    return "%s.v%s.status" % (os.path.splitext(conf.DbPath)[0], VERSION)
+
+
+def read():
+    """Returns current listener status as {name: value}, or None if not available."""
+    global _reader
+    if not _reader: _reader = Reader()
+    try: return _reader.read()
+    except Exception:
+        _reader.close()
+        return None
+
+
+def format_status(status):
+    """Returns listener status as short text, like "123 received, 0 dropped, .."."""
+    if not status or not status["pid"]: return "not running"
+    return "%s received, %s dropped, %s written, %s in queue, last write took %s ms" % (
+        "{:,}".format(status["received"]), "{:,}".format(status["dropped"]),
+        "{:,}".format(status["flushed"]), "{:,}".format(status["depth"]),
+        int(1000 * status["flush_duration"]),
+    )
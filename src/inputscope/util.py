@@ -8,9 +8,10 @@ Released under the MIT License.
 
 @author      Erki Suurjaak
 @created     17.10.2021
-@modified    10.04.2024
+@modified    18.10.2026
 ------------------------------------------------------------------------------
 """
+import bisect
 import datetime
 import errno
 try: import fcntl
@@ -80,6 +81,45 @@ def format_weekday(value, long=False):
     return value.strftime("%A" if long else "%a")
 
 
+def pack_varints(values, delta=False):
+    """
+    Returns integers as bytes of LEB128 varints, zigzag-encoded for negative values.
+
+    @param   delta  whether to encode values as differences from previous value
+    """
+    result, prev = bytearray(), 0
+    for v in values:
+        if delta: v, prev = v - prev, v
+        v = (v << 1) if v >= 0 else (-v << 1) - 1
+        while v > 0x7F:
+            result.append(0x80 | (v & 0x7F))
+            v >>= 7
+        result.append(v)
+    return bytes(result)
+
+
+def unpack_varints(data, count=None, offset=0, delta=False):
+    """
+    Returns (list of integers, offset after last value) from bytes of LEB128 varints
+    produced by pack_varints().
+
+    @param   count   number of values to read, defaults to all
+    @param   offset  position in data to start reading from
+    @param   delta   whether values were encoded as differences from previous value
+    """
+    data, result, prev = bytearray(data), [], 0
+    while offset < len(data) and (count is None or len(result) < count):
+        v = shift = 0
+        while True:
+            b = data[offset]
+            v, shift, offset = v | ((b & 0x7F) << shift), shift + 7, offset + 1
+            if b < 0x80: break # while True
+        v = (v >> 1) if not v & 1 else -((v + 1) >> 1)
+        if delta: v = prev = prev + v
+        result.append(v)
+    return result, offset
+
+
 def run_later(function, millis=0):
     """Runs the function in a later thread."""
     if wx: wx.CallLater(millis, function)
@@ -107,6 +147,43 @@ def zhex(v):
     return "%s0x%0*X" % (sign, 2 * int(1 + math.log(v) / math.log(2) // 8), v)
 
 
+class Histogram(object):
+    """Counts values into fixed buckets, for cheap percentile estimates."""
+
+    def __init__(self, bounds):
+        """
+        @param   bounds  ascending bucket upper bounds, last bucket holding anything larger
+        """
+        self.bounds = list(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count, self.total, self.max = 0, 0, None
+
+    def add(self, value):
+        """Adds value to histogram."""
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count, self.total = self.count + 1, self.total + value
+        if self.max is None or value > self.max: self.max = value
+
+    def percentile(self, p):
+        """Returns upper bound of bucket holding percentile p in 0..100, capped at maximum."""
+        if not self.count: return None
+        target, seen = p * self.count / 100., 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if count and seen >= target: break # for i, count
+        return min(self.bounds[i], self.max) if i < len(self.bounds) else self.max
+
+    def format(self, unit=""):
+        """Returns summary text like "1,234 values, mean 4.1ms, p50 5ms, p90 10ms, p99 20ms, max 31.5ms"."""
+        if not self.count: return "no values"
+        fmt = lambda v: "%s%s" % (round(v, 1) if isinstance(v, float) else v, unit)
+        return "%s values, mean %s, p50 %s, p90 %s, p99 %s, max %s" % (
+            "{:,}".format(self.count), fmt(self.total / float(self.count)),
+            fmt(self.percentile(50)), fmt(self.percentile(90)), fmt(self.percentile(99)),
+            fmt(self.max)
+        )
+
+
 class LineQueue(threading.Thread):
     """Reads lines from a file-like object and pushes to self.queue."""
     def __init__(self, input):
@@ -18,7 +18,7 @@ Released under the MIT License.
 
 @author      Erki Suurjaak
 @created     07.04.2015
-@modified    15.04.2024
+@modified    18.10.2026
 ------------------------------------------------------------------------------
 %"""
 %import os, bottle
@@ -92,7 +92,7 @@ Released under the MIT License.
     %end # if prevperiod
 
   <select id="dayselector">
-    %if not period or not events:
+    %if not period or not get("count"):
     <option>- period -</option>
     %end # if not period
     %prevmonth, prevyear = None, None
@@ -10,12 +10,15 @@ Template arguments:
   heatmap_sizes   mouse heatmap sizes scaled to screen height at first event, as {display: [w, h]}
   heatmap_stats   heatmap position counts, as {display: [{x, y, count}, ]} for mouse
                   or [{x, y, count}] for keyboard
-  events          list of replayable events, as [{x, y, display, dt}] for mouse
-                  or [{dt, keys: {key: count}}] for keyboard
+  heatmap_packed  mouse heatmap position counts in compact encoding if enabled, as {display: str}
+  replay_url      URL for loading replayable events in chunks
+  live_url        URL for following new events live, if any
   key_counts      keyboard event counts for heatmap, with real keys like Lshift, as [{key, count}]
   key_stats       keyboard event counts for statistics, as [{key, count}]
   session         session data, if any
   stats_texts     statistics texts, as [(label, text)]
+  stats_limited   what was limited by MaxEventsForStats, like "Heatmap", empty if nothing
+  stats_stride    row stride of sample that mouse statistics and heatmap were estimated from, if any
   apps            list of all registered applications, as [{id, path}]
   app_ids         list of application IDs currently filtered by
   app_search      application filter search text
@@ -28,7 +31,7 @@ Released under the MIT License.
 
 @author      Erki Suurjaak
 @created     21.05.2015
-@modified    13.04.2024
+@modified    18.10.2026
 ------------------------------------------------------------------------------
 %"""
 %import base64, json, os
@@ -61,7 +64,7 @@ Released under the MIT License.
 %    except Exception: pass
 %    end # try
 %end # if period
-    ({{ "{:,}".format(count) }})
+    (<span id="count">{{ "{:,}".format(count) }}</span>)
   </span>
 
   <span id="replaysection">
@@ -162,9 +165,12 @@ Released under the MIT License.
     %for key, val in stats_texts:
       <tr><td>{{ key }}</td><td>{{ val }}</td></tr>
     %end # for key, val
-    %if count > conf.MaxEventsForStats:
-      <tr><td colspan="2">Statistics and heatmap limited to a maximum of {{ "{:,}".format(conf.MaxEventsForStats) }} events.</td></tr>
-    %end # if count > conf.MaxEventsForStats
+    %if count > conf.MaxEventsForStats and get("stats_limited"):
+      <tr><td colspan="2">{{ stats_limited }} limited to a maximum of {{ "{:,}".format(conf.MaxEventsForStats) }} events.</td></tr>
+    %end # if count > conf.MaxEventsForStats and stats_limited
+    %if get("stats_stride"):
+      <tr><td colspan="2">Statistics and heatmap estimated from a sample of 1 in {{ "{:,}".format(stats_stride) }} events, with margins of error at 95% confidence; per-application time and distance not estimated.</td></tr>
+    %end # if stats_stride
     </table>
   </div>
 %end # if stats_texts
@@ -212,20 +218,20 @@ Released under the MIT License.
 
 <script type="text/javascript">
 <%
-if "mouse" == input:
+if "mouse" == input and get("heatmap_packed"):
+    positions = heatmap_packed
+elif "mouse" == input:
     positions = {display: [{"x": p["x"], "y": p["y"], "value": p.get("count", 1)} for p in pp]
                  for display, pp in heatmap_stats.items()}
-    events = [{"x": e["x"], "y": e["y"], "display": e["display"], "dt": str(e["dt"])} for e in events]
 else:
     KP = dict(conf.KeyPositions, **conf.CustomKeyPositions)
     split_keys = lambda kk: (k for k in (kk.split("-") if "combos" == table else [kk]) if k in KP)
     positions = [{"x": KP[k][0], "y": KP[k][1], "value": p["count"], "label": k}
                  for p in heatmap_stats for k in split_keys(p["key"])]
-    events = [{"dt": str(e["dt"]), "data": [
-                {"x": KP[k][0], "y": KP[k][1], "count": c, "key": k}
-                for kk, c in e["keys"].items() for k in split_keys(kk)
-              ]} for e in events]
 end # if "mouse"
+replay = {"url": replay_url, "total": min(count, conf.MaxEventsForReplay),
+          "limit": conf.MaxEventsForReplay, "split": "combos" == table,
+          "packed": conf.WebPackedData, "live": get("live_url")}
 config = dict(conf.HeatmapDisplayOptions,
               **dict(conf.HeatmapDisplayOptions.get(input, {}), **conf.HeatmapDisplayOptions.get(table, {})))
 for name in conf.InputFlags: config.pop(name, None)
@@ -234,10 +240,10 @@ appidstr = "" if app_search else ",".join(map(str, app_ids or []))
 
 %>
   var positions = {{! json.dumps(positions) }};
-  var events = {{! json.dumps(events) }};
+  var replay = {{! json.dumps(replay) }};
   var config = {{! json.dumps(config) }};
   window.addEventListener("load", function() {
-    {{ "initMouseHeatmaps" if "mouse" == input else "initKeyboardHeatmap" }}(positions, events, config);
+    {{ "initMouseHeatmaps" if "mouse" == input else "initKeyboardHeatmap" }}(positions, replay, config);
     initFullscreenControls();
 %if conf.ProgramsEnabled:
     initAppsFilter("{{ make_url(appids=None, appnames=None) }}", "{{ app_search or "" }}", "{{ appidstr }}");
@@ -0,0 +1,42 @@
+%"""
+Progress page for statistics being computed in a background job,
+reloaded when job is finished.
+
+Template arguments:
+  input           "mouse"|"keyboard"
+  table           events table to show, like "moves" or "keys"
+  period          period for events, if any (day like "2020-02-20" or month like "2020-02")
+  days            list of available days
+  count           count of all events
+  job             background job computing statistics
+  session         session data, if any
+
+------------------------------------------------------------------------------
+This file is part of InputScope - mouse and keyboard input visualizer.
+Released under the MIT License.
+
+@author      Erki Suurjaak
+@created     18.10.2026
+@modified    18.10.2026
+------------------------------------------------------------------------------
+%"""
+%title = "%s %s" % (input.capitalize(), table)
+%rebase("base.tpl", **locals())
+
+<div id="heading" class="flex-row">
+  <span>
+    <h3>{{ title }}</h3>{{ ", %s" % period if period else "" }}
+    ({{ "{:,}".format(count) }})
+  </span>
+</div>
+
+<div id="status">
+  <span id="statustext">{{ job.message or "Computing statistics" }}</span>
+  <span id="progressbar" style="width: {{ int(100 * job.progress) }}%;"></span>
+</div>
+
+<script type="text/javascript">
+  window.addEventListener("load", function() {
+    initJobProgress("{{ get_url("/jobs/<id>/events", id=job.id) }}");
+  });
+</script>
@@ -0,0 +1,60 @@
+%"""
+Recorded request profiles page, with links for downloading each profile.
+
+Template arguments:
+  items  [profiles.Profile], newest first
+
+------------------------------------------------------------------------------
+This file is part of InputScope - mouse and keyboard input visualizer.
+Released under the MIT License.
+
+@author      Erki Suurjaak
+@created     18.10.2026
+@modified    18.10.2026
+------------------------------------------------------------------------------
+%"""
+%from inputscope.util import format_stamp
+%title, WEBROOT = "Request profiles", get_url("/")
+%rebase("base.tpl", **locals())
+
+<div id="heading" class="flex-row">
+  <span>
+    <h3>{{ title }}</h3> ({{ len(items) }})
+  </span>
+</div>
+
+%if not items:
+<div>
+  No profiles recorded. Add "profile" to the query string of any page to profile it,
+  or set WebProfileSample in configuration.
+</div>
+%else:
+<table class="outlined" id="profiles">
+  <tr>
+    <th>Time</th>
+    <th>Duration</th>
+    <th>Route</th>
+    <th>URL</th>
+    <th>Functions</th>
+    <th>Download</th>
+  </tr>
+%for item in items:
+  <tr>
+    <td>{{ format_stamp(item.meta["started"], "%Y-%m-%d %H:%M:%S") }}</td>
+    <td>{{ "%.3fs" % item.meta["duration"] }}</td>
+    <td>{{ item.meta["route"] }}</td>
+    <td>
+      {{ item.meta["method"] }} {{ item.meta["url"] }}
+%if item.meta["error"]:
+      <div>{{ item.meta["error"] }}</div>
+%end # if item.meta["error"]
+    </td>
+    <td>{{ "{:,}".format(len(item.stats)) }}</td>
+    <td>
+      <a href="{{ WEBROOT }}debug/profiles/{{ item.id }}.prof" title="pstats data, for snakeviz or python -m pstats">pstats</a>
+      <a href="{{ WEBROOT }}debug/profiles/{{ item.id }}.txt" title="collapsed stacks, for flamegraph.pl or speedscope">collapsed</a>
+    </td>
+  </tr>
+%end # for item
+</table>
+%end # if not items
@@ -0,0 +1,64 @@
+%"""
+Database query profile page, with statement shapes by total duration.
+
+Template arguments:
+  queries  [{shape, count, time, max, rows, plan}]
+  sort     field queries are sorted by, "time"|"count"|"max"|"rows"
+
+------------------------------------------------------------------------------
+This file is part of InputScope - mouse and keyboard input visualizer.
+Released under the MIT License.
+
+@author      Erki Suurjaak
+@created     18.10.2026
+@modified    18.10.2026
+------------------------------------------------------------------------------
+%"""
+%title = "Database queries"
+%rebase("base.tpl", **locals())
+
+<div id="heading" class="flex-row">
+  <span>
+    <h3>{{ title }}</h3>
+    ({{ "{:,}".format(sum(x["count"] for x in queries)) }} queries,
+     {{ "%.3f" % sum(x["time"] for x in queries) }}s)
+  </span>
+</div>
+
+%if not conf.DbProfiling:
+<div>Query profiling is disabled, enable DbProfiling in configuration.</div>
+%elif not queries:
+<div>No queries recorded.</div>
+%else:
+<table class="outlined" id="queries">
+  <tr>
+%for name, label in [("time", "Total"), ("count", "Count"), (None, "Mean"), ("max", "Max"), ("rows", "Rows")]:
+    <th>
+%if name and name != sort:
+      <a href="?sort={{ name }}">{{ label }}</a>
+%else:
+      {{ label }}
+%end # if name and name != sort
+    </th>
+%end # for name, label
+    <th>Statement</th>
+    <th>Slowest plan</th>
+  </tr>
+%for query in queries:
+  <tr>
+    <td>{{ "%.3f" % query["time"] }}</td>
+    <td>{{ "{:,}".format(query["count"]) }}</td>
+    <td>{{ "%.3f" % (query["time"] / query["count"]) if query["count"] else "" }}</td>
+    <td>{{ "%.3f" % query["max"] }}</td>
+    <td>{{ "{:,}".format(query["rows"]) }}</td>
+    <td><code>{{ query["shape"] }}</code></td>
+    <td>
+%for line in query["plan"] or []:
+%is_scan = line.strip().startswith("SCAN") and "INDEX" not in line
+      <div style="white-space: pre;{{ " color: red;" if is_scan else "" }}">{{ line }}</div>
+%end # for line
+    </td>
+  </tr>
+%end # for query
+</table>
+%end # if not conf.DbProfiling
@@ -10,17 +10,31 @@ Released under the MIT License.
 
 @author      Erki Suurjaak
 @created     06.04.2015
-@modified    15.04.2024
+@modified    18.10.2026
 ------------------------------------------------------------------------------
 """
+import base64
+import calendar
 import collections
 import datetime
 import io
+import itertools
+import json
 import math
+numpy = None # Imported on first use if available, as slow to load
+import operator
 import os
+import random
 import re
+import select
+import socket
+try: import SocketServer as socketserver  # Py2
+except ImportError: import socketserver  # Py3
+import sqlite3
 import sys
+import threading
 import time
+import wsgiref.simple_server
 try:  # Workaround for Py3 bug in W7: sys.stdout and .stderr are set to None
       # when using pythonw.exe, but bottle expects output streams to exist.
     _stdout, _stderr = sys.stdout, sys.stderr
@@ -29,14 +43,97 @@ try:  # Workaround for Py3 bug in W7: sys.stdout and .stderr are set to None
     import bottle
 finally:
     sys.stdout, sys.stderr = _stdout, _stderr
-from bottle import hook, request, route
+from bottle import hook, request, response, route
 
 from . import conf
 from . import db
-from . util import format_bytes, format_stamp, format_timedelta, stamp_to_date, timedelta_seconds
+from . import jobs
+from . import live
+from . import memory
+from . import metrics
+from . import migrations
+from . import profiles
+from . import sketch
+from . import status
+from . stats import collect_days, get_partials, get_screen_sizes, make_mouse_scaler
+from . util import format_bytes, format_stamp, format_timedelta, pack_varints, stamp_to_date, \
+                   timedelta_seconds
 
 
 app = None   # Bottle application instance
+_client = threading.local() # Client connection of current request thread, as .socket
+
+
+class ThreadingWSGIServer(socketserver.ThreadingMixIn, wsgiref.simple_server.WSGIServer):
+    """
+    WSGI server handling each request in a separate thread, for concurrent progress streams.
+    Can serve on an already listening socket, and shut down once idle,
+    not counting requests released from idle accounting, like event streams.
+    """
+    daemon_threads = True
+    listener     = None # Listening socket to take over instead of binding, from web UI stub
+    idle_timeout = 0    # Seconds without requests or running jobs to shut down after, 0 for never
+
+    ## Seconds to wait for released requests to end on idle shutdown
+    CLOSE_TIMEOUT = 15
+
+    def __init__(self, *args, **kwargs):
+        self.requests = 0           # Requests currently being handled, excluding released
+        self.released = 0           # Released requests currently being handled
+        self.active   = time.time() # Timestamp of last counted request end
+        self.closing  = threading.Event() # Set on idle shutdown, for event streams to end
+        self.lock     = threading.Lock()
+        wsgiref.simple_server.WSGIServer.__init__(self, *args, **kwargs)
+        if self.idle_timeout:
+            thread = threading.Thread(target=self.watch_idle)
+            thread.daemon = True
+            thread.start()
+
+    def server_bind(self):
+        """Binds server socket, or takes over listening socket if given."""
+        if not self.listener: return wsgiref.simple_server.WSGIServer.server_bind(self)
+        self.socket.close()
+        self.socket = self.listener
+        self.server_address = self.socket.getsockname()
+        self.server_name = socket.getfqdn(self.server_address[0])
+        self.server_port = self.server_address[1]
+        self.setup_environ()
+
+    def server_activate(self):
+        """Starts listening on server socket, unless took over listening socket."""
+        if not self.listener: wsgiref.simple_server.WSGIServer.server_activate(self)
+
+    def process_request_thread(self, request, client_address):
+        """Handles request in current thread, retaining client socket for disconnect checks."""
+        _client.socket, _client.server, _client.released = request, self, False
+        with self.lock: self.requests += 1
+        try: socketserver.ThreadingMixIn.process_request_thread(self, request, client_address)
+        finally:
+            with self.lock:
+                if _client.released: self.released -= 1
+                else: self.requests, self.active = self.requests - 1, time.time()
+            _client.socket = _client.server = None
+
+    def release(self):
+        """Excludes request of current thread from idle accounting."""
+        with self.lock:
+            if _client.released: return
+            self.requests, self.released, _client.released = self.requests - 1, self.released + 1, True
+
+    def watch_idle(self):
+        """
+        Shuts down server once idle for longer than idle timeout, with no jobs running,
+        waiting for released requests to end after signalling closing.
+        """
+        while True:
+            time.sleep(min(self.idle_timeout, 10))
+            with self.lock: idle = 0 if self.requests else time.time() - self.active
+            if idle > self.idle_timeout and all(x.finished for x in jobs.get_all()):
+                break # while True
+        self.closing.set()
+        deadline = time.time() + self.CLOSE_TIMEOUT
+        while self.released and time.time() < deadline: time.sleep(0.1)
+        self.shutdown()
 
 
 @hook("before_request")
@@ -98,6 +195,203 @@ def inputsessionindex(session, input):
     return bottle.template("input.tpl", locals(), conf=conf)
 
 
+@route("/replay/<input>/<table>")
+@route("/replay/<input>/<table>/app/<appnames:path>")
+@route("/replay/<input>/<table>/app/id\:<appids>")
+@route("/replay/<input>/<table>/<period>")
+@route("/replay/<input>/<table>/<period>/app/<appnames:path>")
+@route("/replay/<input>/<table>/<period>/app/id\:<appids>")
+@route("/replay/sessions/<session>/<input>/<table>")
+@route("/replay/sessions/<session>/<input>/<table>/app/<appnames:path>")
+@route("/replay/sessions/<session>/<input>/<table>/app/id\:<appids>")
+@route("/replay/sessions/<session>/<input>/<table>/<period>")
+@route("/replay/sessions/<session>/<input>/<table>/<period>/app/<appnames:path>")
+@route("/replay/sessions/<session>/<input>/<table>/<period>/app/id\:<appids>")
+def inputreplay(input, table, period=None, session=None, appids=None, appnames=None):
+    """
+    Handler for loading replay events for mouse/keyboard statistics page, in chunks.
+
+    Returns newline-delimited JSON, with first line as {cursor, count}
+    where cursor is given for next chunk if any, followed by events
+    as {x, y, display, dt} for mouse, or {dt, keys: {key: count}} for keyboard
+    collated by second.
+
+    Packed format has the same first line, followed by columns of varints
+    as produced by pack_replay().
+
+    Query parameters:
+      cursor  position to continue from, as returned in previous chunk
+      sizes   heatmap sizes to scale mouse events to, as JSON {display: [w, h]}
+      format  "packed" for compact binary encoding
+    """
+    if table not in conf.InputEvents.get(input, ()):
+        bottle.abort(404)
+    sess = db.fetchone("sessions", id=session) if session else None
+    if session and not sess:
+        bottle.abort(404)
+
+    where = [("day", (">=", stamp_to_date(sess["start"])))] if sess else []
+    if sess and sess["end"]: where += [("day", ("<=", stamp_to_date(sess["end"])))]
+    days = [x["day"] for x in db.fetch("counts", "day", where=where, order="day", type=table)
+            if not period or x["day"][:len(period)] == period]
+    _, app_ids, _ = make_app_filter(appids, appnames)
+    where = [("fk_program", ("IN", app_ids))] if app_ids is not None else []
+    if sess:
+        where += [("stamp", (">=", sess["start"]))]
+        if sess["end"]: where += [("stamp", ("<", sess["end"]))]
+
+    # Query day by day in order of insertion, as day index is ordered by rowid
+    cols = "id, stamp, x, y, display" if "mouse" == input else "id, stamp, realkey"
+    day0, _, id0 = request.query.cursor.partition(":")
+    rows, cursor, limit = [], None, conf.ReplayChunkSize
+    for day in (x for x in days if x >= day0):
+        where2 = where + [("day", day)] + ([("id", (">", int(id0)))] if day == day0 else [])
+        rows += db.fetch(table, cols, where=where2, order="id", limit=limit - len(rows))
+        if len(rows) >= limit:
+            cursor = "%s:%s" % (day, rows[-1]["id"])
+            break # for day
+
+    events = [] # [{x, y, display, stamp}] or [{stamp, keys: {key: count}}]
+    if "mouse" == input:
+        try: sizes = {int(k): tuple(v) for k, v in json.loads(request.query.sizes).items()}
+        except Exception: sizes = {}
+        scale = make_mouse_scaler(sizes)
+        for row in rows:
+            row["x"], row["y"] = scale(row["display"], row["stamp"], row["x"], row["y"])
+            events.append(row)
+    else: # Collate keyboard events by second
+        for row in rows:
+            if not events or int(events[-1]["stamp"]) != int(row["stamp"]): # Ignore usecs
+                events.append({"keys": collections.defaultdict(int)})
+            events[-1]["stamp"] = row["stamp"]
+            events[-1]["keys"][row["realkey"]] += 1
+
+    header = {"cursor": cursor, "count": len(rows)}
+    if "packed" == request.query.format:
+        bottle.response.content_type = "application/octet-stream"
+        return pack_replay(input, events, header)
+    bottle.response.content_type = "application/x-ndjson"
+    for e in events:
+        e["dt"] = str(datetime.datetime.fromtimestamp(e.pop("stamp")))
+        e.pop("id", None)
+    return "".join(json.dumps(x) + "\n" for x in [header] + events)
+
+
+@route("/jobs/<id>/events")
+def jobevents(id):
+    """Handler for streaming background job progress as Server-Sent Events."""
+    job = jobs.get(id)
+    if not job: bottle.abort(404, "Job not found.")
+    release_idle() # Running job itself keeps web UI from idle shutdown
+    response.content_type = "text/event-stream"
+    response.set_header("Cache-Control", "no-cache")
+    for state in job.events():
+        yield "data: %s\n\n" % json.dumps(state) if state else ":\n\n" # Comment as heartbeat
+
+
+@route("/live/<input>/<table>")
+def liveevents(input, table):
+    """
+    Handler for streaming events inserted by listener as Server-Sent Events,
+    as {count, counts, last, cells: {display: [{x, y, value}]}} for mouse
+    or {count, counts, last, keys: {key: count}} for keyboard.
+
+    Query parameters:
+      since  ID of last event already shown, overridden by Last-Event-ID on reconnect
+      sizes  heatmap sizes to scale mouse events to, as JSON {display: [w, h]}
+    """
+    subscriber = live.subscribe()
+    if table not in conf.InputEvents.get(input, ()) or not subscriber:
+        bottle.abort(404)
+    try: since = int(request.headers.get("Last-Event-ID") or request.query.since)
+    except Exception: since = None
+    try: sizes = {int(k): tuple(v) for k, v in json.loads(request.query.sizes).items()}
+    except Exception: sizes = {}
+    scale = make_mouse_scaler(sizes) if "mouse" == input else None
+
+    release_idle() # Open statistics pages do not keep web UI from idle shutdown
+    response.content_type = "text/event-stream"
+    response.set_header("Cache-Control", "no-cache")
+    for item in subscriber.follow(table, since):
+        if is_closing():
+            yield "event: close\ndata: {}\n\n" # Client stops reconnecting
+            break # for item
+        if not item:
+            yield ":\n\n" # Comment as heartbeat
+            continue # for item
+        counts, events = item
+        data = {"count": len(events), "counts": counts,
+                "last": format_stamp(events[-1]["stamp"], "%H:%M:%S")}
+        if "mouse" == input:
+            cells = collections.defaultdict(collections.Counter) # {display: {(x, y): count}}
+            for e in events: cells[e["display"]][scale(e["display"], e["stamp"], e["x"], e["y"])] += 1
+            data["cells"] = {d: [{"x": x, "y": y, "value": v} for (x, y), v in cc.items()]
+                             for d, cc in cells.items()}
+        else: data["keys"] = collections.Counter(e["realkey"] for e in events)
+        yield "id: %s\ndata: %s\n\n" % (events[-1]["id"], json.dumps(data))
+
+
+@route("/metrics")
+def metricstext():
+    """Returns service metrics in Prometheus text format, to local clients only."""
+    release_idle() # Scrapers do not keep web UI from idle shutdown
+    if not is_local_client():
+        raise bottle.HTTPError(403, "Metrics are available to local clients only.")
+    response.content_type = "text/plain; version=0.0.4; charset=utf-8"
+    return metrics.render()
+
+
+@route("/debug/queries")
+def debugqueries():
+    """Handler for showing database query profile, to local clients only."""
+    if not is_local_client():
+        raise bottle.HTTPError(403, "Query profile is available to local clients only.")
+    sort = request.query.sort if request.query.sort in ("count", "max", "rows") else "time"
+    queries = sorted(db.get_profile(), key=lambda x: -x[sort])
+    dbinfo = stats_db(conf.DbPath)
+    return bottle.template("queries.tpl", locals(), conf=conf)
+
+
+@route("/debug/memory")
+def debugmemory():
+    """
+    Returns memory report as text, to local clients only,
+    with growth of allocations since previous report.
+    """
+    if not is_local_client():
+        raise bottle.HTTPError(403, "Memory report is available to local clients only.")
+    response.content_type = "text/plain; charset=utf-8"
+    return memory.report("Web UI process", [
+        ("db connections", db.get_connections()), ("partials", get_partials()),
+        ("sketches", sketch.get_cache()), ("jobs", jobs.get_all()),
+    ])
+
+
+@route("/debug/profiles")
+def debugprofiles():
+    """Handler for listing recorded request profiles, to local clients only."""
+    if not is_local_client():
+        raise bottle.HTTPError(403, "Profiles are available to local clients only.")
+    items, dbinfo = profiles.get_all(), stats_db(conf.DbPath)
+    return bottle.template("profiles.tpl", locals(), conf=conf)
+
+
+@route("/debug/profiles/<id:int>.<format:re:prof|txt>")
+def debugprofile(id, format):
+    """Returns request profile as pstats data or collapsed stacks, to local clients only."""
+    if not is_local_client():
+        raise bottle.HTTPError(403, "Profiles are available to local clients only.")
+    profile = profiles.get(id)
+    if not profile: raise bottle.HTTPError(404, "Profile not found.")
+    filename = "%s-profile-%s.%s" % (conf.Title.lower(), id, format)
+    response.headers["Content-Disposition"] = 'attachment; filename="%s"' % filename
+    if "txt" == format:
+        response.content_type = "text/plain; charset=utf-8"
+        return profile.collapse()
+    response.content_type = "application/octet-stream"
+    return profile.dump()
+
+
 @route("/<input>/<table>")
 @route("/<input>/<table>/app/<appnames:path>")
 @route("/<input>/<table>/app/id\:<appids>") # Colon in URL needs escaping for Bottle
@@ -126,17 +420,8 @@ def inputdetail(input, table, period=None, session=None, appids=None, appnames=N
         if session: url, kws = ("/sessions/<session>" + url, dict(kws, session=session))
         return bottle.redirect(request.app.get_url(url, **kws))
 
-    apps = db.fetch("programs", order="LOWER(path)") if conf.ProgramsEnabled else []
-    app_ids, app_search = None, appnames
-    if conf.ProgramsEnabled and appids:
-        appids = [int(x) for x in (x.strip() for x in appids.split(",")) if x.isdigit()]
-        app_ids = [x["id"] for x in apps if x["id"] in appids]
-        appnames = app_search = ""
-    elif conf.ProgramsEnabled and appnames:
-        appnames = [a or b for a, b in re.findall(r'"([^"]+)"|(\S+)', appnames.lower())]
-        app_ids = [x["id"] for x in apps if any(y in x["path"].lower() for y in appnames)]
+    apps, app_ids, app_search = make_app_filter(appids, appnames)
     if app_ids is not None:
-        app_ids.sort()
         where += [("fk_program", ("IN", app_ids))]
 
     if sess:
@@ -151,40 +436,118 @@ def inputdetail(input, table, period=None, session=None, appids=None, appnames=N
         count = sum(v["count"] for v in days if not period or v["day"][:len(period)] == period)
         tabledays = set(x["type"] for x in db.fetch("counts", day=("LIKE", period + "%"))) if period else {}
 
-    if not period and "mouse" == input: # Mouse tables can have 100M+ rows, total order takes too long
+    if period and len(period) < 8: # Month/year period, query by known period days
+        mydays = [v["day"] for v in days if v["day"][:len(period)] == period]
+        where += [("day", ("IN", mydays))]
+    elif period:
+        where += [("day", period)]
+    stats_in_db = conf.StatsInDatabase and sqlite3.sqlite_version_info >= (3, 25) # Window functions
+    where_all = list(where) # Statistics in database are computed over all events in range
+    # Mouse ranges over limit can be estimated from a sample spread over all days in range
+    stats_sample = conf.StatsSampling and "mouse" == input and count > conf.MaxEventsForStats
+    if not period and "mouse" == input and not stats_sample: # Mouse tables can have 100M+ rows,
+                                                             # total order takes too long
         mydays, mycount = [], 0
         for myday in days:
             mydays, mycount = mydays + [myday["day"]], mycount + myday["count"]
             if mycount >= conf.MaxEventsForStats: break # for myday
         if len(mydays) != len(days):
             where += [("day", ("IN", mydays))]
-    elif period and len(period) < 8: # Month/year period, query by known period days
-        mydays = [v["day"] for v in days if v["day"][:len(period)] == period]
-        where += [("day", ("IN", mydays))]
-    elif period:
-        where += [("day", period)]
+
+    # Statistics over several days are merged from per-day partials, computed in parallel,
+    # past days of all applications are available from stored summaries
+    rangedays = [v for v in days if not period or v["day"][:len(period)] == period]
+    summarized = conf.StatsSummaries and app_ids is None and not sess and \
+                 all(str(v["day"]) < datetime.date.today().isoformat() for v in rangedays)
+    stats_days = rangedays if rangedays and not stats_sample and \
+                 (conf.StatsParallel and len(rangedays) > 1 or summarized) else None
+    stats_limited = "" if stats_days or stats_sample else \
+                    "Heatmap" if stats_in_db else "Statistics and heatmap"
+    stats_all = stats_in_db or stats_sample or bool(stats_days)
 
     if app_ids is not None:
-        count = db.fetchone(table, "COUNT(*) AS count", where=where)["count"]
-    events = db.select(table, where=where, order="stamp", limit=conf.MaxEventsForStats)
-    if "mouse" == input:
-        stats_texts, app_stats, heatmap_sizes, heatmap_stats, events = stats_mouse(events, table, count)
-    else:
-        stats_texts, app_stats, events = stats_keyboard(events, table, count)
-        heatmap_stats = db.fetch(table, "realkey AS key, COUNT(*) AS count", where, "realkey", "count DESC")
-        key_stats = heatmap_stats if "keys" == table else \
-                    db.fetch(table, "key, COUNT(*) AS count", where, "key", "count DESC")
-
-    if app_ids is not None and len(apps) - len(app_stats): # Populate totals for apps outside filter
-        appmap = {x["id"]: x for x in apps}
-        where2 = [(k, v) for k, v in where if k != "fk_program"]
-        where2 += [("fk_program", ("NOT IN", app_stats))]
-        for row in db.fetch(table, "fk_program, COUNT(*) AS count", where=where2, group="fk_program"):
-            app_stats[row["fk_program"]] = {"path": appmap.get(row["fk_program"], {}).get("path"),
-                                            "total": row["count"]}
+        count = db.fetchone(table, "COUNT(*) AS count", where=where_all if stats_all else where)["count"]
+    # Sampled rows are taken with their successors, for intervals between consecutive events
+    stats_stride = int(math.ceil(2. * count / conf.MaxEventsForStats)) \
+                   if stats_sample and count > conf.MaxEventsForStats else 0
+
+    # Statistics page of today can be updated live with new events from listener
+    live_feed = conf.LiveFeedEnabled and period == datetime.date.today().isoformat() \
+                and not sess and app_ids is None and bool(live.subscribe())
+
+    def compute(where, stats_in_db, stats_days, stats_stride):
+        """Returns statistics and heatmaps, as {template variable: value}."""
+        result = {}
+        if live_feed: result["live_since"] = db.fetchone(table, "MAX(id) AS id")["id"] or 0
+        # Per-day sketches cover whole days of all applications
+        sketches = sketch.collect(table, rangedays) if app_ids is None and not sess else None
+        if "mouse" == input:
+            stats_texts, app_stats, heatmap_sizes, heatmap_stats = \
+                stats_mouse(table, where, count, where_all if stats_in_db else None,
+                            rangedays if stats_stride else stats_days, stats_stride, sketches)
+            result.update(heatmap_sizes=heatmap_sizes)
+        else:
+            stats_texts, app_stats = stats_keyboard(table, where, count,
+                                                    where_all if stats_in_db else None, stats_days, sketches)
+            jobs.report(1, "Counting keys")
+            heatmap_stats = db.fetch(table, "realkey AS key, COUNT(*) AS count", where, "realkey", "count DESC")
+            result.update(key_stats=heatmap_stats if "keys" == table else
+                          db.fetch(table, "key, COUNT(*) AS count", where, "key", "count DESC"))
 
+        if app_ids is not None and len(apps) - len(app_stats): # Populate totals for apps outside filter
+            appmap = {x["id"]: x for x in apps}
+            stats_all = stats_in_db or stats_stride or stats_days
+            where2 = [(k, v) for k, v in (where_all if stats_all else where) if k != "fk_program"]
+            where2 += [("fk_program", ("NOT IN", app_stats))]
+            for row in db.fetch(table, "fk_program, COUNT(*) AS count", where=where2, group="fk_program"):
+                app_stats[row["fk_program"]] = {"path": appmap.get(row["fk_program"], {}).get("path"),
+                                                "total": row["count"]}
+
+        if "mouse" == input and conf.WebPackedData:
+            result.update(heatmap_packed={k: pack_positions(v) for k, v in heatmap_stats.items()})
+        return dict(result, stats_texts=stats_texts, app_stats=app_stats, heatmap_stats=heatmap_stats)
+
+    def compute_limited():
+        """Returns compute() results within time budget, estimated from sample or fewer days if over."""
+        budget = conf.WebQueryBudgets.get("stats")
+        try:
+            with db.limit(budget): return compute(where, stats_in_db, stats_days, stats_stride)
+        except db.Interrupted:
+            jobs.report(0, "Time budget exceeded, estimating statistics") # Raises if abandoned
+            if "mouse" == input and count > conf.MaxEventsForStats and not stats_stride:
+                stride = int(math.ceil(2. * count / conf.MaxEventsForStats))
+                args, extra = (where_all, False, None, stride), dict(stats_limited="", stats_stride=stride)
+            else: # Limit to leading days in range, as when not computing over all events
+                mydays, mycount = [], 0
+                for myday in rangedays:
+                    mydays, mycount = mydays + [myday["day"]], mycount + myday["count"]
+                    if mycount >= conf.MaxEventsForStats: break # for myday
+                if len(mydays) == len(rangedays): raise
+                where2 = [(k, v) for k, v in where_all if k != "day"] + [("day", ("IN", mydays))]
+                args, extra = (where2, False, None, 0), dict(stats_limited="Statistics and heatmap")
+            with db.limit(budget): return dict(compute(*args), **extra)
+
+    # Long computations run as background jobs shared by identical requests,
+    # showing progress page if not finished within WebJobWait
     dbinfo, session = stats_db(conf.DbPath), sess
-    return bottle.template("heatmap.tpl", locals(), conf=conf)
+    if conf.WebJobWait:
+        job = jobs.start((request.fullpath, request.query_string), count, compute_limited)
+        if not job.wait(conf.WebJobWait):
+            return bottle.template("job.tpl", locals(), conf=conf)
+        if job.error is not None: raise job.error
+        result = job.result
+    else: result = compute_limited()
+    heatmap_sizes = result.get("heatmap_sizes")
+
+    replay_args = dict(request.url_args)
+    if "mouse" == input: replay_args["sizes"] = json.dumps(heatmap_sizes)
+    if conf.WebPackedData: replay_args["format"] = "packed"
+    replay_url = request.app.get_url("/replay" + request.route.rule, **replay_args)
+    if live_feed:
+        live_args = dict(input=input, table=table, since=result["live_since"])
+        if "mouse" == input: live_args["sizes"] = replay_args["sizes"]
+        live_url = request.app.get_url("/live/<input>/<table>", **live_args)
+    return bottle.template("heatmap.tpl", dict(locals(), **result), conf=conf)
 
 
 @route("/<input>")
@@ -230,17 +593,78 @@ def index():
     return bottle.template("index.tpl", locals(), conf=conf)
 
 
-def stats_keyboard(events, table, count):
-    """Return (statistics, app statistics, collated and max-limited events) for keyboard events."""
-    KEYNAME = "realkey" if "keys" == table else "key"
+def stats_keyboard(table, where, count, where_all=None, days=None, sketches=None):
+    """
+    Return (statistics, app statistics) for keyboard events.
+
+    @param   where_all  filter for all events in range if statistics are to be computed
+                        in database instead of over events limited by MaxEventsForStats
+    @param   days       [{day, count}] in range if statistics are to be merged
+                        from per-day partials over all events in given days
+    @param   sketches   sketches merged over range, as {name: sketch}, for distinct counts
+                        and interval percentiles over all events in range
+    """
+    UNBROKEN_DELTA = datetime.timedelta(seconds=conf.KeyboardSessionMaxDelta)
     appmap = {x["id"]: x["path"] for x in db.select("programs")} if conf.ProgramsEnabled else {}
+    collect = collect_keyboard_numpy if conf.StatsNumpyEnabled and import_numpy() \
+              else collect_keyboard
+    if where_all is not None: collect, where = collect_keyboard_sql, where_all
+    data = collect_days(table, where, days, appmap) if days else collect(table, where, appmap)
+    deltas, sessions, app_stats = data["deltas"], data["sessions"], data["app_stats"]
+
+    stats = [
+        ("Average combo interval",
+         format_timedelta(data["deltatotal"] / deltas)),
+    ] + ([
+        ("Combo interval percentiles",
+         format_quantiles(sketches["intervals"])),
+    ] if sketches else []) if deltas and "combos" == table else [
+        ("Keys per hour",
+         int(3600 * count / timedelta_seconds(data["interval"])) if data["interval"] else count),
+        ("Average key interval",
+         format_timedelta(data["deltatotal"] / deltas)),
+    ] + ([
+        ("Key interval percentiles",
+         format_quantiles(sketches["intervals"])),
+    ] if sketches else []) + [
+        ("Typing sessions (key interval < %ss)" % UNBROKEN_DELTA.seconds,
+         sessions),
+        ("Average keys in session",
+         int(round(data["session_keys"] / sessions)) if sessions else 0),
+        ("Average session duration",
+         format_timedelta(data["session_duration"] / (sessions or 1))),
+        ("Longest session duration",
+         format_timedelta(data["longest_duration"])),
+        ("Keys in longest session",
+         data["longest_keys"]),
+        ("Most keys in session",
+         data["most_keys"]),
+    ] if deltas and "keys" == table else []
+    stats += [("Total unique %s" % table, format_distinct(sketches["keys"]) if sketches else data["uniques"])]
+    if sketches and conf.ProgramsEnabled:
+        stats += [("Total applications", format_distinct(sketches["programs"]))]
+    if deltas:
+        stats += [("Total time interval", format_timedelta(data["interval"]))]
+    app_items = [{"id": k, "cols": {"top": [a for a, _ in v.most_common(conf.KeyboardTopForPrograms)]},
+                  "path": appmap.get(k), "total": sum(v.values())} for k, v in app_stats.items()]
+    app_results = collections.OrderedDict(
+        (x["id"], x) for x in sorted(app_items, key=lambda x: x["total"], reverse=True)
+    )
+    return stats, app_results
+
+
+def collect_keyboard(table, where, appmap):
+    """
+    Returns aggregates of keyboard events, as {interval, deltas, deltatotal, sessions,
+    session_keys, session_duration, longest_duration, longest_keys, most_keys, uniques, app_stats}.
+    """
+    KEYNAME = "realkey" if "keys" == table else "key"
     app_stats = {}  # {id: Counter(key: count)}
     deltas, first, last = [], None, None
     tsessions, tsession = [], None
     UNBROKEN_DELTA = datetime.timedelta(seconds=conf.KeyboardSessionMaxDelta)
-    blank = collections.defaultdict(lambda: collections.defaultdict(int))
-    collated = [blank.copy()] # [{dt, keys: {key: count}}]
     uniques = set()
+    events = db.select(table, where=where, order="stamp", limit=conf.MaxEventsForStats)
     for e in events:
         e.pop("id") # Decrease memory overhead
         e["dt"] = datetime.datetime.fromtimestamp(e.pop("stamp"))
@@ -249,8 +673,6 @@ def stats_keyboard(events, table, count):
         if not app_id or app_id in appmap:
             app_stats.setdefault(app_id, collections.Counter()).update([e[KEYNAME]])
         if last:
-            if last["dt"].timetuple()[:6] != e["dt"].timetuple()[:6]: # Ignore usecs
-                collated.append(blank.copy())
             delta = e["dt"] - last["dt"]
             deltas.append(delta)
             if delta > UNBROKEN_DELTA:
@@ -260,71 +682,178 @@ def stats_keyboard(events, table, count):
                     tsession = []
                     tsessions.append(tsession)
                 tsession.append(delta)
-        collated[-1]["dt"] = e["dt"]
-        collated[-1]["keys"][e["realkey"]] += 1
         uniques.add(e["key"])
         last = e
 
     longest_session = max(tsessions + [[datetime.timedelta()]], key=lambda x: sum(x, datetime.timedelta()))
-    stats = [
-        ("Average combo interval",
-         format_timedelta(sum(deltas, datetime.timedelta()) / len(deltas))),
-    ] if deltas and "combos" == table else [
-        ("Keys per hour",
-         int(3600 * count / timedelta_seconds(last["dt"] - first["dt"]))
-         if last["dt"] != first["dt"] else count),
-        ("Average key interval",
-         format_timedelta(sum(deltas, datetime.timedelta()) / len(deltas))),
-        ("Typing sessions (key interval < %ss)" % UNBROKEN_DELTA.seconds,
-         len(tsessions)),
-        ("Average keys in session",
-         int(round(sum(len(x) + 1 for x in tsessions) / len(tsessions))) if tsessions else 0),
-        ("Average session duration", format_timedelta(sum((sum(x, datetime.timedelta())
-         for x in tsessions), datetime.timedelta()) / (len(tsessions) or 1))),
-        ("Longest session duration",
-         format_timedelta(sum(longest_session, datetime.timedelta()))),
-        ("Keys in longest session",
-         len(longest_session) + 1),
-        ("Most keys in session",
-         max(len(x) + 1 for x in tsessions) if tsessions else 0),
-    ] if deltas and "keys" == table else []
-    stats += [("Total unique %s" % table, len(uniques))]
-    if deltas:
-        stats += [("Total time interval", format_timedelta(last["dt"] - first["dt"]))]
-    app_items = [{"id": k, "cols": {"top": [a for a, _ in v.most_common(conf.KeyboardTopForPrograms)]},
-                  "path": appmap.get(k), "total": sum(v.values())} for k, v in app_stats.items()]
-    app_results = collections.OrderedDict(
-        (x["id"], x) for x in sorted(app_items, key=lambda x: x["total"], reverse=True)
-    )
-    return stats, app_results, collated[:conf.MaxEventsForReplay]
+    return dict(interval=(last["dt"] - first["dt"]) if first else None, deltas=len(deltas),
+                deltatotal=sum(deltas, datetime.timedelta()), sessions=len(tsessions),
+                session_keys=sum(len(x) + 1 for x in tsessions),
+                session_duration=sum((sum(x, datetime.timedelta()) for x in tsessions),
+                                     datetime.timedelta()),
+                longest_duration=sum(longest_session, datetime.timedelta()),
+                longest_keys=len(longest_session) + 1,
+                most_keys=max(len(x) + 1 for x in tsessions) if tsessions else 0,
+                uniques=len(uniques), app_stats=app_stats)
+
+
+def collect_keyboard_numpy(table, where, appmap):
+    """
+    Returns aggregates of keyboard events like collect_keyboard(), computed on NumPy arrays.
+    """
+    UNBROKEN_DELTA = datetime.timedelta(seconds=conf.KeyboardSessionMaxDelta)
+    COLS = ["stamp", "COALESCE(fk_program, -1)", "key"] + (["realkey"] if "keys" == table else [])
+    rows = db.fetchrows(table, COLS, where=where, order="stamp", limit=conf.MaxEventsForStats)
+    column = lambda i: map(operator.itemgetter(i), rows)
+    stamps = numpy.fromiter(column(0), numpy.float64, len(rows))
+    apps = numpy.fromiter(column(1), numpy.int64, len(rows))
+    # Key indexes in order of first occurrence, like Counter insertion order in Python
+    keymap = {k: i for i, k in enumerate(collections.OrderedDict.fromkeys(column(len(COLS) - 1)))}
+    keys = numpy.fromiter(map(keymap.__getitem__, column(len(COLS) - 1)), numpy.int64, len(rows))
+    uniques = len(set(column(2)))
+    del rows # Decrease memory overhead
+
+    micros = local_micros(stamps)
+    deltas = micros[1:] - micros[:-1]
+    # Typing sessions are unbroken runs of intervals under maximum delta
+    unbroken = deltas <= (UNBROKEN_DELTA.days * 86400 + UNBROKEN_DELTA.seconds) * 10**6 + \
+                         UNBROKEN_DELTA.microseconds
+    starts = numpy.flatnonzero(unbroken & ~numpy.r_[False, unbroken[:-1]])
+    ends = numpy.flatnonzero(unbroken & ~numpy.r_[unbroken[1:], False]) + 1
+    durations = numpy.add.reduceat(numpy.where(unbroken, deltas, 0), starts) if len(starts) \
+                else numpy.zeros(0, numpy.int64)
+    lengths = ends - starts
+    # First longest if several equal, none if all negative like from daylight saving shifts
+    longest = numpy.argmax(durations) if len(starts) and durations.max() >= 0 else None
+
+    app_stats = collections.OrderedDict() # {id: Counter(key: count)}
+    appids = [x for x in first_uniques(apps) if x <= 0 or x in appmap]
+    if appids:
+        # Count keys per app, in order of first occurrence within app like in Python
+        mask = numpy.isin(apps, appids)
+        appindex = numpy.searchsorted(numpy.sort(appids), apps[mask])
+        codes, firsts, counts = numpy.unique(appindex * len(keymap) + keys[mask],
+                                             return_index=True, return_counts=True)
+        keynames = sorted(keymap, key=keymap.get)
+        for app_id, i in zip(appids, numpy.argsort(numpy.argsort(appids)).tolist()):
+            lo, hi = numpy.searchsorted(codes, [i * len(keymap), (i + 1) * len(keymap)])
+            order = numpy.argsort(firsts[lo:hi], kind="stable")
+            app_stats[None if app_id < 0 else app_id] = collections.Counter(collections.OrderedDict(
+                (keynames[c % len(keymap)], n)
+                for c, n in zip(codes[lo:hi][order].tolist(), counts[lo:hi][order].tolist())
+            ))
+
+    delta = lambda x: datetime.timedelta(microseconds=int(x))
+    return dict(interval=delta(micros[-1] - micros[0]) if len(micros) else None,
+                deltas=len(deltas), deltatotal=delta(deltas.sum()), sessions=len(starts),
+                session_keys=int(lengths.sum() + len(starts)), session_duration=delta(durations.sum()),
+                longest_duration=delta(durations[longest] if longest is not None else 0),
+                longest_keys=int(lengths[longest] + 1) if longest is not None else 2,
+                most_keys=int(lengths.max() + 1) if len(starts) else 0,
+                uniques=uniques, app_stats=app_stats)
 
 
-def stats_mouse(events, table, count):
-    """Returns (statistics, app statistics, positions, max-limited events)."""
+def stats_mouse(table, where, count, where_all=None, days=None, stride=0, sketches=None):
+    """
+    Returns (statistics, app statistics, heatmap sizes, positions).
+
+    @param   where_all  filter for all events in range if statistics are to be computed
+                        in database instead of over events limited by MaxEventsForStats
+    @param   days       [{day, count}] in range if statistics and heatmap are to be merged
+                        from per-day partials over all events in given days,
+                        or to be sampled from if stride given
+    @param   stride     row ID stride if statistics and heatmap are to be estimated
+                        from a sample of all events in given days, overrides other options
+    @param   sketches   sketches merged over range, as {name: sketch}, for distinct counts
+                        and interval percentiles over all events in range
+    """
     BUTTON_NAMES = collections.OrderedDict([("1", "Left"), ("2", "Right"), ("3", "Middle")])
     SCROLL_NAMES = collections.OrderedDict([("dy", "down"), ("-dy", "up"),
                                             ("-dx", "left"), ("dx", "right")])
     appmap = {x["id"]: x["path"] for x in db.select("programs")} if conf.ProgramsEnabled else {}
+    collect = collect_mouse_numpy if conf.StatsNumpyEnabled and import_numpy() else collect_mouse
+    if stride: data = collect_mouse_sample(table, where, count, appmap, stride, days)
+    elif days: data = collect_days(table, where, days, appmap)
+    else: data = collect(table, where, appmap)
+    if where_all is not None and not days and not stride:
+        data.update(collect_mouse_sql(table, where_all, appmap))
+    interval, totaldelta, distance, counts = (data[k] for k in ("interval", "totaldelta", "distance", "counts"))
+    app_stats, app_deltas, app_distances = (data[k] for k in ("app_stats", "app_deltas", "app_distances"))
+    errors = data.get("errors", {}) # {key: relative margin of error} if estimated from sample
+    approx = lambda key, text: u"%s (±%.1f%%)" % (text.rstrip(), 100 * errors[key]) \
+                               if key in errors else text
+
+    stats, app_items = [], []
+    if "moves" == table and count:
+        px = re.sub(r"(\d)(?=(\d{3})+(?!\d))", r"\1,", "%d" % math.ceil(distance))
+        seconds = timedelta_seconds(interval)
+        stats = [("Total distance", approx("distance", "%s pixels " % px)),
+                 ("", approx("distance", "%.1f meters (if pixel is %smm)" %
+                  (distance * conf.PixelLength, conf.PixelLength * 1000))),
+                 ("Average speed", approx("distance", "%.1f pixels per second" % (distance / (seconds or 1)))),
+                 ("", approx("distance", "%.4f meters per second" %
+                  (distance * conf.PixelLength / (seconds or 1)))), ]
+        app_items = [{"id": k, "path": appmap.get(k), "total": sum(v.values()),
+                      "cols": collections.OrderedDict([
+                          ("pixels", re.sub(r"(\d)(?=(\d{3})+(?!\d))", r"\1,", "%d px" % d)),
+                          ("meters", re.sub(r"(\d)(?=(\d{3})+(?!\d))", r"\1,", "%.1f m" %
+                                     (d * conf.PixelLength))),
+                          ("time", format_timedelta(app_deltas[k])),
+                     ]) if not stride else {}} # Not estimated from sample
+                     for k, v in app_stats.items() for d in [math.ceil(app_distances[k])]]
+    elif "scrolls" == table and count:
+        stats = list(filter(bool, [("Scrolls per hour", 
+                  int(count / (timedelta_seconds(interval) / 3600 or 1))),
+                 ("Average interval", approx("totaldelta", format_timedelta(totaldelta / (count or 1)))),
+                 ] + ([("Scroll interval percentiles", format_quantiles(sketches["intervals"]))]
+                      if sketches else []) +
+                 [("Scrolls %s" % SCROLL_NAMES[k], approx(k, "%s" % counts[k]))
+                  for k in SCROLL_NAMES if "dy" in k or counts[k]]))
+        app_items = [{"id": k, "path": appmap.get(k), "total": sum(v.values()),
+                      "cols": collections.OrderedDict((b, v[a]) for a, b in SCROLL_NAMES.items()
+                                                      if v.get(a))}
+                       for k, v in app_stats.items()]
+    elif "clicks" == table and count:
+        stats = [("Clicks per hour", 
+                  int(count / (timedelta_seconds(interval) / 3600 or 1))),
+                 ("Average interval between clicks",
+                  approx("totaldelta", format_timedelta(totaldelta / (count or 1)))),
+                 ] + ([("Click interval percentiles", format_quantiles(sketches["intervals"]))]
+                      if sketches else []) + [
+                 ("Average distance between clicks",
+                  approx("distance", "%.1f pixels" % (distance / (count or 1)))), ]
+        for k, v in sorted(counts.items()):
+            stats += [("%s button clicks" % BUTTON_NAMES.get(k, "%s." % k), approx(k, "%s" % v))]
+        app_items = [{"id": k, "path": appmap.get(k), "total": sum(v.values()),
+                      "cols": collections.OrderedDict((b, v[a]) for a, b in BUTTON_NAMES.items()
+                                                      if v.get(a))}
+                       for k, v in app_stats.items()]
+    if count and sketches and conf.ProgramsEnabled:
+        stats += [("Total applications", format_distinct(sketches["programs"]))]
+    if count:
+        stats += [("Total time interval", format_timedelta(interval))]
+    app_results = collections.OrderedDict(
+        (x["id"], x) for x in sorted(app_items, key=lambda x: x["total"], reverse=True)
+    )
+    return stats, app_results, data["heatmap_sizes"], data["positions"]
+
+
+def collect_mouse(table, where, appmap):
+    """
+    Returns aggregates of mouse events, as {interval, totaldelta, distance, counts,
+    app_stats, app_deltas, app_distances, heatmap_sizes, positions}.
+    """
     app_stats = {}  # {id: Counter(button: count)}
     first, last, totaldelta = None, None, datetime.timedelta()
-    all_events = []
-    HS = conf.MouseHeatmapSize
-    SZ = {0: 0, 1: 0, "dt": datetime.datetime.min} # {0,1,2,3,dt: xmin,ymin,w,h,startdt}
-    SZ.update((k + 2, conf.DefaultScreenSize[k]) for k in [0, 1])
     displayxymap  = collections.defaultdict(lambda: collections.defaultdict(int))
     counts, distances = collections.Counter(), collections.defaultdict(float)
     app_deltas = collections.defaultdict(datetime.timedelta) # {id: time in app}
     app_distances = collections.defaultdict(float) # {id: pixels}
-    SIZES = {} # Desktop sizes for event times, as {display: [{0,1,2,3,dt}, ]}
-    vals = lambda d, kk="xywh": [d[k] for k in kk]
-    for row in db.fetch("screen_sizes", order="dt"):
-        row.update({0: row["x"], 1: row["y"], 2: row["w"], 3: row["h"]})
-        if row["display"] not in SIZES or vals(SIZES[row["display"]][-1]) != vals(row):
-            SIZES.setdefault(row["display"], []).append(row)
-    cursizes = {k: None for k in SIZES} # {display: {0,1,2,3,dt}}
     heatmap_sizes = {} # {display: (w, h)} scaled to screen size of first event
+    scale = make_mouse_scaler(heatmap_sizes)
+    events = db.select(table, where=where, order="stamp", limit=conf.MaxEventsForStats)
     for e in events:
-        e["dt"] = datetime.datetime.fromtimestamp(e.pop("stamp"))
+        e["dt"] = datetime.datetime.fromtimestamp(e["stamp"])
         if not first: first = e
         app_id = e["fk_program"]
         if not app_id or app_id in appmap: app_stats.setdefault(app_id, collections.Counter())
@@ -334,22 +863,9 @@ def stats_mouse(events, table, count):
             if appmap and last["fk_program"] == e["fk_program"]:
                 app_deltas[app_id] += e["dt"] - last["dt"]
                 app_distances[app_id] += math.sqrt(sum(abs(e[k] - last[k])**2 for k in "xy"))
-        last = dict(e) # Copy, as we modify coordinates for heatmap
-
-        sz, sizes = cursizes.get(e["display"]), SIZES.get(e["display"], [SZ])
-        if not sz or sz["dt"] > e["dt"]:
-            # Find latest size from before event, fallback to first size recorded
-            sz = next((s for s in sizes[::-1] if e["dt"] >= s["dt"]), sizes[0])
-            cursizes[e["display"]] = sz
-        if e["display"] not in heatmap_sizes: # Make heatmap scaled to screen height
-            heatmap_sizes[e["display"]] = (HS[0], HS[0] * sz["h"] / sz["w"])
-        hs = heatmap_sizes[e["display"]]
-
-        # Make heatmap coordinates, scaling event to screen size at event time
-        e["x"], e["y"] = [int(float(e["xy"[k]] - sz[k]) * hs[k] / sz[k + 2]) for k in [0, 1]]
-        # Constrain within heatmap, events at edges can have off-screen coordinates
-        e["x"], e["y"] = [max(0, min(e["xy"[k]], hs[k])) for k in [0, 1]]
-        displayxymap[e["display"]][(e["x"], e["y"])] += 1
+        last = e
+
+        displayxymap[e["display"]][scale(e["display"], e["stamp"], e["x"], e["y"])] += 1
         if "moves" == table:
             if appmap: app_stats[app_id].update([table])
         elif "clicks" == table:
@@ -360,58 +876,268 @@ def stats_mouse(events, table, count):
                 key, value = "%s%s" % ("-" if e[k] < 0 else "", k), abs(e[k])
                 counts[key] += value
                 if appmap: app_stats[app_id][key] += value
-        if len(all_events) < conf.MaxEventsForReplay:
-            for k in ("id", "day", "button", "dx", "dy", "fk_program"): e.pop(k, None)
-            all_events.append(e)
 
     positions = {i: [dict(x=x, y=y, count=v) for (x, y), v in displayxymap[i].items()]
                  for i in sorted(displayxymap)}
-    stats, distance = [], sum(distances.values())
-    app_items = []
-    if "moves" == table and count:
-        px = re.sub(r"(\d)(?=(\d{3})+(?!\d))", r"\1,", "%d" % math.ceil(distance))
-        seconds = timedelta_seconds(last["dt"] - first["dt"])
-        stats = [("Total distance", "%s pixels " % px),
-                 ("", "%.1f meters (if pixel is %smm)" %
-                  (distance * conf.PixelLength, conf.PixelLength * 1000)),
-                 ("Average speed", "%.1f pixels per second" % (distance / (seconds or 1))),
-                 ("", "%.4f meters per second" %
-                  (distance * conf.PixelLength / (seconds or 1))), ]
-        app_items = [{"id": k, "path": appmap.get(k), "total": sum(v.values()),
-                      "cols": collections.OrderedDict([
-                          ("pixels", re.sub(r"(\d)(?=(\d{3})+(?!\d))", r"\1,", "%d px" % d)),
-                          ("meters", re.sub(r"(\d)(?=(\d{3})+(?!\d))", r"\1,", "%.1f m" %
-                                     (d * conf.PixelLength))),
-                          ("time", format_timedelta(app_deltas[k])),
-                     ])} for k, v in app_stats.items() for d in [math.ceil(app_distances[k])]]
-    elif "scrolls" == table and count:
-        stats = list(filter(bool, [("Scrolls per hour", 
-                  int(count / (timedelta_seconds(last["dt"] - first["dt"]) / 3600 or 1))),
-                 ("Average interval", format_timedelta(totaldelta / (count or 1))),
-                 ] + [("Scrolls %s" % SCROLL_NAMES[k], counts[k])
-                      for k in SCROLL_NAMES if "dy" in k or counts[k]]))
-        app_items = [{"id": k, "path": appmap.get(k), "total": sum(v.values()),
-                      "cols": collections.OrderedDict((b, v[a]) for a, b in SCROLL_NAMES.items()
-                                                      if v.get(a))}
-                       for k, v in app_stats.items()]
-    elif "clicks" == table and count:
-        stats = [("Clicks per hour", 
-                  int(count / (timedelta_seconds(last["dt"] - first["dt"]) / 3600 or 1))),
-                 ("Average interval between clicks", format_timedelta(totaldelta / (count or 1))),
-                 ("Average distance between clicks",
-                  "%.1f pixels" % (distance / (count or 1))), ]
-        for k, v in sorted(counts.items()):
-            stats += [("%s button clicks" % BUTTON_NAMES.get(k, "%s." % k), v)]
-        app_items = [{"id": k, "path": appmap.get(k), "total": sum(v.values()),
-                      "cols": collections.OrderedDict((b, v[a]) for a, b in BUTTON_NAMES.items()
-                                                      if v.get(a))}
-                       for k, v in app_stats.items()]
-    if count:
-        stats += [("Total time interval", format_timedelta(last["dt"] - first["dt"]))]
-    app_results = collections.OrderedDict(
-        (x["id"], x) for x in sorted(app_items, key=lambda x: x["total"], reverse=True)
-    )
-    return stats, app_results, heatmap_sizes, positions, all_events
+    return dict(interval=(last["dt"] - first["dt"]) if first else None, totaldelta=totaldelta,
+                distance=sum(distances.values()), counts=counts, app_stats=app_stats,
+                app_deltas=app_deltas, app_distances=app_distances,
+                heatmap_sizes=heatmap_sizes, positions=positions)
+
+
+def collect_mouse_numpy(table, where, appmap):
+    """
+    Returns aggregates of mouse events like collect_mouse(), computed on NumPy arrays.
+    """
+    COLS = ["stamp", "COALESCE(display, 0)", "x", "y", "COALESCE(fk_program, -1)"]
+    COLS += {"clicks": ["button"], "scrolls": ["dx", "dy"]}.get(table, [])
+    # Rows are read in table order and sorted here, sparing database from sorting the range,
+    # unless range is over limit and database needs to pick the earliest rows
+    read = lambda **kws: numpy.fromiter(itertools.chain.from_iterable(
+        db.selectrows(table, COLS, where=where, **kws)), numpy.float64)
+    data = read(limit=conf.MaxEventsForStats + 1)
+    if len(data) > conf.MaxEventsForStats * len(COLS):
+        data = read(order="stamp", limit=conf.MaxEventsForStats)
+    data = data.reshape(-1, len(COLS))
+    data = data[numpy.argsort(data[:, 0], kind="stable")]
+    stamps = data[:, 0]
+    displays, xs, ys, apps = (data[:, i].astype(numpy.int64) for i in range(1, 5))
+    micros = local_micros(stamps)
+
+    samedisplay = displays[1:] == displays[:-1]
+    steps = numpy.sqrt(((xs[1:] - xs[:-1]) ** 2 + (ys[1:] - ys[:-1]) ** 2).astype(numpy.float64))
+    deltas = micros[1:] - micros[:-1]
+    distances = [] # Summed sequentially per display like in Python, in order of first occurrence
+    for display in first_uniques(displays[1:][samedisplay]):
+        distances.append(numpy.cumsum(steps[samedisplay & (displays[1:] == display)])[-1])
+
+    app_stats = collections.OrderedDict() # {id: Counter(button: count)}
+    app_deltas = collections.defaultdict(datetime.timedelta) # {id: time in app}
+    app_distances = collections.defaultdict(float) # {id: pixels}
+    for app_id in first_uniques(apps):
+        if app_id <= 0 or app_id in appmap:
+            app_stats[None if app_id < 0 else int(app_id)] = collections.Counter()
+    if appmap:
+        sameapp = samedisplay & (apps[1:] == apps[:-1])
+        pairapps = apps[1:][sameapp]
+        order = numpy.argsort(pairapps, kind="stable")
+        pairapps, appsteps, appdeltas = pairapps[order], steps[sameapp][order], deltas[sameapp][order]
+        bounds = numpy.flatnonzero(numpy.diff(pairapps)) + 1
+        for start, end in zip(numpy.r_[0, bounds], numpy.r_[bounds, len(pairapps)]):
+            if start == end: continue # for start, end
+            app_id = None if pairapps[start] < 0 else int(pairapps[start])
+            app_deltas[app_id] = datetime.timedelta(microseconds=int(appdeltas[start:end].sum()))
+            app_distances[app_id] = float(numpy.cumsum(appsteps[start:end])[-1])
+
+    counts = collections.Counter()
+    if "clicks" == table:
+        buttons = data[:, 5].astype(numpy.int64)
+        for button, value in zip(*numpy.unique(buttons, return_counts=True)):
+            for k in str(button): counts[k] += int(value) # Python path counts each digit
+    elif "scrolls" == table:
+        for i, k in enumerate(("dx", "dy"), 5):
+            values = data[:, i].astype(numpy.int64)
+            counts[k], counts["-" + k] = int(values[values > 0].sum()), int(-values[values < 0].sum())
+    if appmap:
+        for app_id, counter in app_stats.items():
+            mask = apps == (-1 if app_id is None else app_id)
+            if "moves" == table:
+                counter[table] = int(mask.sum())
+            elif "clicks" == table:
+                buttons, values = numpy.unique(data[mask, 5].astype(numpy.int64), return_counts=True)
+                counter.update({str(b): int(v) for b, v in zip(buttons, values)})
+            elif "scrolls" == table:
+                for i, k in enumerate(("dx", "dy"), 5):
+                    values = data[mask, i].astype(numpy.int64)
+                    counter[k] += int(values[values > 0].sum())
+                    counter["-" + k] += int(-values[values < 0].sum())
+
+    heatmap_sizes, positions = scale_mouse_numpy(stamps, displays, xs, ys)
+    return dict(interval=datetime.timedelta(microseconds=int(micros[-1] - micros[0]))
+                         if len(micros) else None,
+                totaldelta=datetime.timedelta(microseconds=int(deltas[samedisplay].sum())),
+                distance=sum(float(x) for x in distances), counts=counts, app_stats=app_stats,
+                app_deltas=app_deltas, app_distances=app_distances,
+                heatmap_sizes=heatmap_sizes, positions=positions)
+
+
+def collect_keyboard_sql(table, where, appmap):
+    """
+    Returns aggregates of keyboard events like collect_keyboard(), computed in database
+    with window functions, using actual time elapsed instead of local time.
+    """
+    KEYNAME = "realkey" if "keys" == table else "key"
+    sql, args = db.makeSQL("SELECT", table, "stamp, stamp - LAG(stamp) OVER w AS delta", where)
+    # Typing session is a run of intervals under maximum delta, numbered by breaks before it
+    sql = """
+      WITH deltas AS (%s WINDOW w AS (ORDER BY stamp)),
+      runs AS (SELECT delta, SUM(delta > :maxdelta) OVER
+                      (ORDER BY stamp ROWS UNBOUNDED PRECEDING) AS run FROM deltas)
+      SELECT COUNT(*) AS length, TOTAL(delta) AS duration FROM runs
+      WHERE delta <= :maxdelta GROUP BY run ORDER BY run
+    """ % sql
+    args["maxdelta"] = timedelta_seconds(datetime.timedelta(seconds=conf.KeyboardSessionMaxDelta))
+    sessions = db.execute(sql, args).fetchall()
+    row = db.fetchone(table, "COUNT(*) AS count, MIN(stamp) AS first, MAX(stamp) AS last, "
+                             "COUNT(DISTINCT key) AS uniques", where)
+
+    app_stats = collections.OrderedDict() # {id: Counter(key: count)}
+    cols = "fk_program, %s AS key, COUNT(*) AS count, MIN(stamp) AS first" % KEYNAME
+    for x in db.fetch(table, cols, where, group="fk_program, %s" % KEYNAME, order="first"):
+        if not x["fk_program"] or x["fk_program"] in appmap:
+            app_stats.setdefault(x["fk_program"], collections.Counter())[x["key"]] = x["count"]
+
+    delta = lambda x: datetime.timedelta(seconds=x or 0)
+    longest = max(sessions or [{"length": 1, "duration": 0}], key=lambda x: x["duration"])
+    return dict(interval=delta(row["last"] - row["first"]) if row["count"] else None,
+                deltas=max(0, row["count"] - 1), deltatotal=delta(row["count"] and row["last"] - row["first"]),
+                sessions=len(sessions), session_keys=sum(x["length"] + 1 for x in sessions),
+                session_duration=delta(sum(x["duration"] for x in sessions)),
+                longest_duration=delta(longest["duration"]), longest_keys=longest["length"] + 1,
+                most_keys=max(x["length"] + 1 for x in sessions) if sessions else 0,
+                uniques=row["uniques"], app_stats=app_stats)
+
+
+def collect_mouse_sql(table, where, appmap):
+    """
+    Returns aggregates of mouse events like collect_mouse() without heatmap data,
+    computed in database with window functions, using actual time elapsed instead of local time.
+    """
+    COLS = {"clicks": ["button"], "scrolls": ["dx", "dy"]}.get(table, [])
+    LAGS = ["display", "fk_program", "stamp", "x", "y"]
+    cols = ", ".join(["fk_program", "stamp", "display", "x", "y"] + COLS +
+                     ["LAG(%s) OVER w AS %s0" % (c, c) for c in LAGS])
+    sql, args = db.makeSQL("SELECT", table, cols, where)
+    # Pairs of consecutive events on same display, also in same application
+    sql = """
+      WITH lags AS (%s WINDOW w AS (ORDER BY stamp)),
+      pairs AS (SELECT *, display = display0 AS samedisplay,
+                       display = display0 AND fk_program IS fk_program0 AS sameapp,
+                       stamp - stamp0 AS delta,
+                       SQRT((x - x0) * (x - x0) + (y - y0) * (y - y0)) AS distance FROM lags)
+      SELECT fk_program, %s COUNT(*) AS count, MIN(stamp) AS first, MAX(stamp) AS last,
+             TOTAL(CASE WHEN samedisplay THEN delta END) AS delta,
+             TOTAL(CASE WHEN samedisplay THEN distance END) AS distance,
+             TOTAL(CASE WHEN sameapp THEN delta END) AS appdelta,
+             TOTAL(CASE WHEN sameapp THEN distance END) AS appdistance
+      FROM pairs GROUP BY fk_program %s ORDER BY first
+    """ % (sql, "".join("%s, " % c for c in COLS if "button" == c) +
+                "".join("TOTAL(MAX(%s, 0)) AS '%s', TOTAL(MAX(-%s, 0)) AS '-%s', " % (c, c, c, c)
+                        for c in COLS if "button" != c),
+           "".join(", %s" % c for c in COLS if "button" == c))
+    rows = db.execute(sql, args).fetchall()
+
+    first, last, totaldelta, distance = None, None, 0, 0
+    counts, app_stats = collections.Counter(), collections.OrderedDict() # {id: Counter(button: count)}
+    app_deltas = collections.defaultdict(datetime.timedelta) # {id: time in app}
+    app_distances = collections.defaultdict(float) # {id: pixels}
+    for row in rows:
+        app_id = row["fk_program"]
+        first = min(first, row["first"]) if first is not None else row["first"]
+        last  = max(last,  row["last"])  if last  is not None else row["last"]
+        totaldelta, distance = totaldelta + row["delta"], distance + row["distance"]
+        app_deltas[app_id] += datetime.timedelta(seconds=row["appdelta"])
+        app_distances[app_id] += row["appdistance"]
+        if not app_id or app_id in appmap: app_stats.setdefault(app_id, collections.Counter())
+        if "moves" == table:
+            if appmap: app_stats[app_id][table] += row["count"]
+        elif "clicks" == table:
+            for k in str(row["button"]): counts[k] += row["count"]
+            if appmap: app_stats[app_id][str(row["button"])] += row["count"]
+        elif "scrolls" == table:
+            for k in ("dx", "-dx", "dy", "-dy"):
+                counts[k] += int(row[k])
+                if appmap: app_stats[app_id][k] += int(row[k])
+    return dict(interval=datetime.timedelta(seconds=last - first) if rows else None,
+                totaldelta=datetime.timedelta(seconds=totaldelta), distance=distance,
+                counts=counts, app_stats=app_stats, app_deltas=app_deltas, app_distances=app_distances)
+
+
+def collect_mouse_sample(table, where, count, appmap, stride, days):
+    """
+    Returns aggregates of mouse events like collect_mouse(), estimated from a systematic sample
+    of rows by ID stride within each day, plus their successor rows for intervals between
+    consecutive events, with additional {errors: {key: relative margin of error at 95% confidence}}.
+    Sampled rows are looked up by ID within day ID range, taken from day index.
+    Samples are weighted per day by day ID range over sampled IDs,
+    and scaled to total count in range.
+    Per-application time and distance are left empty, as sampled pairs estimate them
+    with a bias from application switches that has no margin of error.
+
+    @param   days  [{day, count}] in range
+    """
+    CHUNK = 250 # Sampled IDs per query, taken with successors
+    first, last, prev, nrows, npairs, rowweight, pairweight = None, None, None, 0, 0, 0., 0.
+    counts, app_stats = collections.Counter(), collections.OrderedDict() # {id: Counter(button: count)}
+    sums = collections.defaultdict(lambda: [0, 0, 0]) # {key: [weighted sum, sum, sum of squares]}
+    displayxymap = collections.defaultdict(lambda: collections.defaultdict(float))
+    heatmap_sizes = {} # {display: (w, h)} scaled to screen size of first event
+    scale = make_mouse_scaler(heatmap_sizes)
+
+    def add(key, value, weight):
+        sums[key][0] += value * weight
+        sums[key][1] += value
+        sums[key][2] += value * value
+
+    where = [(k, v) for k, v in where if "day" != k]
+    for day in (x["day"] for x in days):
+        lo = db.fetchone(table, "MIN(id) AS id", day=day)["id"]
+        hi = db.fetchone(table, "MAX(id) AS id", day=day)["id"]
+        if lo is None: continue # for day
+        ids = list(range(lo, hi + 1, stride))
+        weight = (hi - lo + 1.) / len(ids)
+        for i in range(0, len(ids), CHUNK):
+            where2 = where + [("day", day), ("id", ("IN", [x + j for x in ids[i:i + CHUNK] for j in (0, 1)]))]
+            for e in db.select(table, where=where2, order="id"):
+                first = e if first is None or e["stamp"] < first["stamp"] else first
+                last  = e if last  is None or e["stamp"] > last["stamp"]  else last
+                app_id, sampled = e["fk_program"], not (e["id"] - lo) % stride
+                if prev and prev["id"] + 1 == e["id"] and not (prev["id"] - lo) % stride:
+                    npairs, pairweight = npairs + 1, pairweight + weight
+                    if prev["display"] == e["display"]:
+                        delta = e["stamp"] - prev["stamp"]
+                        step = math.sqrt(sum(abs(e[k] - prev[k])**2 for k in "xy"))
+                        add("totaldelta", delta, weight), add("distance", step, weight)
+                prev = e
+                if not sampled: continue # for e
+
+                nrows, rowweight = nrows + 1, rowweight + weight
+                if not app_id or app_id in appmap: app_stats.setdefault(app_id, collections.Counter())
+                displayxymap[e["display"]][scale(e["display"], e["stamp"], e["x"], e["y"])] += weight
+                if "moves" == table:
+                    if appmap: app_stats[app_id][table] += weight
+                elif "clicks" == table:
+                    add(str(e["button"]), 1, weight)
+                    if appmap: app_stats[app_id][str(e["button"])] += weight
+                elif "scrolls" == table:
+                    for k in ("dx", "dy"):
+                        key, value = "%s%s" % ("-" if e[k] < 0 else "", k), abs(e[k])
+                        if value: add(key, value, weight)
+                        if appmap: app_stats[app_id][key] += value * weight
+
+    errors = {} # Margin of error from sample variance, with finite population correction
+    ratios = {k: (count - 1.) / (pairweight or 1) if k in ("totaldelta", "distance")
+                 else float(count) / (rowweight or 1) for k in sums}
+    for key, (weighted, total, squares) in sums.items():
+        n, N = (npairs, count - 1) if key in ("totaldelta", "distance") else (nrows, count)
+        mean = float(total) / n
+        variance = (squares - n * mean * mean) / (n - 1) if n > 1 else 0
+        errors[key] = 1.96 * math.sqrt(max(0, variance) * max(0, 1 - float(n) / N) / n) / mean \
+                      if total else 0
+        if key not in ("totaldelta", "distance"): counts[key] = int(round(weighted * ratios[key]))
+    estimate = lambda key: sums[key][0] * ratios[key] if key in sums else 0
+    for app_id, counter in app_stats.items():
+        for key in counter: counter[key] = int(round(counter[key] * float(count) / (rowweight or 1)))
+
+    positions = {i: [dict(x=x, y=y, count=int(round(v * float(count) / (rowweight or 1))))
+                     for (x, y), v in displayxymap[i].items()] for i in sorted(displayxymap)}
+    return dict(interval=datetime.timedelta(seconds=last["stamp"] - first["stamp"]) if first else None,
+                totaldelta=datetime.timedelta(seconds=estimate("totaldelta")),
+                distance=estimate("distance"), counts=counts, app_stats=app_stats,
+                app_deltas=collections.defaultdict(datetime.timedelta),
+                app_distances=collections.defaultdict(float),
+                heatmap_sizes=heatmap_sizes, positions=positions,
+                errors=errors)
 
 
 def stats_sessions(input=None):
@@ -452,11 +1178,155 @@ def stats_db(filename):
         countstr = "{:,}".format(sum(cmap.get(t) or 0 for t in tables))
         result += [("%s events" % name.capitalize(), countstr)]
     result += [("Sessions", db.fetchone("sessions", "COUNT(*) AS count")["count"])]
+    result += [("Listener", status.format_status(status.read()))]
+    for item in migrations.get_progress():
+        if item["finished"]: continue # for item
+        text = "error: %s" % item["error"] if item["error"] else \
+               migrations.format_progress(item["position"], item["first"], item["last"])
+        result += [("Migration %s" % item["version"], "%s, %s" % (item["name"], text))]
     result += [("%s version" % conf.Title, "%s (%s)" % (conf.Version, conf.VersionDate))]
     result += [("Configuration", conf.ConfigPath or "")]
     return result
 
 
+def make_app_filter(appids=None, appnames=None):
+    """
+    Returns (all applications, filtered application IDs or None if no filter, search text).
+
+    @param   appids    application IDs to filter by, as comma-separated string
+    @param   appnames  application names to filter by, as space-separated words or quoted phrases
+    """
+    apps = db.fetch("programs", order="LOWER(path)") if conf.ProgramsEnabled else []
+    app_ids, app_search = None, appnames
+    if conf.ProgramsEnabled and appids:
+        appids = [int(x) for x in (x.strip() for x in appids.split(",")) if x.isdigit()]
+        app_ids = [x["id"] for x in apps if x["id"] in appids]
+        app_search = ""
+    elif conf.ProgramsEnabled and appnames:
+        appnames = [a or b for a, b in re.findall(r'"([^"]+)"|(\S+)', appnames.lower())]
+        app_ids = [x["id"] for x in apps if any(y in x["path"].lower() for y in appnames)]
+    if app_ids is not None: app_ids.sort()
+    return apps, app_ids, app_search
+
+
+def scale_mouse_numpy(stamps, displays, xs, ys):
+    """
+    Returns mouse event coordinates scaled to heatmaps and binned, like make_mouse_scaler(),
+    as ({display: (w, h)}, {display: [{x, y, count}]}), on NumPy arrays.
+    """
+    HS = conf.MouseHeatmapSize
+    SIZES, STAMPS = get_screen_sizes()
+    heatmap_sizes, positions = {}, {}
+    for display in first_uniques(displays):
+        mask = displays == display
+        sizes, indexes = SIZES[display], numpy.searchsorted(STAMPS[display], stamps[mask], "right")
+        indexes = numpy.maximum(0, indexes - 1)
+        sz = sizes[indexes[0]]
+        hs = heatmap_sizes[int(display)] = (HS[0], HS[0] * sz["h"] / sz["w"])
+        scaled = []
+        for k, vv in enumerate([xs[mask], ys[mask]]):
+            starts, lengths = (numpy.array([x[j] for x in sizes])[indexes] for j in (k, k + 2))
+            values = numpy.trunc((vv - starts).astype(numpy.float64) * hs[k] / lengths)
+            scaled.append(numpy.maximum(0, numpy.minimum(values, hs[k])))
+        # Scaled values are integers or capped at heatmap size: binned by ceiling, combined
+        # into one code per position, in order of first occurrence like in Python
+        ix, iy = (numpy.ceil(vv).astype(numpy.int64) for vv in scaled)
+        width = int(math.ceil(hs[1])) + 1
+        codes, firsts, counts = numpy.unique(ix * width + iy, return_index=True, return_counts=True)
+        order = numpy.argsort(firsts)
+        codes, counts = codes[order], counts[order].tolist()
+        vx, vy = ([min(i, hs[k]) for i in range(int(math.ceil(hs[k])) + 1)] for k in (0, 1))
+        positions[int(display)] = [dict(x=vx[i], y=vy[j], count=n) for i, j, n
+                                   in zip((codes // width).tolist(), (codes % width).tolist(), counts)]
+    return heatmap_sizes, dict(sorted(positions.items()))
+
+
+def local_micros(stamps):
+    """
+    Returns NumPy array of UNIX timestamps as integer microseconds in local time,
+    rounded like datetime.fromtimestamp().
+    """
+    fractions, seconds = numpy.modf(stamps)
+    seconds = seconds.astype(numpy.int64)
+    BUCKET = 900 # Timezone offsets change at quarter-hour boundaries at most
+    buckets, inverse = numpy.unique(seconds // BUCKET, return_inverse=True)
+    offsets = numpy.array([calendar.timegm(time.localtime(x * BUCKET)) - x * BUCKET
+                           for x in buckets.tolist()], dtype=numpy.int64)
+    micros = numpy.round(fractions * 1e6).astype(numpy.int64)
+    return (seconds + offsets[inverse.reshape(-1)]) * 10**6 + micros
+
+
+def first_uniques(values):
+    """Returns unique values from NumPy array as Python list, in order of first occurrence."""
+    uniques, firsts = numpy.unique(values, return_index=True)
+    return uniques[numpy.argsort(firsts)].tolist()
+
+
+def format_distinct(sketch):
+    """Returns distinct count from HyperLogLog sketch, prefixed with "~" if estimated."""
+    return sketch.count() if sketch.is_exact() else "~%s" % sketch.count()
+
+
+def format_quantiles(sketch):
+    """Returns interval percentiles from DDSketch, as text like "p50 0.2sec, p90 1.1sec, p99 4sec"."""
+    return ", ".join("p%s %s" % (q, format_timedelta(sketch.quantile(q / 100.) or 0))
+                     for q in (50, 90, 99))
+
+
+def pack_positions(positions):
+    """
+    Returns mouse heatmap positions in compact encoding, as base64 string of varints:
+    count of positions, followed by columns of x and y and count, ordered by y and x,
+    with x and y delta-encoded.
+
+    @param   positions  [{x, y, count}]
+    """
+    positions = sorted(positions, key=lambda p: (p["y"], p["x"]))
+    data = pack_varints([len(positions)])
+    data += pack_varints((int(p["x"]) for p in positions), delta=True)
+    data += pack_varints((int(p["y"]) for p in positions), delta=True)
+    data += pack_varints(p["count"] for p in positions)
+    return base64.b64encode(data).decode("latin1")
+
+
+def pack_replay(input, events, header):
+    """
+    Returns replay events in compact encoding, as bytes of header JSON line
+    followed by columns of varints, times given as local milliseconds since epoch.
+
+    Mouse events have columns of display, x, y and time, with x, y and time delta-encoded.
+
+    Keyboard events have columns of time, delta-encoded, and number of keys in each event,
+    followed by columns of key indexes and key counts for all events,
+    with key names given in header as list under "keys".
+
+    @param   events  [{x, y, display, stamp}] for mouse,
+                     or [{stamp, keys: {key: count}}] for keyboard
+    @param   header  dictionary for header, like {cursor, count}
+    """
+    offsets = {} # {hour stamp: local time offset}
+    def localms(stamp): # Returns stamp as local time milliseconds
+        hour = int(stamp) // 3600 * 3600
+        if hour not in offsets: offsets[hour] = calendar.timegm(time.localtime(hour)) - hour
+        return int(round((stamp + offsets[hour]) * 1000))
+
+    header = dict(header, events=len(events))
+    if "mouse" == input:
+        data  = pack_varints(e["display"] for e in events)
+        data += pack_varints((e["x"] for e in events), delta=True)
+        data += pack_varints((e["y"] for e in events), delta=True)
+        data += pack_varints((localms(e["stamp"]) for e in events), delta=True)
+    else:
+        keys = sorted(set(k for e in events for k in e["keys"]))
+        keyindexes = {k: i for i, k in enumerate(keys)}
+        header.update(keys=keys)
+        data  = pack_varints((localms(e["stamp"]) for e in events), delta=True)
+        data += pack_varints(len(e["keys"]) for e in events)
+        data += pack_varints(keyindexes[k] for e in events for k in e["keys"])
+        data += pack_varints(c for e in events for c in e["keys"].values())
+    return json.dumps(header).encode("utf-8") + b"\n" + data
+
+
 def make_url(**kwargs):
     """Returns new URL from current URL, modified with added or cleared keyword arguments."""
     ARGORDER = collections.OrderedDict([
@@ -482,34 +1352,142 @@ def make_url(**kwargs):
     return app.get_url(rule, **ruleargs)
 
 
+def is_client_gone():
+    """Returns whether client of current request thread has closed connection."""
+    sock = getattr(_client, "socket", None)
+    if not sock: return False
+    try: return bool(select.select([sock], [], [], 0)[0]) and not sock.recv(1, socket.MSG_PEEK)
+    except Exception: return True
+
+
+def is_closing():
+    """Returns whether web server is shutting down on idle, for event streams to end."""
+    server = getattr(_client, "server", None)
+    return bool(server and server.closing.is_set())
+
+
+def is_local_client():
+    """Returns whether current request comes from local host."""
+    return request.environ.get("REMOTE_ADDR") in ("127.0.0.1", "::1", "::ffff:127.0.0.1")
+
+
+def release_idle():
+    """Excludes current request from web server idle accounting, as for long-lived streams."""
+    server = getattr(_client, "server", None)
+    if server: server.release()
+
+
+def limit_queries(callback):
+    """
+    Bottle plugin limiting database queries in route handlers to time budget
+    from WebQueryBudgets by handler name, interrupting queries if client disconnects.
+    """
+    def wrapper(*args, **kwargs):
+        try:
+            with db.limit(conf.WebQueryBudgets.get(callback.__name__), is_client_gone):
+                return callback(*args, **kwargs)
+        except db.Interrupted as e:
+            if is_client_gone(): return ""
+            raise bottle.HTTPError(503, str(e))
+    return wrapper
+
+
+def time_requests(callback):
+    """Bottle plugin recording request handling time per route, for metrics."""
+    def wrapper(*args, **kwargs):
+        start = time.time()
+        try: return callback(*args, **kwargs)
+        finally: metrics.observe("inputscope_request_duration_seconds", time.time() - start,
+                                 route=request.route.rule)
+    return wrapper
+
+
+def profile_requests(callback):
+    """
+    Bottle plugin profiling route handlers with cProfile, for a WebProfileSample
+    fraction of requests and for local requests with "profile" in query string.
+    """
+    def wrapper(*args, **kwargs):
+        if not (conf.WebProfileSample and random.random() < conf.WebProfileSample) \
+        and not ("profile" in request.query and is_local_client()):
+            return callback(*args, **kwargs)
+        url = request.fullpath + ("?" if request.query_string else "") + request.query_string
+        meta = dict(route=request.route.rule, method=request.method, url=url,
+                    args=dict(request.url_args))
+        return profiles.run(meta, callback, *args, **kwargs)
+    return wrapper
+
+
+def trace_memory(callback):
+    """Bottle plugin recording peak traced memory of route handlers, if tracing memory."""
+    def wrapper(*args, **kwargs):
+        return memory.track(request.route.rule, callback, *args, **kwargs)
+    return wrapper
+
+
+def import_numpy():
+    """Imports numpy module if available and not imported yet, returns module or None."""
+    global numpy
+    if numpy is None:
+        try: import numpy
+        except ImportError: numpy = False
+    return numpy or None
+
+
 def init():
     """Initialize configuration and web application."""
     global app
     if app: return app
-    conf.init(), db.init(conf.DbPath, conf.DbStatements)
+    conf.init()
+    if conf.MemoryTracing: memory.start()
+    db.init(conf.DbPath, conf.DbStatements, conf.DbUpdateStatements, conf.DbVersion)
+    migrations.upgrade(conf.DbPath)
+    db.set_profiling(conf.DbProfiling, conf.DbSlowQueryThreshold or None)
     try: db.execute("PRAGMA journal_mode = WAL")
     except Exception: pass
 
     bottle.TEMPLATE_PATH.insert(0, conf.TemplatePath)
     app = bottle.default_app()
     bottle.BaseTemplate.defaults.update(get_url=app.get_url, make_url=make_url)
+    app.install(limit_queries)
+    app.install(time_requests)
+    app.install(profile_requests)
+    app.install(trace_memory)
     return app
 
 
-def start():
-    """Starts the web server."""
-    global app
+def start(listener=None, ondemand=False):
+    """
+    Starts the web server, returning when server shuts down.
+
+    @param   listener  listening socket to serve on, as when started on demand by web UI stub
+    @param   ondemand  whether started on demand by web UI stub,
+                       server shutting down after WebIdleTimeout
+    """
+    app = init()
+    ThreadingWSGIServer.listener = listener
+    ThreadingWSGIServer.idle_timeout = conf.WebIdleTimeout if ondemand else 0
     bottle.run(app, host=conf.WebHost, port=conf.WebPort,
                debug=conf.WebAutoReload, reloader=conf.WebAutoReload,
-               quiet=conf.WebQuiet)
+               quiet=conf.WebQuiet, server_class=ThreadingWSGIServer)
+    db.close()
+
 
 def main():
-    """Entry point for stand-alone execution."""
+    """
+    Entry point for stand-alone execution, with "--on-demand" if started by web UI stub,
+    and "--socket FD" for inherited listening socket, or "--socket stdin" for socket data
+    from socket.share() in stdin.
+    """
+    init()
     conf.WebQuiet = "--quiet" in sys.argv
-    start()
-
-
-app = init()
+    arg = next((b for a, b in zip(sys.argv, sys.argv[1:]) if "--socket" == a), None)
+    listener = None
+    if "stdin" == arg: listener = socket.fromshare(sys.stdin.buffer.read()) # Windows
+    elif arg is not None:
+        try: listener = socket.socket(fileno=int(arg))  # Py3
+        except TypeError: listener = socket.fromfd(int(arg), socket.AF_INET, socket.SOCK_STREAM)
+    start(listener, "--on-demand" in sys.argv)
 
 
 if "__main__" == __name__: